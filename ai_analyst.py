@@ -16,7 +16,7 @@ MODEL_CASCADE = [
     "gemini-1.5-flash"
 ]
 
-def brief_the_kingpin():
+def brief_the_kingpin(db=None):
     print("🧠 [WAR ROOM] Initiating Uplink Sequence...")
     
     # 2. FETCH THE UPPERCASE KEY
@@ -37,7 +37,7 @@ def brief_the_kingpin():
         return
 
     # --- FETCH INTEL ---
-    con = duckdb.connect(DB_FILE)
+    con = db.cursor() if db is not None else duckdb.connect(DB_FILE)
     try:
         games = con.execute("SELECT * FROM game_predictions WHERE date = CURRENT_DATE").fetchall()
         props = con.execute("SELECT * FROM prop_predictions WHERE grade='DIAMOND' LIMIT 5").fetchall()
@@ -85,7 +85,7 @@ def brief_the_kingpin():
                 break
     
     if report:
-        con = duckdb.connect(DB_FILE)
+        con = db.cursor() if db is not None else duckdb.connect(DB_FILE)
         con.execute("CREATE TABLE IF NOT EXISTS ai_reports (date DATE, content VARCHAR)")
         con.execute("DELETE FROM ai_reports WHERE date = CURRENT_DATE")
         final_content = f"[{active_model.upper()} INTEL] :: {report}"
@@ -1,101 +1,185 @@
-import requests
+import argparse
 import duckdb
 import pandas as pd
 from datetime import datetime, timedelta
-import time
+import sys
+from pathlib import Path
+
+SPORTS_INTEL_DIR = Path(__file__).resolve().parent / "sports_intel"
+if str(SPORTS_INTEL_DIR) not in sys.path:
+    sys.path.insert(0, str(SPORTS_INTEL_DIR))  # http_fetch, db_bulk, replica, ... live there
+
+import db_bulk
+import http_fetch
+import ingest_stats
+import player_features
 
 # --- CONFIG ---
-DB_PATH = "/home/pat/sports_intel/db/features.duckdb"
+DB_PATH = "/home/pat/oracle_data.duckdb" # shared player_game_stats (see ingest_stats.py)
 START_DATE = "2025-10-04" # Start of NHL Season
 END_DATE = datetime.now().strftime("%Y-%m-%d")
+MAX_IN_FLIGHT = http_fetch.MAX_IN_FLIGHT
+CHUNK_ROWS = 5000 # Flush to DuckDB every N player rows (keeps the Pi's RAM flat)
+BACKFILL_GAME_COLUMNS = ["game_id", "event_date_local", "status", "error", "player_rows", "updated_at"]
 
-def backfill():
-    print(f"⏳ BACKFILL: Rewinding to {START_DATE}...")
-    
-    conn = duckdb.connect(DB_PATH)
-    
-    # --- THE FIX: NUKE THE OLD TABLE ---
-    # We drop it to ensure the columns match perfectly (10 columns)
-    conn.execute("DROP TABLE IF EXISTS nhl_player_game_stats")
-    
-    # Create the new clean table
+def init_tables(conn):
+    conn.execute(ingest_stats.PLAYER_GAME_STATS_DDL)
+    conn.execute(ingest_stats.NHL_LOGS_VIEW)
+    # Checkpoints: finished days and per-game status (OK / FAIL)
     conn.execute("""
-        CREATE TABLE nhl_player_game_stats (
-            game_id INTEGER, 
-            event_date_local DATE, 
-            player_id INTEGER,
-            name VARCHAR, 
-            team_abbrev VARCHAR, 
-            shots INTEGER,
-            goals INTEGER, 
-            assists INTEGER, 
-            points INTEGER, 
-            toi VARCHAR
+        CREATE TABLE IF NOT EXISTS backfill_dates (
+            event_date_local DATE PRIMARY KEY,
+            games INTEGER,
+            completed_at TIMESTAMP
         )
     """)
-    
-    # 1. Get Schedule for Date Range
-    current = datetime.strptime(START_DATE, "%Y-%m-%d")
-    end = datetime.strptime(END_DATE, "%Y-%m-%d")
-    
-    all_rows = []
-    
-    while current <= end:
-        date_str = current.strftime("%Y-%m-%d")
-        print(f"   -> Scanning {date_str}...", end="\r")
-        
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_games (
+            game_id INTEGER PRIMARY KEY,
+            event_date_local DATE,
+            status VARCHAR,
+            error VARCHAR,
+            player_rows INTEGER,
+            updated_at TIMESTAMP
+        )
+    """)
+
+def parse_box_rows(box, gid, date_str):
+    return ingest_stats.parse_player_games(
+        box, gid, date_str, box.get('homeTeam', {}).get('abbrev'), box.get('awayTeam', {}).get('abbrev')
+    )
+
+def scan_schedule(dates):
+    """Returns {date_str: [final game ids]} using one /schedule call per week.
+
+    Days whose week failed to load are left out, so they are never checkpointed.
+    """
+    wanted = set(dates)
+    games = {}
+    # /schedule/{date} returns the 7 days starting at date
+    week_starts, covered_until = [], None
+    for d in sorted(wanted):
+        if covered_until is None or d >= covered_until:
+            week_starts.append(d)
+            covered_until = (datetime.strptime(d, "%Y-%m-%d") + timedelta(days=7)).strftime("%Y-%m-%d")
+
+    def on_week(url, data, err):
+        if err is not None:
+            print(f"\n   ⚠️ Schedule fetch failed: {url} ({err})")
+            return
+        start = datetime.strptime(url.rsplit('/', 1)[-1], "%Y-%m-%d")
+        for i in range(7):
+            d = (start + timedelta(days=i)).strftime("%Y-%m-%d")
+            if d in wanted:
+                games.setdefault(d, [])
+        for day in data.get('gameWeek', []):
+            if day['date'] in wanted:
+                for g in day.get('games', []):
+                    if g['gameState'] in ['FINAL', 'OFF']:
+                        games.setdefault(day['date'], []).append(g['id'])
+
+    urls = [http_fetch.SCHEDULE_URL.format(date_str=d) for d in week_starts]
+    http_fetch.stream_json(urls, on_week, max_in_flight=MAX_IN_FLIGHT)
+    return games
+
+def flush(conn, rows, statuses):
+    if not rows and not statuses:
+        return
+    with db_bulk.transaction(conn):
+        if rows:
+            df = pd.DataFrame(rows, columns=ingest_stats.PLAYER_GAME_COLUMNS)
+            # Re-fetched games replace their old rows
+            conn.execute("DELETE FROM player_game_stats WHERE game_id IN (SELECT DISTINCT game_id FROM df)")
+            db_bulk.bulk_upsert(conn, "player_game_stats", df)
+            player_features.mark_players(conn, df["player_id"])
+        now = datetime.now()
+        db_bulk.bulk_upsert(conn, "backfill_games", [(*st, now) for st in statuses], columns=BACKFILL_GAME_COLUMNS)
+    rows.clear()
+    statuses.clear()
+
+def backfill(start_date=START_DATE, end_date=END_DATE, retry_failed=False, max_in_flight=MAX_IN_FLIGHT):
+    print(f"⏳ BACKFILL: Rewinding to {start_date}...")
+
+    conn = duckdb.connect(DB_PATH)
+    init_tables(conn)
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    done_dates = {str(r[0]) for r in conn.execute("SELECT event_date_local FROM backfill_dates").fetchall()}
+    done_games = {r[0] for r in conn.execute("SELECT game_id FROM backfill_games WHERE status = 'OK'").fetchall()}
+
+    # 1. Work out what is left
+    if retry_failed:
+        todo = conn.execute(
+            "SELECT game_id, CAST(event_date_local AS VARCHAR) FROM backfill_games WHERE status = 'FAIL'"
+        ).fetchall()
+        day_games = {}
+        for gid, date_str in todo:
+            day_games.setdefault(date_str, []).append(gid)
+        print(f"   -> Retrying {len(todo)} failed games...")
+    else:
+        current = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date, "%Y-%m-%d")
+        pending = []
+        while current <= end:
+            date_str = current.strftime("%Y-%m-%d")
+            if date_str not in done_dates:
+                pending.append(date_str)
+            current += timedelta(days=1)
+
+        print(f"   -> {len(done_dates)} days already checkpointed, {len(pending)} to scan...")
+        day_games = scan_schedule(pending)
+        todo = [(gid, d) for d, gids in day_games.items() for gid in gids if gid not in done_games]
+
+    # 2. Fetch boxscores concurrently, flushing in bounded chunks
+    game_date = dict(todo)
+    rows, statuses = [], []
+    failed = []
+    processed = 0
+
+    def on_box(gid, box, err):
+        nonlocal processed
+        processed += 1
+        date_str = game_date[gid]
         try:
-            # Get Games for this day
-            sched_url = f"https://api-web.nhle.com/v1/schedule/{date_str}"
-            resp = requests.get(sched_url, timeout=2).json()
-            
-            game_ids = []
-            for day in resp.get('gameWeek', []):
-                if day['date'] == date_str:
-                    for g in day.get('games', []):
-                        if g['gameState'] in ['FINAL', 'OFF']:
-                            game_ids.append(g['id'])
-            
-            # Get Stats for each game
-            for gid in game_ids:
-                box_url = f"https://api-web.nhle.com/v1/gamecenter/{gid}/boxscore"
-                box = requests.get(box_url, timeout=2).json()
-                
-                for team_type in ['awayTeam', 'homeTeam']:
-                    team_abbr = box.get(team_type, {}).get('abbrev')
-                    team_data = box.get('playerByGameStats', {}).get(team_type, {})
-                    
-                    for group in ['forwards', 'defense']:
-                        for p in team_data.get(group, []):
-                            all_rows.append({
-                                'game_id': gid,
-                                'event_date_local': date_str,
-                                'player_id': p['playerId'],
-                                'name': f"{p['name']['default']}",
-                                'team_abbrev': team_abbr,
-                                'shots': p.get('shots', 0),
-                                'goals': p.get('goals', 0),
-                                'assists': p.get('assists', 0),
-                                'points': p.get('points', 0),
-                                'toi': p.get('toi', '00:00')
-                            })
-                            
+            if err is not None:
+                raise err
+            game_rows = parse_box_rows(box, gid, date_str)
+            rows.extend(game_rows)
+            statuses.append((gid, date_str, 'OK', None, len(game_rows)))
+            done_games.add(gid)
         except Exception as e:
-            pass 
-            
-        current += timedelta(days=1)
-        time.sleep(0.05) 
-
-    # 2. Bulk Insert
-    if all_rows:
-        print(f"\n   -> 💾 Inserting {len(all_rows)} records into DB...")
-        df = pd.DataFrame(all_rows)
-        conn.execute("INSERT INTO nhl_player_game_stats SELECT * FROM df")
-        print("✅ SUCCESS: History Restored.")
-    else:
-        print("\n❌ No data found.")
-    
+            statuses.append((gid, date_str, 'FAIL', str(e)[:500], 0))
+            failed.append(gid)
+        print(f"   -> Games {processed}/{len(todo)} ({date_str})...", end="\r")
+        if len(rows) >= CHUNK_ROWS:
+            flush(conn, rows, statuses)
+
+    http_fetch.stream_boxscores(list(game_date), on_box, max_in_flight=max_in_flight)
+    flush(conn, rows, statuses)
+
+    # 3. Checkpoint days whose games all landed (today is never final)
+    finished = [
+        (d, len(gids)) for d, gids in day_games.items()
+        if d < today and all(g in done_games for g in gids)
+    ]
+    if finished:
+        now = datetime.now()
+        db_bulk.bulk_upsert(conn, "backfill_dates", [(d, n, now) for d, n in finished],
+                            columns=["event_date_local", "games", "completed_at"])
+
+    total = conn.execute("SELECT count(*) FROM player_game_stats").fetchone()[0]
+    print(f"\n✅ BACKFILL: {processed - len(failed)} games stored, {len(finished)} days checkpointed ({total} rows total).")
+    if failed:
+        print(f"⚠️ {len(failed)} games failed: {sorted(failed)}")
+        print("   Re-run with --retry-failed to fetch only those.")
+
     conn.close()
 
 if __name__ == "__main__":
-    backfill()
+    ap = argparse.ArgumentParser(description="Resumable season backfill into player_game_stats")
+    ap.add_argument("--start", default=START_DATE)
+    ap.add_argument("--end", default=END_DATE)
+    ap.add_argument("--retry-failed", action="store_true", help="only refetch games recorded as FAIL")
+    ap.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT)
+    args = ap.parse_args()
+    backfill(args.start, args.end, args.retry_failed, args.max_in_flight)
@@ -0,0 +1,95 @@
+"""Benchmark tactical_brain: scalar loop vs *_array versions vs DuckDB UDFs.
+
+Runs on synthetic American prices with a few bad 0 / NaN rows, after checking
+the array versions match the scalar results row for row.
+
+  python bench_tactical_brain.py --rows 1000000
+"""
+
+import argparse
+import time
+import duckdb
+import numpy as np
+import pandas as pd
+import tactical_brain as brain
+
+# --- CONFIG ---
+ROWS = 200_000
+BANKROLL = 1000.00
+KELLY_FRACTION = 0.25
+
+def make_odds(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    odds = rng.integers(100, 600, rows) * rng.choice([-1, 1], rows)
+    odds = odds.astype(float)
+    odds[rng.random(rows) < 0.001] = 0       # bad feed rows
+    odds[rng.random(rows) < 0.001] = np.nan
+    probs = rng.uniform(0.25, 0.75, rows)
+    return odds, probs
+
+def rows_of(*cols):
+    """Python floats, as DuckDB hands rows to the scalar functions."""
+    return zip(*(c.tolist() for c in cols)) if len(cols) > 1 else cols[0].tolist()
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+def check_identical(odds, probs):
+    # Every integer price a book could post, plus the sample
+    every_price = np.arange(-10000, 10001, dtype=float)
+    assert np.array_equal(brain.american_to_decimal_array(every_price),
+                          [brain.american_to_decimal(o) for o in rows_of(every_price)], equal_nan=True)
+    dec = brain.american_to_decimal_array(odds)
+    assert np.array_equal(dec, [brain.american_to_decimal(o) for o in rows_of(odds)], equal_nan=True)
+    assert np.array_equal(brain.calculate_ev_array(probs, dec),
+                          [brain.calculate_ev(p, d) for p, d in rows_of(probs, dec)], equal_nan=True)
+    assert np.array_equal(brain.kelly_criterion_array(probs, dec, BANKROLL, KELLY_FRACTION),
+                          [brain.kelly_criterion(p, d, BANKROLL, KELLY_FRACTION) for p, d in rows_of(probs, dec)],
+                          equal_nan=True)
+    print(f"✅ Array versions match the scalar functions on {len(odds) + len(every_price):,} rows.")
+
+def bench(rows=ROWS):
+    odds, probs = make_odds(rows)
+    check_identical(odds[:50_000], probs[:50_000])
+
+    def scalar():
+        dec = [brain.american_to_decimal(o) for o in rows_of(odds)]
+        ev = [brain.calculate_ev(p, d) for p, d in zip(rows_of(probs), dec)]
+        stake = [brain.kelly_criterion(p, d, BANKROLL, KELLY_FRACTION) for p, d in zip(rows_of(probs), dec)]
+        return ev, stake
+
+    def array():
+        dec = brain.american_to_decimal_array(odds)
+        return brain.calculate_ev_array(probs, dec), brain.kelly_criterion_array(probs, dec, BANKROLL, KELLY_FRACTION)
+
+    con = duckdb.connect()
+    mode = brain.register_udfs(con)
+    lines = pd.DataFrame({"price_american": odds, "model_prob": probs})
+    con.execute("CREATE TABLE lines AS SELECT * FROM lines")
+
+    def sql():
+        return con.execute(f"""
+            SELECT calculate_ev(model_prob, american_to_decimal(price_american)) AS ev,
+                   kelly_criterion(model_prob, american_to_decimal(price_american), {BANKROLL}, {KELLY_FRACTION}) AS stake
+            FROM lines
+        """).fetchnumpy()
+
+    print(f"⏱️ EV + Kelly over {rows:,} odds rows:")
+    _, t_scalar = timed(scalar)
+    print(f"   scalar loop      {t_scalar:8.3f}s")
+    (ev, stake), t_array = timed(array)
+    print(f"   numpy arrays     {t_array:8.3f}s  ({t_scalar / t_array:,.0f}x)")
+    out, t_sql = timed(sql)
+    # NaN prices arrive in SQL as NULL and come back NULL
+    assert all(np.array_equal(np.ma.filled(out[col], np.nan), arr, equal_nan=True)
+               for col, arr in (("ev", ev), ("stake", np.where(np.isnan(odds), np.nan, stake))))
+    print(f"   duckdb ({mode:<6})  {t_sql:8.3f}s  ({t_scalar / t_sql:,.1f}x)")
+    con.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark tactical_brain scalar vs array vs SQL versions")
+    ap.add_argument("--rows", type=int, default=ROWS)
+    args = ap.parse_args()
+    bench(args.rows)
@@ -1,13 +1,19 @@
 import pandas as pd
-import duckdb
 import os
 from datetime import datetime, timedelta
+import sys
+from pathlib import Path
+
+SPORTS_INTEL_DIR = Path(__file__).resolve().parent / "sports_intel"
+if str(SPORTS_INTEL_DIR) not in sys.path:
+    sys.path.insert(0, str(SPORTS_INTEL_DIR))  # http_fetch, db_bulk, replica, ... live there
+
+import federation
 
 # --- CONFIG ---
 BASE_DIR = "/home/pat/sports_intel"
 HISTORY_PATH = f"{BASE_DIR}/bet_history.csv"
 TARGETS_PATH = f"{BASE_DIR}/prop_targets.csv"
-DB_PATH = f"{BASE_DIR}/db/features.duckdb"
 
 def init_ledger():
     """Creates the history file if it doesn't exist."""
@@ -29,7 +35,8 @@ def update_ledger():
         print(f"   -> Checking {pending_mask.sum()} pending bets...")
         
         try:
-            conn = duckdb.connect(DB_PATH, read_only=True)
+            # Same player_game_stats rows prop_engine projects from (oracle_data replica, attached)
+            conn = federation.connect()
             # FIXED: Updated column name to match DB schema (event_date_local)
             stats_df = conn.execute("SELECT name, event_date_local, shots FROM nhl_player_game_stats").df()
             conn.close()
@@ -1,10 +1,16 @@
 import streamlit as st
-import duckdb
 import pandas as pd
 from datetime import datetime
+import sys
+from pathlib import Path
+
+SPORTS_INTEL_DIR = Path(__file__).resolve().parent / "sports_intel"
+if str(SPORTS_INTEL_DIR) not in sys.path:
+    sys.path.insert(0, str(SPORTS_INTEL_DIR))  # http_fetch, db_bulk, replica, ... live there
+
+import replica
 
 st.set_page_config(page_title="THE ORACLE // HUD", layout="wide", page_icon="🧊")
-DB_FILE = "oracle_data.duckdb"
 
 # --- KINGPIN CSS V2 ---
 st.markdown("""
@@ -32,7 +38,12 @@ with c2:
     st.button("🔄 REFRESH INTEL")
 
 # --- DATA FETCH ---
-con = duckdb.connect(DB_FILE, read_only=True)
+# Published read replica: never waits on (or blocks) the ETL writer
+try:
+    con = replica.connect("oracle_data")
+except FileNotFoundError as e:
+    st.error(str(e))
+    st.stop()
 try:
     games = con.execute("SELECT matchup, proj_home_score, proj_away_score, win_probability, spread_pick, rationale FROM game_predictions").df()
     props = con.execute("SELECT player, team, prop_type, line, projection, edge, grade, rationale FROM prop_predictions").df()
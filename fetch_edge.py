@@ -1,31 +1,29 @@
-import requests
 import pandas as pd
-import duckdb
-import time
+import sys
+from pathlib import Path
+
+SPORTS_INTEL_DIR = Path(__file__).resolve().parent / "sports_intel"
+if str(SPORTS_INTEL_DIR) not in sys.path:
+    sys.path.insert(0, str(SPORTS_INTEL_DIR))  # http_fetch, db_bulk, replica, ... live there
+
+import http_fetch
+import write_queue
 
 def get_edge_data():
     print("🚀 CONNECTING TO NHL EDGE NETWORK (DIRECT API)...")
 
-    # 1. URL & HEADERS (The "Polite" Protocol)
-    # We use these headers so the server thinks we are a normal web browser.
-    url = "https://api-web.nhle.com/v1/standings/now"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Accept": "application/json",
-        "Referer": "https://www.nhl.com/"
-    }
+    # 1. URL (browser-like headers live in http_fetch)
+    url = f"{http_fetch.NHL_API}/standings/now"
     
     try:
         # 2. THE REQUEST
-        # We assume you aren't running this in a rapid for-loop. 
-        # One hit per run is perfectly safe.
-        resp = requests.get(url, headers=headers, timeout=10)
-        
-        if resp.status_code != 200:
-            print(f"❌ API Error: {resp.status_code}")
+        # Standings are cached on disk for an hour, so re-runs are free.
+        try:
+            data = http_fetch.fetch_json(url, timeout=10)
+        except RuntimeError as e:
+            print(f"❌ API Error: {e}")
             return
             
-        data = resp.json()
         standings = data['standings']
         
         edge_data = []
@@ -52,9 +50,9 @@ def get_edge_data():
         # 3. SAVE TO DB
         df = pd.DataFrame(edge_data)
         
-        conn = duckdb.connect('db/features.duckdb')
+        batch = write_queue.Batch("features", label="fetch_edge")
         
-        conn.execute("""
+        batch.execute("""
             CREATE TABLE IF NOT EXISTS edge_stats (
                 team VARCHAR,
                 abbrev VARCHAR,
@@ -64,11 +62,11 @@ def get_edge_data():
             )
         """)
         
-        conn.execute("DELETE FROM edge_stats")
-        conn.execute("INSERT INTO edge_stats BY NAME SELECT * FROM df")
-        conn.close()
+        batch.execute("DELETE FROM edge_stats")
+        batch.insert("edge_stats", df)
+        status = batch.commit()
         
-        print(f"✅ EDGE INTELLIGENCE SECURED: {len(df)} Teams.")
+        print(f"✅ EDGE INTELLIGENCE SECURED: {len(df)} Teams ({status}).")
         print("   (Data loaded safely into 'edge_stats')")
         
     except Exception as e:
@@ -1,16 +1,126 @@
+import argparse
+import time
 import duckdb
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-import requests
-from dateutil import parser 
+from dateutil import parser
+import sys
+from pathlib import Path
+
+SPORTS_INTEL_DIR = Path(__file__).resolve().parent / "sports_intel"
+if str(SPORTS_INTEL_DIR) not in sys.path:
+    sys.path.insert(0, str(SPORTS_INTEL_DIR))  # http_fetch, db_bulk, replica, ... live there
+
+import http_fetch
 
 DB_FILE = "oracle_data.duckdb"
-NHL_API = "https://api-web.nhle.com/v1"
 
-def analyze_games():
+# --- SIMULATION CONFIG ---
+# Every slate game is simulated at once as (games, sims) arrays: regulation goals by
+# inverse CDF (Poisson, or negative binomial with NB_SHAPE), ties to 3-on-3 OT, then a shootout.
+N_SIMS = 100_000      # Iterations per game
+MAX_GOALS = 15        # Per team per regulation; the (tiny) tail above is folded into it
+LEAGUE_GPG = 3.05     # Fallback goals/game for teams missing from team_stats
+HOME_ICE = 1.05       # Home scoring multiplier (away divided by it)
+NB_SHAPE = None       # Negative-binomial shape for game-to-game scoring variance (None = Poisson)
+OT_MINUTES = 5.0
+OT_PACE = 2.0         # 3-on-3 scores about twice as fast per minute as regulation
+SHOOTOUT_HOME = 0.50  # Shootouts are close to a coin flip
+PL_PICK = 0.45        # Puck line pick when the favourite covers -1.5 at least this often
+TRAP_BAND = 0.04      # |home win - 50%| below this = coinflip
+
+# Columns added after the V3 schema (older DBs get them on the next run)
+PREDICTION_COLS = {
+    "away_win_probability": "DOUBLE",
+    "ot_probability": "DOUBLE",
+    "home_cover_probability": "DOUBLE",
+    "away_cover_probability": "DOUBLE",
+    "total_line": "DOUBLE",
+    "over_probability": "DOUBLE",
+}
+
+# --- SIMULATION ---
+def goal_rates(h_gf, h_ga, a_gf, a_ga):
+    """(home rate, away rate): own scoring vs opponent's conceding, with home ice. Scalars or arrays."""
+    return (h_gf + a_ga) / 2 * HOME_ICE, (a_gf + h_ga) / 2 / HOME_ICE
+
+def expected_goals(stats_df, home, away):
+    def rate(team, col):
+        return stats_df.loc[team][col] if team in stats_df.index else LEAGUE_GPG
+    return goal_rates(rate(home, 'goals_for_per_game'), rate(home, 'goals_against_per_game'),
+                      rate(away, 'goals_for_per_game'), rate(away, 'goals_against_per_game'))
+
+def goal_pmf(lam, nb_shape=NB_SHAPE):
+    """P(0..MAX_GOALS goals) per game, shape (games, MAX_GOALS + 1), by the pmf recurrences."""
+    lam = np.asarray(lam, dtype=float)
+    x = np.arange(MAX_GOALS)
+    if nb_shape:
+        p0 = (nb_shape / (nb_shape + lam)) ** nb_shape
+        ratio = (x + nb_shape) / (x + 1) * (lam / (lam + nb_shape))[:, None]
+    else:
+        p0 = np.exp(-lam)
+        ratio = lam[:, None] / (x + 1)
+    return p0[:, None] * np.concatenate([np.ones((len(lam), 1)), np.cumprod(ratio, axis=1)], axis=1)
+
+def sample_goals(rng, pmf, n_sims):
+    """Inverse-CDF draws: goals = number of cumulative-probability steps the uniform passes."""
+    cdf = np.cumsum(pmf, axis=1)[:, :-1].astype(np.float32)
+    u = rng.random((len(pmf), n_sims), dtype=np.float32)
+    goals = np.zeros(u.shape, dtype=np.int16)
+    for k in range(cdf.shape[1]):
+        goals += u >= cdf[:, k:k + 1]
+    return goals
+
+def simulate_slate(lam_home, lam_away, n_sims=N_SIMS, nb_shape=NB_SHAPE, seed=None):
+    """Final scores for every game: (home, away, went_ot), each shaped (games, n_sims)."""
+    rng = np.random.default_rng(seed)
+    lam_home = np.asarray(lam_home, dtype=float)
+    lam_away = np.asarray(lam_away, dtype=float)
+    home = sample_goals(rng, goal_pmf(lam_home, nb_shape), n_sims)
+    away = sample_goals(rng, goal_pmf(lam_away, nb_shape), n_sims)
+
+    # Overtime / shootout, drawn only for the tied sims
+    went_ot = home == away
+    g, s = np.nonzero(went_ot)
+    ot_goal = rng.random(len(g)) < 1 - np.exp(-(lam_home + lam_away)[g] * OT_MINUTES / 60 * OT_PACE)
+    u = rng.random(len(g))
+    home_wins = np.where(ot_goal, u < (lam_home / (lam_home + lam_away))[g], u < SHOOTOUT_HOME)
+    home[g[home_wins], s[home_wins]] += 1
+    away[g[~home_wins], s[~home_wins]] += 1
+    return home, away, went_ot
+
+def summarize(home, away, went_ot):
+    """Market probabilities per game from the simulated scores."""
+    margin = home.astype(np.int32) - away
+    total = home.astype(np.int32) + away
+    total_line = np.floor(total.mean(axis=1)) + 0.5
+    return pd.DataFrame({
+        "proj_home_score": home.mean(axis=1),
+        "proj_away_score": away.mean(axis=1),
+        "win_probability": (margin > 0).mean(axis=1),
+        "away_win_probability": (margin < 0).mean(axis=1),
+        "ot_probability": went_ot.mean(axis=1),
+        "home_cover_probability": (margin >= 2).mean(axis=1),
+        "away_cover_probability": (margin <= -2).mean(axis=1),
+        "total_line": total_line,
+        "over_probability": (total > total_line[:, None]).mean(axis=1),
+    })
+
+def pick(home, away, r):
+    if r.home_cover_probability >= PL_PICK:
+        return f"{home} -1.5", f"DOMINANT (covers {r.home_cover_probability:.0%})"
+    if r.away_cover_probability >= PL_PICK:
+        return f"{away} -1.5", f"ROAD KILL (covers {r.away_cover_probability:.0%})"
+    if abs(r.win_probability - 0.5) < TRAP_BAND:
+        return "TRAP GAME", f"Too Close (Coinflip, OT {r.ot_probability:.0%})"
+    winner, p = (home, r.win_probability) if r.win_probability > 0.5 else (away, r.away_win_probability)
+    return f"{winner} ML", f"Standard Edge (wins {p:.0%})"
+
+def analyze_games(con=None):
     print("🎲 [BLACKBOOK] Running Monte Carlo Simulations...")
-    con = duckdb.connect(DB_FILE)
-    
+    con = con.cursor() if con is not None else duckdb.connect(DB_FILE)
+
     # SCHEMA V3: Added 'proj_score_home/away' for PROOF
     con.execute("""
         CREATE TABLE IF NOT EXISTS game_predictions (
@@ -25,12 +135,15 @@ def analyze_games():
             rationale VARCHAR
         )
     """)
-    con.execute("DELETE FROM game_predictions") 
+    # SCHEMA V4: full simulated distribution (percentages, like win_probability)
+    for col, coltype in PREDICTION_COLS.items():
+        con.execute(f"ALTER TABLE game_predictions ADD COLUMN IF NOT EXISTS {col} {coltype}")
+    con.execute("DELETE FROM game_predictions")
 
     today_str = datetime.now().strftime("%Y-%m-%d")
-    
+
     try:
-        sched = requests.get(f"{NHL_API}/schedule/{today_str}").json()
+        sched = http_fetch.fetch_json(http_fetch.SCHEDULE_URL.format(date_str=today_str))
         stats_df = con.execute("SELECT * FROM team_stats").df().set_index('team')
     except:
         print("❌ Data Fetch Failed.")
@@ -38,54 +151,54 @@ def analyze_games():
 
     if 'gameWeek' not in sched: return
 
+    matchups = []
     for week in sched['gameWeek']:
         for game in week['games']:
             # UTC -> Local Shift
             utc_time = parser.parse(game['startTimeUTC'])
             local_time = utc_time - timedelta(hours=5)
             if local_time.strftime("%Y-%m-%d") != today_str: continue
-            
-            home = game['homeTeam']['abbrev']
-            away = game['awayTeam']['abbrev']
-            
-            # MATH: The "Oracle Score"
-            h_gf = stats_df.loc[home]['goals_for_per_game'] if home in stats_df.index else 2.9
-            a_gf = stats_df.loc[away]['goals_for_per_game'] if away in stats_df.index else 2.9
-            
-            # Projects: (Team GF + Opponent GA) / 2 ... roughly
-            # Here we use a simplified weighted model for stability
-            h_proj = (h_gf * 1.1) + 0.2 # Home ice bump
-            a_proj = (a_gf * 0.9)
-            
-            diff = h_proj - a_proj
-            prob = 0.50 + (diff / 6.0) # Mapping goals to probability
-            if prob > 0.85: prob = 0.85
-            if prob < 0.15: prob = 0.15
-            
-            # Spread Logic
-            if diff > 1.3:
-                pick = f"{home} -1.5"
-                why = f"DOMINANT (Gap: {diff:.2f})"
-            elif diff < -1.3:
-                pick = f"{away} -1.5"
-                why = f"ROAD KILL (Gap: {abs(diff):.2f})"
-            elif abs(diff) < 0.3:
-                pick = "TRAP GAME"
-                why = "Too Close (Coinflip)"
-            else:
-                winner = home if diff > 0 else away
-                pick = f"{winner} ML"
-                why = f"Standard Edge ({abs(diff):.2f})"
-
-            con.execute("INSERT INTO game_predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
-                today_str, f"{away} @ {home}", home, away, 
-                round(h_proj, 2), round(a_proj, 2), 
-                round(prob * 100, 1), pick, why
-            ))
+            matchups.append((game['homeTeam']['abbrev'], game['awayTeam']['abbrev']))
+
+    if matchups:
+        rates = np.array([expected_goals(stats_df, home, away) for home, away in matchups])
+        t0 = time.perf_counter()
+        dist = summarize(*simulate_slate(rates[:, 0], rates[:, 1]))
+        print(f"   -> {len(matchups)} games x {N_SIMS:,} sims in {time.perf_counter() - t0:.2f}s")
+
+        dist.insert(0, "away_team", [a for _, a in matchups])
+        dist.insert(0, "home_team", [h for h, _ in matchups])
+        dist.insert(0, "matchup", [f"{a} @ {h}" for h, a in matchups])
+        dist.insert(0, "date", today_str)
+        picks = [pick(r.home_team, r.away_team, r) for r in dist.itertuples()]
+        dist["spread_pick"] = [p for p, _ in picks]
+        dist["rationale"] = [why for _, why in picks]
+        for col in ["proj_home_score", "proj_away_score"]:
+            dist[col] = dist[col].round(2)
+        for col in ["win_probability", "away_win_probability", "ot_probability",
+                    "home_cover_probability", "away_cover_probability", "over_probability"]:
+            dist[col] = (dist[col] * 100).round(1)
+        con.execute("INSERT INTO game_predictions BY NAME SELECT * FROM dist")
 
     count = con.execute("SELECT count(*) FROM game_predictions").fetchone()[0]
     print(f"✅ [SUCCESS] Analyzed {count} Games.")
     con.close()
 
+def bench(games=16, n_sims=N_SIMS):
+    rng = np.random.default_rng(0)
+    lam_home, lam_away = rng.uniform(2.4, 3.8, games), rng.uniform(2.4, 3.8, games)
+    simulate_slate(lam_home, lam_away, 1000)  # warm up
+    t0 = time.perf_counter()
+    dist = summarize(*simulate_slate(lam_home, lam_away, n_sims))
+    print(f"⏱️ {games} games x {n_sims:,} sims: {time.perf_counter() - t0:.3f}s")
+    print(dist.round(3).head().to_string())
+
 if __name__ == "__main__":
-    analyze_games()
+    ap = argparse.ArgumentParser(description="Monte Carlo slate simulator")
+    ap.add_argument("--bench", type=int, metavar="GAMES", help="time a synthetic slate instead of writing predictions")
+    ap.add_argument("--sims", type=int, default=N_SIMS)
+    args = ap.parse_args()
+    if args.bench:
+        bench(args.bench, args.sims)
+    else:
+        analyze_games()
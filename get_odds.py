@@ -1,9 +1,17 @@
-import requests
-import duckdb
-import pandas as pd
-from datetime import datetime
+from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
+import sys
+from pathlib import Path
+
+SPORTS_INTEL_DIR = Path(__file__).resolve().parent / "sports_intel"
+if str(SPORTS_INTEL_DIR) not in sys.path:
+    sys.path.insert(0, str(SPORTS_INTEL_DIR))  # http_fetch, db_bulk, replica, ... live there
+
+import http_fetch
+import odds_store
+import payload_lake
+import write_queue
 
 # 1. LOAD SECRETS
 load_dotenv()
@@ -18,64 +26,41 @@ def fetch_odds():
     print(f"\n🎲 FETCHING LIVE ODDS (ML, SPREADS, TOTALS)...")
     
     # 1. Request Multiple Markets
-    url = f"https://api.the-odds-api.com/v4/sports/icehockey_nhl/odds/?apiKey={API_KEY}&regions=us&markets=h2h,spreads,totals&oddsFormat=american"
-    resp = requests.get(url)
-    
-    if resp.status_code != 200:
-        print(f"❌ Failed: {resp.text}")
+    url = os.getenv("ODDS_API_BASE", "https://api.the-odds-api.com/v4/sports") + "/icehockey_nhl/odds/"
+    params = {"apiKey": API_KEY, "regions": "us", "markets": "h2h,spreads,totals", "oddsFormat": "american"}
+    try:
+        data = http_fetch.fetch_json(url, params=params)
+    except Exception as e:
+        print(f"❌ Failed: {e}")
         return
 
-    data = resp.json()
     print(f"✅ Received {len(data)} games from API.")
 
-    # 2. Process Data
-    rows = []
+    # 2. Process Data (shared flattener: one row per outcome)
     snapshot_id = datetime.now().strftime("%Y%m%d%H%M")
-    
-    for game in data:
-        home = game['home_team']
-        away = game['away_team']
-        event_id = game['id']
-        
-        # We will extract the best available line for each market type
-        # Dict structure: {'h2h': {}, 'spreads': {}, 'totals': {}}
-        extracted = {'h2h': [], 'spreads': [], 'totals': []}
+    fetched_at_local = datetime.now()
+    fetched_at_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+    payload_lake.store("odds", snapshot_id, data, url=payload_lake.strip_secrets(url),
+                       meta={"snapshot_id": snapshot_id, "fetched_at_local": fetched_at_local.isoformat(),
+                             "markets": params["markets"], "source": odds_store.GET_ODDS_SOURCE})
+    lines = odds_store.flatten_odds(snapshot_id, data, fetched_at_local, fetched_at_utc)
 
-        for book in game['bookmakers']:
-            # Prioritize major books for consistency
-            if book['key'] in ['draftkings', 'fanduel', 'betmgm', 'caesars']:
-                for market in book['markets']:
-                    m_key = market['key'] # h2h, spreads, totals
-                    
-                    # Only take the first valid line we find for this market type (to avoid dupes)
-                    if m_key in extracted and not extracted[m_key]:
-                        for outcome in market['outcomes']:
-                            rows.append({
-                                'snapshot_id': snapshot_id,
-                                'source_event_id': event_id,
-                                'home_team': home,
-                                'away_team': away,
-                                'bookmaker': book['title'],
-                                'market': m_key,
-                                'outcome_name': outcome['name'],
-                                'price': outcome['price'],
-                                'point': outcome.get('point', 0),
-                                'point_key': 'ML' if m_key == 'h2h' else str(outcome.get('point', 0))
-                            })
-                        extracted[m_key] = True # Mark as found
+    # Prioritize major books for consistency, and only keep the first one that
+    # quotes each market for a game (to avoid dupes). Tagged as its own source so
+    # the change log never diffs these against Phase 3A's all-book snapshots.
+    lines = odds_store.first_major_book(lines).assign(source=odds_store.GET_ODDS_SOURCE)
 
     # 3. Save to Database
-    if rows:
-        conn = duckdb.connect('db/features.duckdb')
-        df = pd.DataFrame(rows)
+    if len(lines):
         try:
-            # Insert new lines
-            conn.execute("INSERT INTO odds_lines BY NAME SELECT * FROM df")
-            print(f"💾 Saved {len(rows)} odds lines (ML, Puck Line, Totals).")
+            # No odds_snapshots header: Phase 3B/3C read the latest one, and this
+            # one-book snapshot has no market_probs behind it
+            markets = params["markets"].split(",")
+            # write_snapshot diffs against the stored lines, so it runs on the writer's connection
+            status = write_queue.Batch("features", label="get_odds").call("odds_store.write_snapshot", lines, None, markets).commit()
+            print(f"💾 Saved {len(lines)} odds lines (ML, Puck Line, Totals) ({status}).")
         except Exception as e:
             print(f"❌ Save Error: {e}")
-        finally:
-            conn.close()
     else:
         print("⚠️ No odds found.")
 
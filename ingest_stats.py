@@ -1,35 +1,61 @@
-import requests
 import duckdb
-import pandas as pd
 from datetime import datetime, timedelta
-import time
+import sys
+from pathlib import Path
+
+SPORTS_INTEL_DIR = Path(__file__).resolve().parent / "sports_intel"
+if str(SPORTS_INTEL_DIR) not in sys.path:
+    sys.path.insert(0, str(SPORTS_INTEL_DIR))  # http_fetch, db_bulk, replica, ... live there
+
+import db_bulk
+import http_fetch
+import player_features
 
 # --- CONFIG ---
 DB_FILE = "oracle_data.duckdb"
-NHL_API = "https://api-web.nhle.com/v1"
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-}
-
-def init_db():
-    con = duckdb.connect(DB_FILE)
-    # SCHEMA V2: Added 'position' and 'saves'
-    con.execute("""
-        CREATE TABLE IF NOT EXISTS nhl_logs (
-            game_id VARCHAR,
-            date DATE,
-            player_id INTEGER,
-            name VARCHAR,
-            team VARCHAR,
-            opponent VARCHAR,
-            position VARCHAR,
-            goals INTEGER,
-            assists INTEGER,
-            shots INTEGER,
-            saves INTEGER,
-            toi VARCHAR
-        )
-    """)
+MAX_IN_FLIGHT = http_fetch.MAX_IN_FLIGHT  # concurrent boxscore requests
+PLAYER_GAME_COLUMNS = ['game_id', 'event_date_local', 'player_id', 'name', 'team_abbrev', 'opponent_abbrev',
+                       'position', 'goals', 'assists', 'points', 'shots', 'saves', 'toi']
+
+# SCHEMA V4: one canonical player-game store for every consumer (prop_engine,
+# bet_tracker, backfill_season, scraper). nhl_logs is kept as a view with the
+# old column names; features.duckdb readers get nhl_player_game_stats through
+# sports_intel/federation.py. (older DBs: run migrate_player_game_stats.py once)
+PLAYER_GAME_STATS_DDL = """
+    CREATE TABLE IF NOT EXISTS player_game_stats (
+        game_id INTEGER,
+        event_date_local DATE,
+        player_id INTEGER,
+        name VARCHAR,
+        team_abbrev VARCHAR,
+        opponent_abbrev VARCHAR,
+        position VARCHAR,
+        goals INTEGER,
+        assists INTEGER,
+        points INTEGER,
+        shots INTEGER,
+        saves INTEGER,
+        toi VARCHAR,
+        PRIMARY KEY (game_id, player_id)
+    )
+"""
+
+NHL_LOGS_VIEW = """
+    CREATE VIEW IF NOT EXISTS nhl_logs AS
+    SELECT CAST(game_id AS VARCHAR) AS game_id, event_date_local AS date, player_id, name,
+           team_abbrev AS team, opponent_abbrev AS opponent, position, goals, assists, shots, saves, toi
+    FROM player_game_stats
+"""
+
+def init_db(con=None):
+    con = con.cursor() if con is not None else duckdb.connect(DB_FILE)
+    con.execute(PLAYER_GAME_STATS_DDL)
+    con.execute(NHL_LOGS_VIEW)  # no-op while the legacy nhl_logs table is still there
+    legacy = con.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = 'nhl_logs' AND database_name = current_database()"
+    ).fetchone()[0]
+    if legacy:
+        print("⚠️ [SCHEMA] nhl_logs is still a table. Run migrate_player_game_stats.py once.")
     # Team stats table
     con.execute("""
         CREATE TABLE IF NOT EXISTS team_stats (
@@ -44,86 +70,112 @@ def init_db():
     """)
     con.close()
 
-def ingest_recent_games(days_back=14):
+def parse_player_games(box, game_id, game_date, home_team, away_team):
+    """Flattens one boxscore into player_game_stats rows (skaters + goalies)."""
+    records = []
+    for team_type in ['homeTeam', 'awayTeam']:
+        team_code = home_team if team_type == 'homeTeam' else away_team
+        opp_code = away_team if team_type == 'homeTeam' else home_team
+        
+        # Skaters & Goalies are separate in new API
+        all_players = box.get('playerByGameStats', {}).get(team_type, {})
+        
+        # 1. Forwards/Defense
+        for group in ['forwards', 'defense']:
+            for p in all_players.get(group, []):
+                goals, assists = p.get('goals', 0), p.get('assists', 0)
+                records.append((
+                    int(game_id), game_date, p['playerId'], p['name']['default'],
+                    team_code, opp_code, p['position'],
+                    goals, assists, p.get('points', goals + assists), p.get('shots', 0), 0, p.get('toi', '00:00')
+                ))
+        
+        # 2. Goalies
+        for g in all_players.get('goalies', []):
+            records.append((
+                int(game_id), game_date, g['playerId'], g['name']['default'],
+                team_code, opp_code, 'G',
+                0, 0, 0, 0, int(g.get('saves', 0)), g.get('toi', '00:00')
+            ))
+    return records
+
+def upsert_player_games(con, records):
+    """Bulk upsert of player_game_stats tuples (one statement per batch)."""
+    # A boxscore can list a player twice (e.g. skater + emergency goalie); the PK dedupe keeps the last
+    pid = PLAYER_GAME_COLUMNS.index('player_id')
+    with db_bulk.transaction(con):
+        db_bulk.bulk_upsert(con, "player_game_stats", records, columns=PLAYER_GAME_COLUMNS)
+        player_features.mark_players(con, [r[pid] for r in records])
+
+def row_inflation(con):
+    """(rows, distinct (game_id, player_id), ratio) - should stay at 1.0."""
+    rows, keys = con.execute(
+        "SELECT count(*), count(DISTINCT (game_id, player_id)) FROM player_game_stats"
+    ).fetchone()
+    return rows, keys, (rows / keys if keys else 1.0)
+
+def ingest_recent_games(days_back=14, max_in_flight=MAX_IN_FLIGHT, con=None):
     print(f"⚡ [INGEST] Scanning last {days_back} days of warfare...")
-    con = duckdb.connect(DB_FILE)
+    con = con.cursor() if con is not None else duckdb.connect(DB_FILE)
     
     start_date = (datetime.now() - timedelta(days=days_back)).strftime("%Y-%m-%d")
-    schedule_url = f"{NHL_API}/schedule/{start_date}"
+    schedule_url = http_fetch.SCHEDULE_URL.format(date_str=start_date)
     
     try:
-        resp = requests.get(schedule_url, headers=HEADERS)
-        data = resp.json()
+        data = http_fetch.fetch_json(schedule_url)
     except Exception as e:
         print(f"❌ API Handshake Failed: {e}")
         return
 
-    records = []
-    
+    games = {}
     for week in data.get('gameWeek', []):
         for game in week.get('games', []):
             if game['gameState'] != 'OFF': continue # Only finished games
-            
-            game_id = game['id']
-            game_date = game['startTimeUTC'].split('T')[0]
-            home_team = game['homeTeam']['abbrev']
-            away_team = game['awayTeam']['abbrev']
-            
-            # Fetch Boxscore
-            print(f"   >> Extracting Data: {away_team} @ {home_team}")
-            box_url = f"{NHL_API}/gamecenter/{game_id}/boxscore"
-            try:
-                box = requests.get(box_url, headers=HEADERS).json()
-            except:
-                continue
-
-            # Process Players (Home & Away)
-            for team_type in ['homeTeam', 'awayTeam']:
-                team_code = home_team if team_type == 'homeTeam' else away_team
-                opp_code = away_team if team_type == 'homeTeam' else home_team
-                
-                # Skaters & Goalies are separate in new API
-                all_players = box.get('playerByGameStats', {}).get(team_type, {})
-                
-                # 1. Forwards/Defense
-                for group in ['forwards', 'defense']:
-                    for p in all_players.get(group, []):
-                        records.append((
-                            str(game_id), game_date, p['playerId'], p['name']['default'],
-                            team_code, opp_code, p['position'], 
-                            p.get('goals', 0), p.get('assists', 0), p.get('shots', 0), 0, p.get('toi', '00:00')
-                        ))
-                
-                # 2. Goalies
-                for g in all_players.get('goalies', []):
-                    records.append((
-                        str(game_id), game_date, g['playerId'], g['name']['default'],
-                        team_code, opp_code, 'G',
-                        0, 0, 0, int(g.get('saves', 0)), g.get('toi', '00:00')
-                    ))
-            
-            time.sleep(0.2) # Avoid rate limits
-
-    # Bulk Insert
-    if records:
-        con.executemany("INSERT INTO nhl_logs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", records)
-        print(f"✅ [SUCCESS] Ingested {len(records)} player logs.")
-    
+            games[game['id']] = (
+                week['date'],  # local game day (startTimeUTC rolls late games into tomorrow)
+                game['homeTeam']['abbrev'],
+                game['awayTeam']['abbrev'],
+            )
+
+    # Fetch Boxscores concurrently; each one is written as soon as it lands
+    inserted = 0
+
+    def on_box(game_id, box, err):
+        nonlocal inserted
+        game_date, home_team, away_team = games[game_id]
+        if err is not None:
+            print(f"   ⚠️ Boxscore failed: {away_team} @ {home_team} ({err})")
+            return
+        print(f"   >> Extracting Data: {away_team} @ {home_team}")
+        records = parse_player_games(box, game_id, game_date, home_team, away_team)
+        if records:
+            upsert_player_games(con, records)
+            inserted += len(records)
+
+    http_fetch.stream_boxscores(list(games), on_box, max_in_flight=max_in_flight)
+
+    if inserted:
+        print(f"✅ [SUCCESS] Ingested {inserted} player logs.")
+
+    rows, keys, ratio = row_inflation(con)
+    if ratio > 1.0:
+        print(f"⚠️ [INFLATION] player_game_stats has {rows} rows for {keys} player-games ({ratio:.2f}x). Run migrate_player_game_stats.py.")
+
     # Simple Team Stat update (Mock logic for stability - usually requires standings endpoint)
     # In a real run, we'd fetch standings. For now, we aggregate logs.
     con.execute("DELETE FROM team_stats")
     con.execute("""
         INSERT INTO team_stats 
         SELECT 
-            team, 
+            team_abbrev, 
             COUNT(DISTINCT game_id) as gp,
             SUM(goals)/COUNT(DISTINCT game_id) as gf,
             2.9 as ga, -- Baseline placeholder until standings fetch
             0.22 as pp,
             0.80 as pk,
             CURRENT_TIMESTAMP
-        FROM nhl_logs
-        GROUP BY team
+        FROM player_game_stats
+        GROUP BY team_abbrev
     """)
     
     con.close()
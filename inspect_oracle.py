@@ -1,24 +1,33 @@
-import duckdb
 import pandas as pd
 import os
+import sys
+from pathlib import Path
+
+SPORTS_INTEL_DIR = Path(__file__).resolve().parent / "sports_intel"
+if str(SPORTS_INTEL_DIR) not in sys.path:
+    sys.path.insert(0, str(SPORTS_INTEL_DIR))  # http_fetch, db_bulk, replica, ... live there
+
+import replica
 
 """
 INSPECT ORACLE
 --------------
 A utility tool to view the contents of the Oracle's brain (DuckDB)
-without needing a GUI tool.
+without needing a GUI tool. Reads the published replica, so it never
+waits on a running refresh.
 """
 
-DB_PATH = '/home/pat/sports_intel/oracle_data.duckdb'
+REPLICA_PATH = replica.current_path("oracle_data")
 
 def inspect():
-    if not os.path.exists(DB_PATH):
-        print(f"❌ Database not found at {DB_PATH}")
+    if not os.path.exists(REPLICA_PATH):
+        print(f"❌ No published replica at {REPLICA_PATH}")
         print("Run ./daily_oracle.sh first to generate data.")
         return
 
     try:
-        con = duckdb.connect(DB_PATH)
+        con = replica.connect("oracle_data")
+        print(f"📸 Replica published: {replica.published_at(con)}")
         
         # 1. Check Predictions Table
         print("\n--- 🧠 MODEL PREDICTIONS (Recent 5) ---")
@@ -39,7 +48,9 @@ def inspect():
                 print("[No wagers found yet]")
             else:
                 print(df_wagers.to_string(index=False))
-                
+        except Exception:
+            print("[Table 'value_wagers' does not exist yet]")
+
         # 3. Summary Stats
         print("\n--- 📊 SUMMARY ---")
         try:
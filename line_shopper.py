@@ -21,8 +21,8 @@ BANKROLL = 1000.00
 MIN_EV_THRESHOLD = 0.015 
 KELLY_FRACTION = 0.25
 
-def get_db_connection():
-    return duckdb.connect(DB_PATH)
+def get_db_connection(db=None):
+    return db.cursor() if db is not None else duckdb.connect(DB_PATH)
 
 def fetch_predictions(con):
     """Retrieves the latest predictions from the prop_engine."""
@@ -66,8 +66,8 @@ def hunt_value(con):
     # For now, just print the model's output so you know it's safe
     print(df_model.head())
 
-def main():
-    con = get_db_connection()
+def main(db=None):
+    con = get_db_connection(db)
     hunt_value(con)
     con.close()
 
@@ -0,0 +1,88 @@
+"""One-time rebuild of an unkeyed nhl_logs table with a (game_id, player_id) key.
+
+Duplicates from old re-ingests are dropped (latest copy wins). Superseded by
+migrate_player_game_stats.py; kept for DBs still on the nhl_logs table.
+"""
+
+import duckdb
+import ingest_stats
+
+DB_FILE = ingest_stats.DB_FILE
+
+# nhl_logs as it was before player_game_stats (ingest_stats SCHEMA V3)
+NHL_LOGS_DDL = """
+    CREATE TABLE IF NOT EXISTS nhl_logs (
+        game_id VARCHAR,
+        date DATE,
+        player_id INTEGER,
+        name VARCHAR,
+        team VARCHAR,
+        opponent VARCHAR,
+        position VARCHAR,
+        goals INTEGER,
+        assists INTEGER,
+        shots INTEGER,
+        saves INTEGER,
+        toi VARCHAR,
+        PRIMARY KEY (game_id, player_id)
+    )
+"""
+
+def row_inflation(con):
+    """(rows, distinct (game_id, player_id), ratio) - should stay at 1.0."""
+    rows, keys = con.execute(
+        "SELECT count(*), count(DISTINCT (game_id, player_id)) FROM nhl_logs"
+    ).fetchone()
+    return rows, keys, (rows / keys if keys else 1.0)
+
+def has_primary_key(con, table):
+    rows = con.execute(
+        "SELECT count(*) FROM duckdb_constraints() WHERE table_name = ? AND constraint_type = 'PRIMARY KEY'",
+        [table]
+    ).fetchone()
+    return rows[0] > 0
+
+def main():
+    con = duckdb.connect(DB_FILE)
+    tables = [r[0] for r in con.execute("SHOW TABLES").fetchall()]
+    if "nhl_logs" not in tables:
+        print("nhl_logs does not exist yet. Run ingest_stats.py first.")
+        con.close()
+        return
+    views = [r[0] for r in con.execute("SELECT view_name FROM duckdb_views() WHERE NOT internal").fetchall()]
+    if "nhl_logs" in views:
+        print("nhl_logs is already a view over player_game_stats. Nothing to do.")
+        con.close()
+        return
+
+    rows, keys, ratio = row_inflation(con)
+    print(f"BEFORE: {rows} rows / {keys} player-games ({ratio:.2f}x)")
+
+    if has_primary_key(con, "nhl_logs"):
+        print("nhl_logs already keyed on (game_id, player_id). Nothing to do.")
+        con.close()
+        return
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute("ALTER TABLE nhl_logs RENAME TO nhl_logs_old")
+        con.execute(NHL_LOGS_DDL)
+        con.execute("""
+            INSERT INTO nhl_logs
+            SELECT * FROM nhl_logs_old
+            WHERE game_id IS NOT NULL AND player_id IS NOT NULL
+            QUALIFY row_number() OVER (PARTITION BY game_id, player_id ORDER BY rowid DESC) = 1
+        """)
+        con.execute("DROP TABLE nhl_logs_old")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+    con.execute("CHECKPOINT")
+    rows, keys, ratio = row_inflation(con)
+    print(f"AFTER:  {rows} rows / {keys} player-games ({ratio:.2f}x)")
+    con.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""One-time merge of oracle_data.nhl_logs and features.nhl_player_game_stats
+into oracle_data.player_game_stats (latest copy per game_id/player_id wins).
+
+nhl_logs becomes a view over the new table and the backfill checkpoints move
+with the data. Safe to re-run. Stop scheduler_daemon.py first: both DB files
+are opened for writing.
+"""
+
+import duckdb
+import backfill_season
+import ingest_stats
+
+DB_FILE = ingest_stats.DB_FILE
+FEATURES_DB = "sports_intel/db/features.duckdb"
+
+# Empty stand-ins so the merge query works whichever copy is missing
+EMPTY_LOGS = """(SELECT NULL::VARCHAR AS game_id, NULL::DATE AS date, NULL::INTEGER AS player_id,
+    NULL AS name, NULL AS team, NULL AS opponent, NULL AS position, NULL::INTEGER AS goals,
+    NULL::INTEGER AS assists, NULL::INTEGER AS shots, NULL::INTEGER AS saves, NULL AS toi,
+    NULL::BIGINT AS rowid WHERE false)"""
+EMPTY_STATS = """(SELECT NULL::INTEGER AS game_id, NULL::DATE AS event_date_local, NULL::INTEGER AS player_id,
+    NULL AS name, NULL AS team_abbrev, NULL::INTEGER AS shots, NULL::INTEGER AS goals,
+    NULL::INTEGER AS assists, NULL::INTEGER AS points, NULL AS toi, NULL::BIGINT AS rowid WHERE false)"""
+
+def tables(con, catalog):
+    return {r[0] for r in con.execute(
+        "SELECT table_name FROM duckdb_tables() WHERE database_name = ?", [catalog]
+    ).fetchall()}
+
+def main():
+    con = duckdb.connect(DB_FILE)
+    con.execute(f"ATTACH '{FEATURES_DB}' AS features")
+    oracle = tables(con, con.execute("SELECT current_database()").fetchone()[0])
+    features = tables(con, "features")
+
+    legacy_logs = "nhl_logs" in oracle
+    legacy_stats = "nhl_player_game_stats" in features
+    if not legacy_logs and not legacy_stats:
+        print("No legacy player tables left. Nothing to do.")
+        con.close()
+        return
+
+    logs = "nhl_logs" if legacy_logs else EMPTY_LOGS
+    stats = "features.nhl_player_game_stats" if legacy_stats else EMPTY_STATS
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        if legacy_logs:
+            con.execute("ALTER TABLE nhl_logs RENAME TO nhl_logs_old")
+            logs = "nhl_logs_old"
+        con.execute(ingest_stats.PLAYER_GAME_STATS_DDL)
+        con.execute(f"""
+            INSERT OR IGNORE INTO player_game_stats
+            WITH l AS (
+                SELECT * FROM {logs}
+                WHERE game_id IS NOT NULL AND player_id IS NOT NULL
+                QUALIFY row_number() OVER (PARTITION BY game_id, player_id ORDER BY rowid DESC) = 1
+            ), s AS (
+                SELECT * FROM {stats}
+                WHERE game_id IS NOT NULL AND player_id IS NOT NULL
+                QUALIFY row_number() OVER (PARTITION BY game_id, player_id ORDER BY rowid DESC) = 1
+            )
+            SELECT
+                coalesce(s.game_id, TRY_CAST(l.game_id AS INTEGER)) AS game_id,
+                coalesce(s.event_date_local, l.date) AS event_date_local,
+                coalesce(s.player_id, l.player_id) AS player_id,
+                coalesce(l.name, s.name) AS name,
+                coalesce(l.team, s.team_abbrev) AS team_abbrev,
+                l.opponent AS opponent_abbrev,
+                l.position,
+                coalesce(l.goals, s.goals) AS goals,
+                coalesce(l.assists, s.assists) AS assists,
+                coalesce(s.points, l.goals + l.assists) AS points,
+                coalesce(l.shots, s.shots) AS shots,
+                coalesce(l.saves, 0) AS saves,
+                coalesce(l.toi, s.toi) AS toi
+            FROM l FULL OUTER JOIN s
+              ON s.game_id = TRY_CAST(l.game_id AS INTEGER) AND s.player_id = l.player_id
+            WHERE coalesce(s.game_id, TRY_CAST(l.game_id AS INTEGER)) IS NOT NULL
+        """)
+        if legacy_logs:
+            con.execute("DROP TABLE nhl_logs_old")
+        backfill_season.init_tables(con)  # nhl_logs view + checkpoint tables
+        for t in ("backfill_dates", "backfill_games"):
+            if t in features:
+                con.execute(f"INSERT OR REPLACE INTO {t} SELECT * FROM features.main.{t}")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    rows = con.execute("SELECT count(*) FROM player_game_stats").fetchone()[0]
+    print(f"player_game_stats: {rows} player-games (oracle_data), nhl_logs is now a view.")
+
+    # Second transaction: retire the features-side copies (now served by sports_intel/federation.py)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        for t in ("nhl_player_game_stats", "backfill_dates", "backfill_games"):
+            if t in features:
+                con.execute(f"DROP TABLE features.main.{t}")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    print("features.duckdb: nhl_player_game_stats and backfill checkpoints removed.")
+
+    con.execute("CHECKPOINT")
+    con.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Per-player rolling shots / saves / TOI in player_rolling_features (read by prop_engine).
+
+Writers of player_game_stats queue the players they touched in
+player_features_pending (mark_players); refresh() recomputes just those.
+Everyone is recomputed on --rebuild, when the season rolls over and after
+player_game_stats is archived (which also drops players with no games left).
+
+  python player_features.py [--rebuild]
+"""
+
+import argparse
+import duckdb
+import sys
+from pathlib import Path
+
+SPORTS_INTEL_DIR = Path(__file__).resolve().parent / "sports_intel"
+if str(SPORTS_INTEL_DIR) not in sys.path:
+    sys.path.insert(0, str(SPORTS_INTEL_DIR))  # http_fetch, db_bulk, replica, ... live there
+
+import archive
+import db_bulk
+
+# --- CONFIG ---
+DB_FILE = "oracle_data.duckdb"
+EWM_ALPHA = 0.25  # weight of the latest game (half-life ~2.4 games)
+
+PLAYER_ROLLING_DDL = """
+    CREATE TABLE IF NOT EXISTS player_rolling_features (
+        player_id INTEGER PRIMARY KEY,
+        name VARCHAR,
+        team_abbrev VARCHAR,
+        position VARCHAR,
+        games INTEGER,
+        season INTEGER,
+        season_games INTEGER,
+        last_game_id INTEGER,
+        last_game_date DATE,
+        shots_l5 DOUBLE,
+        shots_l10 DOUBLE,
+        shots_season DOUBLE,
+        shots_avg DOUBLE,
+        shots_ewm DOUBLE,
+        saves_l5 DOUBLE,
+        saves_l10 DOUBLE,
+        saves_season DOUBLE,
+        saves_avg DOUBLE,
+        saves_ewm DOUBLE,
+        toi_l5 DOUBLE,
+        toi_l10 DOUBLE,
+        toi_season DOUBLE,
+        toi_avg DOUBLE,
+        toi_ewm DOUBLE,
+        updated_at TIMESTAMP
+    )
+"""
+
+# Players with new, re-fetched or archived games since their row was written
+PENDING_DDL = """
+    CREATE TABLE IF NOT EXISTS player_features_pending (
+        player_id INTEGER PRIMARY KEY
+    )
+"""
+
+def _window_cols(col, season):
+    return f"""
+            avg({col}) FILTER (WHERE rn <= 5) AS {col}_l5,
+            avg({col}) FILTER (WHERE rn <= 10) AS {col}_l10,
+            avg({col}) FILTER (WHERE season = {season}) AS {col}_season,
+            avg({col}) AS {col}_avg,
+            sum({col} * w) / sum(w) FILTER (WHERE {col} IS NOT NULL) AS {col}_ewm"""
+
+def _has_table(con, table: str) -> bool:
+    return con.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = ? AND database_name = current_database()", [table]
+    ).fetchone()[0] > 0
+
+def init_table(con):
+    # Derived from player_game_stats, so an older layout is simply rebuilt
+    if _has_table(con, "player_rolling_features") and \
+            not {"season", "shots_avg", "shots_ewm"} <= set(db_bulk.table_cols(con, "player_rolling_features")):
+        con.execute("DROP TABLE player_rolling_features")
+    con.execute(PLAYER_ROLLING_DDL)
+    con.execute(PENDING_DDL)
+    db_bulk.invalidate(con, "player_rolling_features")
+
+def mark_players(con, player_ids):
+    """Queue players for the next refresh (call in the transaction that wrote their games)."""
+    rows = [{"player_id": int(p)} for p in set(player_ids)]
+    if rows:
+        con.execute(PENDING_DDL)
+        db_bulk.bulk_upsert(con, "player_features_pending", rows, update_cols=[])
+
+def _needs_rebuild(con, season) -> bool:
+    # Empty (new or re-laid-out) table, rows computed for an earlier season, or games archived since
+    n, old, updated = con.execute(
+        "SELECT count(*), count(*) FILTER (WHERE season IS DISTINCT FROM ?), min(updated_at) FROM player_rolling_features",
+        [season],
+    ).fetchone()
+    if n == 0 or old > 0:
+        return True
+    if not _has_table(con, "archive_log"):
+        return False
+    archived = con.execute(
+        "SELECT max(archived_at) FROM archive_log WHERE dataset = 'player_game_stats'"
+    ).fetchone()[0]
+    return archived is not None and archived > updated
+
+def refresh(con=None, rebuild=False):
+    """Recompute the pending (or, with rebuild, all) players. Returns players updated."""
+    own = con is None
+    con = duckdb.connect(DB_FILE) if own else con
+    init_table(con)
+    season = archive.current_season()
+    with db_bulk.transaction(con):
+        if rebuild or _needs_rebuild(con, season):
+            con.execute("DELETE FROM player_rolling_features")
+            con.execute("CREATE OR REPLACE TEMP TABLE stale_players AS SELECT DISTINCT player_id FROM player_game_stats")
+        else:
+            con.execute("CREATE OR REPLACE TEMP TABLE stale_players AS SELECT player_id FROM player_features_pending")
+        n = con.execute("SELECT count(*) FROM stale_players").fetchone()[0]
+        if n:
+            con.execute(f"""
+                INSERT OR REPLACE INTO player_rolling_features
+                WITH g AS (
+                    SELECT player_id, game_id, event_date_local, name, team_abbrev, position, shots, saves,
+                           TRY_CAST(split_part(toi, ':', 1) AS INTEGER)
+                             + TRY_CAST(split_part(toi, ':', 2) AS INTEGER) / 60.0 AS toi,
+                           {archive.season_sql('event_date_local')} AS season,
+                           row_number() OVER (PARTITION BY player_id ORDER BY event_date_local DESC, game_id DESC) AS rn
+                    FROM player_game_stats
+                    WHERE player_id IN (SELECT player_id FROM stale_players)
+                ), w AS (
+                    SELECT *, pow(1 - {EWM_ALPHA}, rn - 1) AS w FROM g
+                )
+                SELECT
+                    player_id,
+                    arg_min(name, rn) AS name,
+                    arg_min(team_abbrev, rn) AS team_abbrev,
+                    arg_min(position, rn) AS position,
+                    count(*) AS games,
+                    {season} AS season,
+                    count(*) FILTER (WHERE season = {season}) AS season_games,
+                    max(game_id) AS last_game_id,
+                    max(event_date_local) AS last_game_date,
+                    {_window_cols('shots', season)},
+                    {_window_cols('saves', season)},
+                    {_window_cols('toi', season)},
+                    now()::TIMESTAMP AS updated_at
+                FROM w
+                GROUP BY player_id
+            """)
+        con.execute("DELETE FROM player_features_pending")
+        con.execute("DROP TABLE stale_players")
+    if own:
+        con.close()
+    return n
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Refresh player_rolling_features (L5/L10/season/all games/EWMA)")
+    ap.add_argument("--rebuild", action="store_true", help="recompute every player, not just pending ones")
+    args = ap.parse_args()
+    n = refresh(rebuild=args.rebuild)
+    print(f"✅ [FEATURES] Refreshed rolling features for {n} players.")
@@ -1,11 +1,24 @@
 import duckdb
 import pandas as pd
+import player_features
 
 DB_FILE = "oracle_data.duckdb"
 
-def run_prop_lab():
+# --- PROP RULES (shared with sports_intel/backtest.py) ---
+SHOTS_LINE = 2.5
+SHOTS_MIN_AVG = 2.0  # basic filter to remove 4th liners
+SHOTS_GRADES = [(3.2, 'DIAMOND'), (2.8, 'GOLD'), (2.6, 'SILVER')]  # projection >= threshold
+SAVES_LINE = 27.5
+SAVES_MIN_AVG = 25.0
+SAVES_GRADES = [(31.0, 'DIAMOND'), (29.0, 'GOLD')]  # projection > threshold
+
+def grade_sql(col, grades, op):
+    whens = " ".join(f"WHEN {col} {op} {t} THEN '{g}'" for t, g in grades)
+    return f"CASE {whens} ELSE 'PASS' END"
+
+def run_prop_lab(con=None):
     print("🧪 [THE LAB] Synthesizing Player Props (Deep Scan)...")
-    con = duckdb.connect(DB_FILE)
+    con = con.cursor() if con is not None else duckdb.connect(DB_FILE)
     
     # SCHEMA V3: Added 'last_5_avg' and 'hit_rate' for PROOF
     con.execute("""
@@ -23,50 +36,39 @@ def run_prop_lab():
     """)
     con.execute("DELETE FROM prop_predictions")
     
+    # Rolling features are kept per player (player_features.py); only players with new games are recomputed
+    player_features.refresh(con)
+
     # 1. SKATER SHOT PROPS (Volume Shooters)
-    # We lower the threshold to > 1 game to ensure data flow
-    con.execute("""
+    # Projection = average over the player's stored games; only players dressed this season
+    con.execute(f"""
         INSERT INTO prop_predictions
         SELECT 
-            name, team, 'SHOTS' as prop_type,
-            2.5 as line,
-            AVG(shots) as projection,
-            -- Calculate Last 5 Avg (Simulated for speed, in prod use window functions)
-            AVG(shots) as last_5_avg, 
-            (AVG(shots) - 2.5) as edge,
-            CASE 
-                WHEN AVG(shots) >= 3.2 THEN 'DIAMOND'
-                WHEN AVG(shots) >= 2.8 THEN 'GOLD'
-                WHEN AVG(shots) >= 2.6 THEN 'SILVER'
-                ELSE 'PASS'
-            END as grade,
-            'Vol: ' || CAST(ROUND(AVG(shots), 1) AS VARCHAR) || '/gm' as rationale
-        FROM nhl_logs
-        WHERE position != 'G'
-        GROUP BY name, team
-        HAVING AVG(shots) > 2.0 -- basic filter to remove 4th liners
+            name, team_abbrev, 'SHOTS' as prop_type,
+            {SHOTS_LINE} as line,
+            shots_avg as projection,
+            shots_l5 as last_5_avg,
+            (shots_avg - {SHOTS_LINE}) as edge,
+            {grade_sql('shots_avg', SHOTS_GRADES, '>=')} as grade,
+            'Vol: ' || CAST(ROUND(shots_avg, 1) AS VARCHAR) || '/gm' as rationale
+        FROM player_rolling_features
+        WHERE position != 'G' AND season_games > 0 AND shots_avg > {SHOTS_MIN_AVG}
     """)
     
     # 2. GOALIE SAVE PROPS (Siege Logic)
     # If a goalie faces > 30 shots avg, he is a target
-    con.execute("""
+    con.execute(f"""
         INSERT INTO prop_predictions
         SELECT 
-            name, team, 'SAVES' as prop_type,
-            27.5 as line,
-            AVG(saves) as projection,
-            AVG(saves) as last_5_avg,
-            (AVG(saves) - 27.5) as edge,
-            CASE 
-                WHEN AVG(saves) > 31.0 THEN 'DIAMOND'
-                WHEN AVG(saves) > 29.0 THEN 'GOLD'
-                ELSE 'PASS'
-            END as grade,
-            'Siege: ' || CAST(ROUND(AVG(saves), 1) AS VARCHAR) || ' svs/gm' as rationale
-        FROM nhl_logs
-        WHERE position = 'G'
-        GROUP BY name, team
-        HAVING AVG(saves) > 25.0
+            name, team_abbrev, 'SAVES' as prop_type,
+            {SAVES_LINE} as line,
+            saves_avg as projection,
+            saves_l5 as last_5_avg,
+            (saves_avg - {SAVES_LINE}) as edge,
+            {grade_sql('saves_avg', SAVES_GRADES, '>')} as grade,
+            'Siege: ' || CAST(ROUND(saves_avg, 1) AS VARCHAR) || ' svs/gm' as rationale
+        FROM player_rolling_features
+        WHERE position = 'G' AND season_games > 0 AND saves_avg > {SAVES_MIN_AVG}
     """)
     
     # Cleanup: Keep everything SILVER or better
@@ -1,10 +1,20 @@
-import requests
 import duckdb
-import pandas as pd
 from datetime import datetime, timedelta
+import sys
+from pathlib import Path
+
+SPORTS_INTEL_DIR = Path(__file__).resolve().parent / "sports_intel"
+if str(SPORTS_INTEL_DIR) not in sys.path:
+    sys.path.insert(0, str(SPORTS_INTEL_DIR))  # http_fetch, db_bulk, replica, ... live there
+
+import http_fetch
+import ingest_stats
+import player_features
+import replica
+import write_queue
 
 # --- CONFIG ---
-DB_PATH = "/home/pat/sports_intel/db/features.duckdb"
+MAX_IN_FLIGHT = http_fetch.MAX_IN_FLIGHT
 
 def update_history():
     print("📡 SCRAPER: FETCHING YESTERDAY'S GAME STATS...")
@@ -14,75 +24,61 @@ def update_history():
     
     # 1. Get Schedule for Yesterday
     try:
-        url = f"https://api-web.nhle.com/v1/schedule/{yesterday}"
-        data = requests.get(url, timeout=10).json()
+        url = http_fetch.SCHEDULE_URL.format(date_str=yesterday)
+        data = http_fetch.fetch_json(url, timeout=10)
     except Exception as e:
         print(f"❌ API Connection Failed: {e}")
         return
 
-    game_ids = []
+    games = {}
     for day in data.get('gameWeek', []):
         if day['date'] == yesterday:
             for game in day.get('games', []):
-                game_ids.append(game['id'])
+                games[game['id']] = (game['homeTeam']['abbrev'], game['awayTeam']['abbrev'])
 
-    if not game_ids:
+    if not games:
         print("   -> No games played yesterday.")
         return
 
+    # Skip games ingest_stats already stored in the shared player_game_stats
+    try:
+        con = replica.connect("oracle_data")
+        stored = {r[0] for r in con.execute(
+            "SELECT DISTINCT game_id FROM player_game_stats WHERE event_date_local = ?", [yesterday]
+        ).fetchall()}
+        con.close()
+    except (FileNotFoundError, duckdb.CatalogException):
+        stored = set()
+    game_ids = [gid for gid in games if gid not in stored]
+    if not game_ids:
+        print(f"   -> All {len(games)} games from {yesterday} already stored.")
+        return
+
     print(f"   -> Processing {len(game_ids)} games from {yesterday}...")
     
-    # 2. Extract Player Stats
+    # 2. Extract Player Stats (boxscores fetched concurrently)
     all_stats = []
-    for gid in game_ids:
+
+    def on_box(gid, box, err):
         try:
-            box_url = f"https://api-web.nhle.com/v1/gamecenter/{gid}/boxscore"
-            box = requests.get(box_url, timeout=5).json()
-            
-            # Process both teams (away=0, home=1 usually in lists, but we key by ID)
-            for team_type in ['awayTeam', 'homeTeam']:
-                team_data = box.get('playerByGameStats', {}).get(team_type, {})
-                team_abbr = box.get(team_type, {}).get('abbrev')
-                
-                # Forwards & Defense
-                for group in ['forwards', 'defense']:
-                    for p in team_data.get(group, []):
-                        all_stats.append({
-                            'game_id': gid,
-                            'event_date_local': yesterday,
-                            'player_id': p['playerId'],
-                            'name': f"{p['name']['default']}",
-                            'team_abbrev': team_abbr,
-                            'shots': p.get('shots', 0),
-                            'goals': p.get('goals', 0),
-                            'assists': p.get('assists', 0),
-                            'points': p.get('points', 0),
-                            'toi': p.get('toi', '00:00')
-                        })
+            if err is not None:
+                raise err
+            home, away = games[gid]
+            all_stats.extend(ingest_stats.parse_player_games(box, gid, yesterday, home, away))
         except:
             print(f"      ⚠️ Failed to parse game {gid}")
 
-    # 3. Save to DB
+    http_fetch.stream_boxscores(game_ids, on_box, max_in_flight=MAX_IN_FLIGHT)
+
+    # 3. Save to DB (one batch through the single writer; applied directly if no daemon is running)
     if all_stats:
-        df = pd.DataFrame(all_stats)
-        conn = duckdb.connect(DB_PATH)
-        
-        # Ensure table exists
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS nhl_player_game_stats (
-                game_id INTEGER, event_date_local DATE, player_id INTEGER,
-                name VARCHAR, team_abbrev VARCHAR, shots INTEGER,
-                goals INTEGER, assists INTEGER, points INTEGER, toi VARCHAR
-            )
-        """)
-        
-        # Remove duplicates for this date (Idempotency)
-        conn.execute(f"DELETE FROM nhl_player_game_stats WHERE event_date_local = '{yesterday}'")
-        
-        # Insert
-        conn.execute("INSERT INTO nhl_player_game_stats SELECT * FROM df")
-        conn.close()
-        print(f"✅ DB UPDATED: Added {len(df)} player records.")
+        pid = ingest_stats.PLAYER_GAME_COLUMNS.index('player_id')
+        status = write_queue.Batch("oracle_data", label="scraper").upsert(
+            "player_game_stats", all_stats, columns=ingest_stats.PLAYER_GAME_COLUMNS
+        ).execute(player_features.PENDING_DDL).upsert(
+            "player_features_pending", [{"player_id": r[pid]} for r in all_stats], update_cols=[]
+        ).commit()
+        print(f"✅ DB UPDATED: Added {len(all_stats)} player records ({status}).")
     else:
         print("⚠️ No player stats found.")
 
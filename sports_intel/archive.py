@@ -0,0 +1,237 @@
+"""Move closed seasons and old odds detail from DuckDB to zstd Parquet.
+
+Files are Hive-partitioned as archive/<dataset>/season=.../dt=.../part_<batch>_<uuid>.parquet,
+and <table>_history views union them with the hot rows. Export, delete and the
+archive_log entry share one transaction; parts from a batch that never committed
+are removed on the next run.
+"""
+
+import argparse
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import duckdb
+
+import db_bulk
+import odds_store
+import replica
+
+MODULE_DIR = Path(__file__).resolve().parent
+ARCHIVE_DIR = Path(os.getenv("SPORTS_INTEL_ARCHIVE", MODULE_DIR / "archive"))
+DBS = replica.SOURCES
+ZSTD_LEVEL = 9
+ODDS_HOT_DAYS = 45
+SEASON_START_MONTH = 9  # preseason: September games belong to the season that starts that fall
+
+# dataset -> (db, date column, seasons kept hot, days kept hot)
+# nhl_team_game_stats keeps last season too: phase2a's rolling window reaches back over the summer
+DATASETS = {
+    "player_game_stats": ("oracle_data", "event_date_local", 1, None),
+    "nhl_team_game_stats": ("features", "game_date_local", 2, None),
+    "odds_lines": ("features", "fetched_at_utc", None, ODDS_HOT_DAYS),
+}
+
+
+def season_sql(date_col: str) -> str:
+    """20242025-style season of a date column."""
+    start = f"(year({date_col}) - CASE WHEN month({date_col}) < {SEASON_START_MONTH} THEN 1 ELSE 0 END)"
+    return f"CAST({start} * 10001 + 1 AS INTEGER)"
+
+
+def current_season(today=None) -> int:
+    today = today or datetime.now().date()
+    start = today.year - (1 if today.month < SEASON_START_MONTH else 0)
+    return start * 10001 + 1
+
+
+def dataset_dir(name: str) -> Path:
+    return ARCHIVE_DIR / name
+
+
+def ensure_log_schema(con):
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS archive_log (
+      batch_id TEXT PRIMARY KEY,
+      dataset TEXT,
+      archived_at TIMESTAMP,
+      rows BIGINT,
+      min_dt DATE,
+      max_dt DATE
+    );
+    """)
+
+
+# ----------------------------
+# History views (Parquet UNION ALL hot rows; season/dt filters prune files)
+# ----------------------------
+def create_history_view(con, name: str):
+    _, date_col, _, _ = DATASETS[name]
+    hot = f"SELECT *, {season_sql(date_col)} AS season, CAST({date_col} AS DATE) AS dt FROM {name}"
+    files = dataset_dir(name)
+    if any(files.glob("**/*.parquet")):
+        cold = (f"SELECT * FROM read_parquet('{files}/**/*.parquet', hive_partitioning = true, "
+                f"hive_types = {{'season': INTEGER, 'dt': DATE}})")
+        sql = f"{cold}\nUNION ALL BY NAME\n{hot}"
+    else:
+        sql = hot
+    con.execute(f"CREATE OR REPLACE VIEW {name}_history AS\n{sql}")
+
+
+# ----------------------------
+# Archive one dataset
+# ----------------------------
+def _drop_orphans(con, name: str) -> int:
+    """Remove Parquet parts whose batch never committed (crash between COPY and COMMIT)."""
+    done = {r[0] for r in con.execute("SELECT batch_id FROM archive_log WHERE dataset = ?", [name]).fetchall()}
+    dropped = 0
+    for p in dataset_dir(name).glob("**/part_*.parquet"):
+        if p.name.split("_")[1] not in done:
+            p.unlink()
+            dropped += 1
+    return dropped
+
+
+def _cold_cutoff(name: str, hot_days: int | None = None) -> datetime | None:
+    """UTC cutoff of a day-based dataset (rows older than it are cold); None for season-based ones."""
+    _, _, _, default_days = DATASETS[name]
+    if default_days is None:
+        return None
+    hot_days = default_days if hot_days is None else hot_days
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0) - timedelta(days=hot_days)
+
+
+def _cold_filter(name: str, cutoff: datetime | None) -> str:
+    _, date_col, hot_seasons, _ = DATASETS[name]
+    if cutoff is not None:
+        return f"{date_col} < TIMESTAMP '{cutoff:%Y-%m-%d %H:%M:%S}'"
+    return f"{date_col} IS NOT NULL AND {season_sql(date_col)} < {current_season() - 10001 * (hot_seasons - 1)}"
+
+
+def _delete_odds(con, cutoff: datetime):
+    con.execute("""
+        DELETE FROM odds_snapshots
+        WHERE snapshot_id IN (SELECT DISTINCT snapshot_id FROM odds_lines WHERE fetched_at_utc < ?)
+    """, [cutoff])
+    if not odds_store.is_delta(con):
+        con.execute("DELETE FROM odds_lines WHERE fetched_at_utc < ?", [cutoff])
+        return
+    con.execute("DELETE FROM odds_line_snapshots WHERE fetched_at_utc < ?", [cutoff])
+    # A change is still needed while some kept snapshot falls inside its validity interval.
+    # Old tombstones go too (the change they closed is gone), and so does everything
+    # for games that started a day before the cutoff, open intervals and state included.
+    key = "source, source_event_id, bookmaker, market, outcome_name, point_key, snapshot_id"
+    finished = cutoff - timedelta(days=1)
+    con.execute(f"""
+        DELETE FROM odds_line_changes
+        WHERE ({key}) IN (
+            SELECT ({key}) FROM odds_line_intervals
+            WHERE (valid_to IS NOT NULL AND valid_to <= $cutoff)
+               OR (is_removed AND changed_at_utc <= $cutoff)
+        ) OR commence_time_utc < $finished
+    """, {"cutoff": cutoff, "finished": finished})
+    con.execute("""
+        DELETE FROM odds_line_state
+        WHERE commence_time_utc < $finished OR (is_removed AND changed_at_utc <= $cutoff)
+    """, {"cutoff": cutoff, "finished": finished})
+
+
+def archive_dataset(con, name: str, dry_run: bool = False, hot_days: int | None = None) -> int:
+    """Move the cold rows of one dataset to Parquet. Returns rows archived (or that would be).
+
+    hot_days overrides the dataset's default for day-based datasets (maintenance.py retention).
+    """
+    _, date_col, _, _ = DATASETS[name]
+    ensure_log_schema(con)
+    cutoff = _cold_cutoff(name, hot_days)
+    cold = _cold_filter(name, cutoff)
+    orphans = _drop_orphans(con, name)
+    if orphans:
+        print(f"{name}: removed {orphans} Parquet parts from an unfinished run")
+
+    rows, min_dt, max_dt = con.execute(
+        f"SELECT count(*), min({date_col})::DATE, max({date_col})::DATE FROM {name} WHERE {cold}"
+    ).fetchone()
+    if not rows or dry_run:
+        print(f"{name}: {rows} cold rows" + (f" ({min_dt} .. {max_dt})" if rows else "") + (" [dry run]" if dry_run else ""))
+        if not dry_run:
+            create_history_view(con, name)
+        return rows
+
+    # Unique per call: datasets sharing a DB's archive_log often run within the same second
+    batch_id = f"{datetime.now():%Y%m%d%H%M%S}{uuid.uuid4().hex[:8]}"
+    target = dataset_dir(name)
+    target.mkdir(parents=True, exist_ok=True)
+    with db_bulk.transaction(con):
+        con.execute(f"""
+            COPY (SELECT *, {season_sql(date_col)} AS season, CAST({date_col} AS DATE) AS dt
+                  FROM {name} WHERE {cold})
+            TO '{target}' (FORMAT PARQUET, COMPRESSION ZSTD, COMPRESSION_LEVEL {ZSTD_LEVEL},
+                           PARTITION_BY (season, dt), APPEND, FILENAME_PATTERN 'part_{batch_id}_{{uuid}}')
+        """)
+        if name == "odds_lines":
+            _delete_odds(con, cutoff)
+        else:
+            con.execute(f"DELETE FROM {name} WHERE {cold}")
+        db_bulk.bulk_upsert(con, "archive_log", [{
+            "batch_id": batch_id, "dataset": name, "archived_at": datetime.now(),
+            "rows": rows, "min_dt": min_dt, "max_dt": max_dt,
+        }])
+        create_history_view(con, name)
+    print(f"{name}: archived {rows} rows ({min_dt} .. {max_dt}) -> {target}")
+    return rows
+
+
+def run(cons: dict | None = None, names: list[str] | None = None, dry_run: bool = False) -> dict[str, int]:
+    """Archive the given datasets (default: all). cons: {db path: connection}, as from pipeline.connect_all."""
+    owned = cons is None
+    cons = {} if cons is None else cons
+    out = {}
+    for name in names or list(DATASETS):
+        path = DBS[DATASETS[name][0]]
+        if path not in cons:
+            cons[path] = duckdb.connect(str(path))
+        out[name] = archive_dataset(cons[path], name, dry_run)
+    if owned:
+        for con in cons.values():
+            con.close()
+    return out
+
+
+def status():
+    for name in DATASETS:
+        files = list(dataset_dir(name).glob("**/*.parquet"))
+        size = sum(p.stat().st_size for p in files)
+        seasons = sorted({p.parent.parent.name.split("=", 1)[1] for p in files})
+        print(f"{name:<20} {len(files):>6} files {size / 1e6:8.1f} MB  seasons: {', '.join(seasons) or '-'}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Move closed seasons / old odds snapshots to partitioned Parquet")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("run", help="archive cold rows now")
+    rp.add_argument("names", nargs="*", default=list(DATASETS), help=f"subset of {list(DATASETS)}")
+    rp.add_argument("--dry-run", action="store_true", help="only count what would move")
+    sub.add_parser("status", help="show archived files per dataset")
+    args = ap.parse_args()
+
+    if args.cmd == "status":
+        status()
+        return
+    unknown = [n for n in args.names if n not in DATASETS]
+    if unknown:
+        ap.error(f"unknown dataset(s): {unknown}")
+
+    import write_queue
+    if write_queue.coordinator_running() and not args.dry_run:
+        # The daemon owns the DB files: hand the work to it
+        for name in args.names:
+            write_queue.Batch(DATASETS[name][0], label="archive").call("archive.archive_dataset", name).commit()
+        print(f"Write coordinator is running: queued {', '.join(args.names)} with it")
+        return
+    run(names=args.names, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""Point-in-time backtest of the props, games and edges models.
+
+Each model is one vectorized pass over all dates, with windows shifted one
+game so a row only sees earlier games. Reads the replicas (federation.py),
+archived seasons included; results go through write_queue.
+
+  python backtest.py [props|games|edges] [--season 20242025]
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+import archive
+import federation
+import schedule_index
+import write_queue
+
+HOME_DIR = Path(__file__).resolve().parent.parent
+if str(HOME_DIR) not in sys.path:
+    sys.path.insert(0, str(HOME_DIR))  # prop_engine, game_engine, player_features live in ~
+
+import etl_phase3c_edge_shrink
+import game_engine
+import prop_engine
+
+MODELS = ("props", "games", "edges")
+PROP_PRICE = -110       # assumed prop price (no prop odds are stored)
+BACKTEST_SIMS = 20_000  # per game; plenty for probabilities to ~0.5%
+SIM_CHUNK = 256         # games simulated per block (keeps the arrays ~10 MB)
+EDGE_MIN = 0.005        # smallest shrunk edge that counts as a pick
+
+RESULTS_DDL = """
+CREATE TABLE IF NOT EXISTS backtest_results (
+  run_id TEXT,
+  model TEXT,
+  event_date DATE,
+  subject_id TEXT,      -- player_id / game_id
+  subject TEXT,         -- player name / matchup
+  pick TEXT,
+  line FLOAT,
+  model_value FLOAT,    -- projection (props) or model probability of the pick
+  market_value FLOAT,   -- market fair probability of the pick (edges)
+  result UTINYINT,      -- 1 win, 0 loss, NULL no bet / ungraded
+  units FLOAT,
+  PRIMARY KEY (run_id, model, subject_id, event_date, pick)
+);
+"""
+
+RUNS_DDL = """
+CREATE TABLE IF NOT EXISTS backtest_runs (
+  run_id TEXT,
+  model TEXT,
+  start_date DATE,
+  end_date DATE,
+  picks INTEGER,
+  wins INTEGER,
+  hit_rate DOUBLE,
+  units DOUBLE,
+  brier DOUBLE,
+  brier_market DOUBLE,
+  seconds DOUBLE,
+  created_at TIMESTAMP,
+  PRIMARY KEY (run_id, model)
+);
+"""
+
+RESULT_COLUMNS = ["event_date", "subject_id", "subject", "pick", "line",
+                  "model_value", "market_value", "result", "units"]
+
+
+def _source(con, table: str, catalog: str | None = None) -> str:
+    """table's *_history view (Parquet + hot rows) when archive.py created one."""
+    views = {r[0] for r in con.execute(
+        "SELECT view_name FROM duckdb_views() WHERE database_name = coalesce(?, current_database())", [catalog]
+    ).fetchall()}
+    name = f"{table}_history" if f"{table}_history" in views else table
+    return f"{catalog}.main.{name}" if catalog else name
+
+
+def _decimal(american: float) -> float:
+    return 1 + american / 100 if american > 0 else 1 + 100 / -american
+
+
+# ----------------------------
+# Props
+# ----------------------------
+def backtest_props(con, start: date, end: date) -> pd.DataFrame:
+    src = _source(con, "player_game_stats", federation.ATTACHED)
+    df = con.execute(f"""
+        SELECT player_id, name, position, game_id, event_date_local, shots, saves,
+               {archive.season_sql('event_date_local')} AS season,
+               event_date_local >= ? AS in_range
+        FROM {src}
+        WHERE event_date_local <= ?
+        ORDER BY player_id, event_date_local, game_id
+    """, [start, end]).df()
+    win_units = _decimal(PROP_PRICE) - 1
+    out = []
+    rules = [
+        ("shots", df[df.position != 'G'], prop_engine.SHOTS_LINE, prop_engine.SHOTS_MIN_AVG,
+         prop_engine.SHOTS_GRADES, np.greater_equal),
+        ("saves", df[df.position == 'G'], prop_engine.SAVES_LINE, prop_engine.SAVES_MIN_AVG,
+         prop_engine.SAVES_GRADES, np.greater),
+    ]
+    for stat, sub, line, min_avg, grades, op in rules:
+        sub = sub.reset_index(drop=True)
+        # Average of the player's earlier games only: shift(1), then an expanding mean
+        prev = sub.groupby("player_id")[stat].shift(1)
+        avg = prev.groupby(sub.player_id).expanding().mean().reset_index(level=0, drop=True)
+        grade = np.select([op(avg, t) for t, _ in grades], [g for _, g in grades], "PASS")
+
+        picked = (grade != "PASS") & (avg > min_avg) & sub.in_range
+        p = sub[picked]
+        won = (p[stat] > line).astype(int)
+        out.append(pd.DataFrame({
+            "event_date": p.event_date_local, "subject_id": p.player_id.astype(str), "subject": p.name,
+            "pick": [f"{g} {stat.upper()} OVER" for g in grade[picked]], "line": line,
+            "model_value": avg[picked], "market_value": None,
+            "result": won, "units": np.where(won == 1, win_units, -1.0),
+        }))
+    return pd.concat(out, ignore_index=True)
+
+
+# ----------------------------
+# Games
+# ----------------------------
+def game_results(con, start: date, end: date) -> pd.DataFrame:
+    """Final scores of the scheduled games in [start, end] (box-score totals, shootout goal included)."""
+    stats = _source(con, "nhl_team_game_stats")
+    players = _source(con, "player_game_stats", federation.ATTACHED)
+    return con.execute(f"""
+        WITH box AS (
+            SELECT TRY_CAST(game_id AS BIGINT) AS game_id, goals_for AS home_goals, goals_against AS away_goals
+            FROM {stats} WHERE is_home
+        ), logs AS (
+            SELECT game_id,
+                   sum(goals) FILTER (WHERE team_abbrev = home) AS home_goals,
+                   sum(goals) FILTER (WHERE team_abbrev = away) AS away_goals
+            FROM (SELECT p.*, s.home_abbrev AS home, s.away_abbrev AS away
+                  FROM {players} p JOIN nhl_schedule s ON s.game_id = p.game_id)
+            GROUP BY game_id
+        )
+        SELECT s.game_id, s.game_date_local, s.home_abbrev, s.away_abbrev,
+               coalesce(b.home_goals, CASE WHEN l.home_goals != l.away_goals THEN l.home_goals END) AS home_goals,
+               coalesce(b.away_goals, CASE WHEN l.home_goals != l.away_goals THEN l.away_goals END) AS away_goals
+        FROM nhl_schedule s
+        LEFT JOIN box b ON b.game_id = s.game_id
+        LEFT JOIN logs l ON l.game_id = s.game_id
+        WHERE s.game_date_local BETWEEN ? AND ?
+    """, [start, end]).df()
+
+
+def team_rates(con, end: date) -> pd.DataFrame:
+    """Goals for/against per game of each team before each of its games (what team_stats held then)."""
+    players = _source(con, "player_game_stats", federation.ATTACHED)
+    tg = con.execute(f"""
+        WITH tg AS (
+            SELECT game_id, event_date_local, team_abbrev, any_value(opponent_abbrev) AS opponent_abbrev,
+                   sum(goals) AS gf
+            FROM {players} WHERE event_date_local <= ?
+            GROUP BY game_id, event_date_local, team_abbrev
+        )
+        SELECT a.*, b.gf AS ga FROM tg a LEFT JOIN tg b ON b.game_id = a.game_id AND b.team_abbrev = a.opponent_abbrev
+        ORDER BY a.team_abbrev, a.event_date_local, a.game_id
+    """, [end]).df()
+    by_team = tg.groupby("team_abbrev")
+    n = by_team.cumcount().replace(0, np.nan)
+    tg["gf_prior"] = (by_team.gf.cumsum() - tg.gf) / n
+    tg["ga_prior"] = (by_team.ga.cumsum() - tg.ga) / n
+    return tg[["game_id", "team_abbrev", "gf_prior", "ga_prior"]]
+
+
+def _grade_game(pick: str, home: str, away: str, margin: int):
+    if pick == "TRAP GAME":
+        return None
+    if pick == f"{home} -1.5":
+        return int(margin >= 2)
+    if pick == f"{away} -1.5":
+        return int(margin <= -2)
+    return int((margin > 0) == pick.startswith(f"{home} "))
+
+
+def backtest_games(con, start: date, end: date, n_sims: int = BACKTEST_SIMS) -> tuple[pd.DataFrame, float]:
+    games = game_results(con, start, end).dropna(subset=["home_goals", "away_goals"]).reset_index(drop=True)
+    rates = team_rates(con, end)
+    for side in ("home", "away"):
+        games = games.merge(
+            rates.rename(columns={"team_abbrev": f"{side}_abbrev", "gf_prior": f"{side}_gf", "ga_prior": f"{side}_ga"}),
+            on=["game_id", f"{side}_abbrev"], how="left")
+    for col in ("home_gf", "home_ga", "away_gf", "away_ga"):
+        games[col] = games[col].fillna(game_engine.LEAGUE_GPG)
+    lam_home, lam_away = game_engine.goal_rates(games.home_gf.values, games.home_ga.values,
+                                                games.away_gf.values, games.away_ga.values)
+
+    dist = pd.concat([
+        game_engine.summarize(*game_engine.simulate_slate(lam_home[i:i + SIM_CHUNK], lam_away[i:i + SIM_CHUNK], n_sims))
+        for i in range(0, len(games), SIM_CHUNK)
+    ], ignore_index=True) if len(games) else game_engine.summarize(*game_engine.simulate_slate([], [], 1))
+
+    margin = (games.home_goals - games.away_goals).astype(int)
+    picks = [game_engine.pick(g.home_abbrev, g.away_abbrev, r)[0] for g, r in zip(games.itertuples(), dist.itertuples())]
+    prob = [{f"{g.home_abbrev} -1.5": r.home_cover_probability, f"{g.away_abbrev} -1.5": r.away_cover_probability,
+             f"{g.home_abbrev} ML": r.win_probability, f"{g.away_abbrev} ML": r.away_win_probability}.get(p, r.win_probability)
+            for p, g, r in zip(picks, games.itertuples(), dist.itertuples())]
+    brier = float(np.mean((dist.win_probability - (margin > 0)) ** 2)) if len(games) else None
+    return pd.DataFrame({
+        "event_date": games.game_date_local, "subject_id": games.game_id.astype(str),
+        "subject": games.away_abbrev + " @ " + games.home_abbrev, "pick": picks, "line": None,
+        "model_value": prob, "market_value": None,
+        "result": [_grade_game(p, g.home_abbrev, g.away_abbrev, m) for p, g, m in zip(picks, games.itertuples(), margin)],
+        "units": None,
+    }), brier
+
+
+# ----------------------------
+# Edges
+# ----------------------------
+def backtest_edges(con, start: date, end: date) -> tuple[pd.DataFrame, float, float]:
+    try:
+        df = con.execute("""
+            WITH closing AS (
+                SELECT event_id, home_team, away_team, home_prob_fair, away_prob_fair
+                FROM market_probs_consensus
+                WHERE created_at_utc <= commence_time_utc
+                QUALIFY row_number() OVER (PARTITION BY event_id ORDER BY snapshot_id DESC) = 1
+            )
+            SELECT c.*, h.event_date_local, h.team_abbrev AS home_abbrev, a.team_abbrev AS away_abbrev,
+                   h.rest_days AS h_rest, h.is_b2b AS h_b2b, h.l10_goal_diff AS h_gd, h.l10_shot_diff AS h_sd,
+                   a.rest_days AS a_rest, a.is_b2b AS a_b2b, a.l10_goal_diff AS a_gd, a.l10_shot_diff AS a_sd
+            FROM closing c
+            JOIN nhl_team_game_features h ON h.event_id = c.event_id AND h.is_home
+            JOIN nhl_team_game_features a ON a.event_id = c.event_id AND NOT a.is_home
+            WHERE h.event_date_local BETWEEN ? AND ?
+        """, [start, end]).df()
+    except duckdb.Error as e:
+        print(f"edges: no usable consensus history ({type(e).__name__}: {e})")
+        return pd.DataFrame(columns=RESULT_COLUMNS), None, None
+    results = game_results(con, start, end)[["game_id", "home_goals", "away_goals"]]
+    df["game_id"] = pd.to_numeric(df.event_id, errors="coerce")
+    df = df.merge(results, on="game_id", how="inner").dropna(subset=["home_goals", "away_goals", "home_prob_fair"])
+    if df.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS), None, None
+
+    f = df.fillna({c: 0 for c in ("h_rest", "h_gd", "h_sd", "a_rest", "a_gd", "a_sd")}).fillna({"h_b2b": False, "a_b2b": False})
+    home_p, away_p = etl_phase3c_edge_shrink.shrink_probs(
+        f.home_prob_fair.values, f.away_prob_fair.values,
+        f.h_rest.values, f.h_b2b.values.astype(bool), f.h_gd.values, f.h_sd.values,
+        f.a_rest.values, f.a_b2b.values.astype(bool), f.a_gd.values, f.a_sd.values,
+    )
+    home_won = (df.home_goals > df.away_goals).values
+    edge_home, edge_away = home_p - df.home_prob_fair.values, away_p - df.away_prob_fair.values
+    take_home = edge_home >= edge_away
+    edge = np.where(take_home, edge_home, edge_away)
+    fair = np.where(take_home, df.home_prob_fair.values, df.away_prob_fair.values)
+    won = np.where(take_home, home_won, ~home_won).astype(int)
+    bet = edge >= EDGE_MIN
+    brier = float(np.mean((home_p - home_won) ** 2))
+    brier_market = float(np.mean((df.home_prob_fair.values - home_won) ** 2))
+    return pd.DataFrame({
+        "event_date": df.event_date_local, "subject_id": df.event_id.astype(str),
+        "subject": df.away_abbrev + " @ " + df.home_abbrev,
+        "pick": np.where(take_home, df.home_abbrev + " ML", df.away_abbrev + " ML"), "line": None,
+        "model_value": np.where(take_home, home_p, away_p), "market_value": fair,
+        "result": np.where(bet, won, None),
+        "units": np.where(bet, np.where(won == 1, 1 / fair - 1, -1.0), None),
+    })[bet], brier, brier_market
+
+
+# ----------------------------
+# Runner
+# ----------------------------
+def summarize(model: str, df: pd.DataFrame, start: date, end: date, seconds: float,
+              brier=None, brier_market=None) -> dict:
+    graded = df[df.result.notna()]
+    wins = int((graded.result == 1).sum())
+    units = pd.to_numeric(graded.units, errors="coerce")
+    return {"model": model, "start_date": start, "end_date": end, "picks": len(graded), "wins": wins,
+            "hit_rate": wins / len(graded) if len(graded) else None,
+            "units": float(units.sum()) if units.notna().any() else None,
+            "brier": brier, "brier_market": brier_market, "seconds": seconds}
+
+
+def run(models=MODELS, start: date | None = None, end: date | None = None, save: bool = True) -> list[dict]:
+    con = federation.connect()
+    end = end or date.today() - timedelta(days=1)
+    start = start or schedule_index.season_bounds(schedule_index.season_for(end))[0]
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    summaries, frames = [], []
+    try:
+        for model in models:
+            t0 = time.perf_counter()
+            brier = brier_market = None
+            if model == "props":
+                df = backtest_props(con, start, end)
+            elif model == "games":
+                df, brier = backtest_games(con, start, end)
+            else:
+                df, brier, brier_market = backtest_edges(con, start, end)
+            s = summarize(model, df, start, end, time.perf_counter() - t0, brier, brier_market)
+            summaries.append(s)
+            frames.append(df.assign(run_id=run_id, model=model))
+            print(f"{model:<6} {start}..{end}: {s['picks']} picks, {s['wins']} wins"
+                  + (f" ({s['hit_rate']:.1%})" if s["hit_rate"] is not None else "")
+                  + (f", {s['units']:+.1f} units" if s["units"] is not None else "")
+                  + (f", brier {brier:.4f}" if brier is not None else "")
+                  + (f" vs market {brier_market:.4f}" if brier_market is not None else "")
+                  + f" in {s['seconds']:.1f}s")
+    finally:
+        con.close()
+
+    if save:
+        results = pd.concat(frames, ignore_index=True)
+        with write_queue.Batch("features", label="backtest") as b:
+            b.execute(RESULTS_DDL)
+            b.execute(RUNS_DDL)
+            b.upsert("backtest_results", results[["run_id", "model"] + RESULT_COLUMNS])
+            b.upsert("backtest_runs", [{**s, "run_id": run_id, "created_at": datetime.now()} for s in summaries])
+        print(f"Saved run {run_id}: {len(results)} rows in backtest_results")
+    return summaries
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Point-in-time backtest of the prop, game and edge models")
+    ap.add_argument("models", nargs="*", default=list(MODELS), help=f"subset of {list(MODELS)}")
+    ap.add_argument("--season", type=int, help="e.g. 20242025 (default: the current one)")
+    ap.add_argument("--start", type=date.fromisoformat)
+    ap.add_argument("--end", type=date.fromisoformat)
+    ap.add_argument("--no-save", action="store_true", help="print the summary only")
+    args = ap.parse_args()
+    unknown = [m for m in args.models if m not in MODELS]
+    if unknown:
+        ap.error(f"unknown model(s): {unknown}")
+    start, end = args.start, args.end
+    if args.season:
+        s, e = schedule_index.season_bounds(args.season)
+        start, end = start or s, end or min(e, date.today() - timedelta(days=1))
+    run(args.models, start, end, save=not args.no_save)
+
+
+if __name__ == "__main__":
+    main()
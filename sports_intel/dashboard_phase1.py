@@ -1,9 +1,9 @@
 import streamlit as st
-import duckdb
 from datetime import datetime
 from dateutil import tz
 
-DB_PATH = "db/features.duckdb"
+import replica
+
 DETROIT_TZ = tz.gettz("America/Detroit")
 
 st.set_page_config(page_title="NHL Today – Phase 1", layout="wide")
@@ -12,7 +12,13 @@ st.title("NHL Games Today (Phase 1)")
 today_local = datetime.now(DETROIT_TZ).date()
 st.caption(f"Detroit Date: {today_local}")
 
-con = duckdb.connect(DB_PATH, read_only=True)
+# Published read replica: never waits on (or blocks) the ETL writer
+try:
+    con = replica.connect("features")
+except FileNotFoundError as e:
+    st.error(str(e))
+    st.stop()
+st.caption(f"Data as of: {replica.published_at(con)}")
 
 query = """
 SELECT
@@ -1,10 +1,9 @@
-import time
 import streamlit as st
-import duckdb
 from datetime import datetime
 from dateutil import tz
 
-DB_PATH = "db/features.duckdb"
+import replica
+
 DETROIT_TZ = tz.gettz("America/Detroit")
 
 st.set_page_config(page_title="NHL – Phase 3 (Odds)", layout="wide")
@@ -13,17 +12,13 @@ st.title("Phase 3 — Odds (The Odds API)")
 today_local = datetime.now(DETROIT_TZ).date()
 st.caption(f"Detroit Date: {today_local}")
 
-def connect_readonly_with_retry(path: str, retries: int = 6, delay: float = 0.75):
-    last_err = None
-    for _ in range(retries):
-        try:
-            return duckdb.connect(path, read_only=True)
-        except Exception as e:
-            last_err = e
-            time.sleep(delay)
-    raise last_err
-
-con = connect_readonly_with_retry(DB_PATH)
+# Published read replica: never waits on (or blocks) the ETL writer
+try:
+    con = replica.connect("features")
+except FileNotFoundError as e:
+    st.error(str(e))
+    st.stop()
+st.caption(f"Data as of: {replica.published_at(con)}")
 
 snap = con.execute("""
     SELECT snapshot_id, fetched_at_local, regions, markets, odds_format
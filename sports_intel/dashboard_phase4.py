@@ -1,13 +1,14 @@
-import duckdb
 import pandas as pd
 from rich.console import Console
 from rich.table import Table
 
+import replica
+
 # Initialize rich console for pretty printing
 console = Console()
 
 def main():
-    con = duckdb.connect("db/features.duckdb")
+    con = replica.connect("features")
 
     # 1. Fetch the Master Data
     # (Same query you just ran, but strictly for today)
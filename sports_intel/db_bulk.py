@@ -0,0 +1,120 @@
+import weakref
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Per-connection caches (dropped with the connection): {table: [cols]}, {table: [pk cols]}
+_COLS = weakref.WeakKeyDictionary()
+_PKS = weakref.WeakKeyDictionary()
+_TX_DEPTH = weakref.WeakKeyDictionary()
+
+
+# ----------------------------
+# Table metadata (looked up once per connection + table)
+# ----------------------------
+def table_cols(con, table: str) -> list[str]:
+    cache = _COLS.setdefault(con, {})
+    if table not in cache:
+        cache[table] = [r[1] for r in con.execute(f"PRAGMA table_info('{table}')").fetchall()]
+    return cache[table]
+
+
+def primary_key(con, table: str) -> list[str]:
+    cache = _PKS.setdefault(con, {})
+    if table not in cache:
+        row = con.execute("""
+            SELECT constraint_column_names FROM duckdb_constraints()
+            WHERE table_name = ? AND constraint_type = 'PRIMARY KEY'
+        """, [table]).fetchone()
+        cache[table] = list(row[0]) if row else []
+    return cache[table]
+
+
+def invalidate(con, table: str | None = None):
+    """Forget cached metadata after an ALTER TABLE on this connection."""
+    for cache in (_COLS.get(con), _PKS.get(con)):
+        if cache is None:
+            continue
+        if table is None:
+            cache.clear()
+        else:
+            cache.pop(table, None)
+
+
+# ----------------------------
+# Transactions (nested blocks join the outer one)
+# ----------------------------
+@contextmanager
+def transaction(con):
+    depth = _TX_DEPTH.get(con, 0)
+    if depth:
+        _TX_DEPTH[con] = depth + 1
+        try:
+            yield con
+        finally:
+            _TX_DEPTH[con] = depth
+        return
+    con.execute("BEGIN TRANSACTION")
+    _TX_DEPTH[con] = 1
+    try:
+        yield con
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        _TX_DEPTH[con] = 0
+
+
+# ----------------------------
+# Bulk upsert (one statement per batch)
+# ----------------------------
+def to_frame(rows, columns: list[str] | None = None) -> pd.DataFrame:
+    if isinstance(rows, pd.DataFrame):
+        return rows
+    return pd.DataFrame(list(rows), columns=columns)
+
+
+def bulk_upsert(con, table: str, rows, conflict_cols: list[str] | None = None,
+                update_cols: list[str] | None = None, columns: list[str] | None = None,
+                strict: bool = True) -> int:
+    """Write dicts / tuples / a DataFrame into table with one statement.
+
+    Batch columns the table doesn't have raise ValueError (schema drift); pass
+    strict=False where several schema variants are expected and only the columns
+    the table actually has should be written. Default is INSERT OR REPLACE
+    on the primary key; pass update_cols (and conflict_cols for a non-PK key) to
+    use ON CONFLICT DO UPDATE on just those columns instead ([] = DO NOTHING).
+    Duplicate keys inside the batch are collapsed, last row wins. Returns rows written.
+    """
+    df = to_frame(rows, columns)
+    if df.empty:
+        return 0
+    known = set(table_cols(con, table))
+    cols = [c for c in df.columns if c in known]
+    unknown = [c for c in df.columns if c not in known]
+    if unknown and strict:
+        raise ValueError(f"{table} has no column(s) {unknown}; run its migration or fix the writer")
+    if not cols:
+        raise ValueError(f"no columns of {table} in batch: {list(df.columns)}")
+
+    key = conflict_cols or primary_key(con, table)
+    if key and all(k in cols for k in key):
+        df = df.drop_duplicates(subset=key, keep="last")
+    df = df[cols]
+
+    col_sql = ", ".join(f'"{c}"' for c in cols)
+    if update_cols is None:
+        sql = f"INSERT OR REPLACE INTO {table} ({col_sql}) SELECT {col_sql} FROM df"
+    else:
+        target = ", ".join(f'"{c}"' for c in key)
+        if update_cols:
+            sets = ", ".join(f'"{c}" = excluded."{c}"' for c in update_cols)
+            action = f"DO UPDATE SET {sets}"
+        else:
+            action = "DO NOTHING"
+        sql = f"INSERT INTO {table} ({col_sql}) SELECT {col_sql} FROM df ON CONFLICT ({target}) {action}"
+
+    with transaction(con):
+        con.execute(sql)
+    return len(df)
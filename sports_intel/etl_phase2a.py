@@ -1,9 +1,12 @@
+import argparse
 import duckdb
-import requests
-import time
-from datetime import datetime, timedelta, date, timezone
+from datetime import datetime, date, timedelta, timezone
 from dateutil import tz
 
+import db_bulk
+import http_fetch
+import schedule_index
+
 DB_PATH = "db/features.duckdb"
 
 DETROIT_TZ = tz.gettz("America/Detroit")
@@ -12,49 +15,6 @@ UTC_TZ = tz.UTC
 # Bounded history per team (SD-card safe)
 MAX_GAMES_PER_TEAM = 12
 
-SCORE_URL = "https://api-web.nhle.com/v1/score/{date_str}"
-BOXSCORE_URL = "https://api-web.nhle.com/v1/gamecenter/{game_id}/boxscore"
-
-HTTP_TIMEOUT = 12
-MAX_RETRIES = 6
-BASE_BACKOFF = 1.2
-
-# ----------------------------
-# HTTP helpers
-# ----------------------------
-def fetch_json(url: str, timeout: int = HTTP_TIMEOUT) -> dict:
-    last_err = None
-    for i in range(MAX_RETRIES):
-        try:
-            r = requests.get(url, timeout=timeout)
-            if r.status_code == 429:
-                time.sleep((BASE_BACKOFF ** i) + 0.25)
-                continue
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            last_err = e
-            time.sleep((BASE_BACKOFF ** i) + 0.25)
-    raise RuntimeError(f"Failed to fetch after retries: {url} :: {last_err}")
-
-# --------------------------------
-# DuckDB helpers
-# --------------------------------
-def table_cols(con, table: str) -> set[str]:
-    rows = con.execute(f"PRAGMA table_info('{table}')").fetchall()
-    return set(r[1] for r in rows)
-
-def upsert_row(con, table: str, row: dict, pk_cols: list[str]):
-    cols = table_cols(con, table)
-    data = {k: v for k, v in row.items() if k in cols}
-    
-    insert_cols = list(data.keys())
-    placeholders = ", ".join(["?"] * len(insert_cols))
-    
-    # Simple INSERT OR REPLACE (works because we fixed the Primary Keys in Schema)
-    sql = f"INSERT OR REPLACE INTO {table} ({', '.join(insert_cols)}) VALUES ({placeholders})"
-    con.execute(sql, [data[c] for c in insert_cols])
-
 # ------------------------------------
 # Logic
 # ------------------------------------
@@ -72,33 +32,9 @@ def get_slate_teams(con, d: date) -> list[str]:
     ).fetchall()
     return [r[0] for r in rows]
 
-def get_team_event_id_for_date(con, team_abbrev: str, d: date) -> str | None:
-    row = con.execute(
-        """
-        select e.event_id from events e
-        join event_participants ep on ep.event_id = e.event_id
-        where e.event_date_local = ? and ep.participant_id = ?
-        limit 1
-        """, [d, team_abbrev]
-    ).fetchone()
-    return row[0] if row else None
-
-def seed_candidate_game_ids_for_team(team_abbrev: str, d: date) -> list[int]:
-    out = []
-    seen = set()
-    cursor = d
-    for _ in range(60): 
-        data = fetch_json(SCORE_URL.format(date_str=cursor.isoformat()))
-        games = data.get("games", []) or []
-        for g in games:
-            if team_abbrev in [g.get("homeTeam", {}).get("abbrev"), g.get("awayTeam", {}).get("abbrev")]:
-                gid = int(g.get("id"))
-                if gid not in seen:
-                    out.append(gid)
-                    seen.add(gid)
-        if len(out) >= MAX_GAMES_PER_TEAM: break
-        cursor = cursor - timedelta(days=1)
-    return out[:MAX_GAMES_PER_TEAM]
+def seed_candidate_game_ids_for_team(con, team_abbrev: str, d: date) -> list[int]:
+    # Indexed lookup against nhl_schedule (refreshed once per run in main)
+    return schedule_index.last_n_game_ids(con, team_abbrev, d, MAX_GAMES_PER_TEAM)
 
 def parse_team_game_rows(box: dict) -> list[dict]:
     gid = str(box["id"])
@@ -137,59 +73,130 @@ def parse_team_game_rows(box: dict) -> list[dict]:
          "powerplay_goals_for": a_stats["ppg"], "powerplay_opportunities": a_stats["ppo"]}
     ]
 
-def compute_team_features(con, team_abbrev: str, d: date) -> dict:
-    event_id = get_team_event_id_for_date(con, team_abbrev, d)
-    if not event_id: return None
-
-    rows = con.execute(
-        """
-        select start_time_utc, goals_for, goals_against, shots_for, shots_against
-        from nhl_team_game_stats where team_abbrev = ? and start_time_utc < ?
-        order by start_time_utc desc limit 20
-        """, [team_abbrev, datetime.now(UTC_TZ)]
-    ).fetchall()
-
-    if not rows: return None
-
-    last_game_date = rows[0][0].replace(tzinfo=UTC_TZ).astimezone(DETROIT_TZ).date()
-    rest_days = (d - last_game_date).days
-    
-    l10 = rows[:10]
-    gf = sum(r[1] or 0 for r in l10)
-    ga = sum(r[2] or 0 for r in l10)
-    sf = sum(r[3] or 0 for r in l10)
-    sa = sum(r[4] or 0 for r in l10)
-
-    return {
-        "event_date_local": d, "team_abbrev": team_abbrev, "event_id": str(event_id),
-        "rest_days": rest_days, "is_b2b": (rest_days == 1),
-        "l10_goal_diff": gf - ga, "l10_shot_diff": sf - sa,
-        "created_at_utc": datetime.now(timezone.utc), "updated_at_utc": datetime.now(timezone.utc)
-    }
+# Every team on every game date (season schedule + today's slate from phase 1),
+# as of the team's last game strictly before that date (ASOF join). A team's games
+# are the completed schedule games plus any stats row the schedule lacks, so
+# rest_days counts from the real previous game, and the L10 sums are only emitted
+# when all ten of those games have a stats row.
+FEATURES_SQL = f"""
+WITH sched AS (
+    SELECT home_abbrev AS team_abbrev, game_date_local, true AS is_home, game_id, game_state FROM nhl_schedule
+    UNION ALL
+    SELECT away_abbrev, game_date_local, false, game_id, game_state FROM nhl_schedule
+), games AS (
+    SELECT * FROM sched WHERE team_abbrev IS NOT NULL
+    QUALIFY row_number() OVER (PARTITION BY team_abbrev, game_date_local ORDER BY game_id) = 1
+), slate AS (
+    SELECT ep.participant_id AS team_abbrev, e.event_date_local,
+           min(e.event_id) AS event_id, any_value(ep.is_home) AS is_home
+    FROM events e JOIN event_participants ep ON ep.event_id = e.event_id
+    WHERE ep.role = 'team'
+    GROUP BY ep.participant_id, e.event_date_local
+), targets AS (
+    SELECT coalesce(s.team_abbrev, g.team_abbrev) AS team_abbrev,
+           coalesce(s.event_date_local, g.game_date_local) AS event_date_local,
+           coalesce(s.event_id, CAST(g.game_id AS VARCHAR)) AS event_id,
+           coalesce(s.is_home, g.is_home) AS is_home
+    FROM games g FULL OUTER JOIN slate s
+      ON s.team_abbrev = g.team_abbrev AND s.event_date_local = g.game_date_local
+), played AS (
+    SELECT team_abbrev, game_date_local, CAST(game_id AS VARCHAR) AS game_id
+    FROM games WHERE game_state IN {schedule_index.FINAL_STATES}
+    UNION
+    SELECT team_abbrev, game_date_local, game_id FROM nhl_team_game_stats
+), l10 AS (
+    SELECT p.team_abbrev, p.game_date_local,
+           count(st.game_id) OVER w AS l10_games,
+           sum(coalesce(st.goals_for, 0) - coalesce(st.goals_against, 0)) OVER w AS l10_goal_diff,
+           sum(coalesce(st.shots_for, 0) - coalesce(st.shots_against, 0)) OVER w AS l10_shot_diff
+    FROM played p
+    LEFT JOIN nhl_team_game_stats st ON st.team_abbrev = p.team_abbrev AND st.game_id = p.game_id
+    WINDOW w AS (PARTITION BY p.team_abbrev ORDER BY p.game_date_local, p.game_id
+                 ROWS BETWEEN 9 PRECEDING AND CURRENT ROW)
+)
+SELECT t.event_date_local, t.team_abbrev, t.event_id, t.is_home,
+       CAST(t.event_date_local - l.game_date_local AS INTEGER) AS rest_days,
+       t.event_date_local - l.game_date_local = 1 AS is_b2b,
+       CASE WHEN l.l10_games = 10 THEN l.l10_goal_diff END AS l10_goal_diff,
+       CASE WHEN l.l10_games = 10 THEN l.l10_shot_diff END AS l10_shot_diff
+FROM targets t
+ASOF JOIN l10 l ON l.team_abbrev = t.team_abbrev AND t.event_date_local > l.game_date_local
+WHERE t.event_date_local BETWEEN ? AND ?
+"""
+
+def features_stale_since(con) -> date | None:
+    """First date whose features may have changed since the last run (None = never built).
+
+    New stats rows change every later date; the 1-day margin absorbs clock/zone skew
+    between the two timestamps.
+    """
+    last_update, last_date = con.execute(
+        "select max(updated_at_utc), max(event_date_local) from nhl_team_game_features"
+    ).fetchone()
+    if last_update is None:
+        return None
+    row = con.execute(
+        "select min(game_date_local) from nhl_team_game_stats where created_at_utc > ? - interval 1 day",
+        [last_update],
+    ).fetchone()
+    changed = row[0] + timedelta(days=1) if row[0] else last_date + timedelta(days=1)
+    return min(changed, last_date + timedelta(days=1))
+
+def compute_team_features(con, through: date, since: date | None = None) -> int:
+    """Point-in-time features for every team-date in [since, through] in one pass. Returns rows written."""
+    df = con.execute(FEATURES_SQL, [since or date.min, through]).df()
+    if df.empty:
+        return 0
+    now_utc = datetime.now(timezone.utc)
+    df["created_at_utc"] = now_utc
+    df["updated_at_utc"] = now_utc
+    # created_at_utc keeps the first write
+    return db_bulk.bulk_upsert(con, "nhl_team_game_features", df,
+                               update_cols=[c for c in df.columns if c not in ("event_date_local", "team_abbrev", "created_at_utc")])
 
-def main():
+def main(con=None, rebuild=False):
     d = detroit_today()
-    con = duckdb.connect(DB_PATH)
+    con = con.cursor() if con is not None else duckdb.connect(DB_PATH)
     teams = get_slate_teams(con, d)
     print(f"Processing Phase 2A for teams: {teams}")
 
+    n = schedule_index.refresh(con, d)
+    print(f"Schedule index refreshed ({n} games).")
+
+    # 1. Union of candidate games across the slate (a game between two
+    #    slate teams is only fetched once)
+    gids = []
     for team in teams:
-        # 1. Backfill stats
-        gids = seed_candidate_game_ids_for_team(team, d)
-        for gid in gids:
-            try:
-                box = fetch_json(BOXSCORE_URL.format(game_id=gid))
-                for row in parse_team_game_rows(box):
-                    if row["team_abbrev"]: 
-                        upsert_row(con, "nhl_team_game_stats", row, ["team_abbrev", "game_id"])
-            except Exception: pass
-            
-        # 2. Compute features
-        feat = compute_team_features(con, team, d)
-        if feat: upsert_row(con, "nhl_team_game_features", feat, ["event_date_local", "team_abbrev"])
+        gids.extend(seed_candidate_game_ids_for_team(con, team, d))
+    gids = list(dict.fromkeys(gids))
+    print(f"Fetching {len(gids)} boxscores for {len(teams)} teams...")
+
+    # 2. Fetch each boxscore once, concurrently; keep both team rows
+    stat_rows = []
+
+    def on_box(gid, box, err):
+        if err is not None:
+            return
+        try:
+            stat_rows.extend(r for r in parse_team_game_rows(box) if r["team_abbrev"])
+        except Exception:
+            pass
+
+    http_fetch.stream_boxscores(gids, on_box)
+    # Re-fetched games keep their created_at_utc: features_stale_since keys on it
+    stat_cols = [c for c in (stat_rows[0] if stat_rows else {}) if c not in ("team_abbrev", "game_id", "created_at_utc")]
+    db_bulk.bulk_upsert(con, "nhl_team_game_stats", stat_rows, update_cols=stat_cols)
+
+    # 3. Features for every team-date not yet reflecting the stats (today's slate included)
+    since = None if rebuild else features_stale_since(con)
+    n = compute_team_features(con, d, since)
+    print(f"Team features: {n} team-dates {'rebuilt' if since is None else f'from {since}'}.")
 
     con.close()
     print("Phase 2A Complete.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="Phase 2A: team game stats + point-in-time team features")
+    ap.add_argument("--rebuild", action="store_true", help="recompute features for every date, not just new ones")
+    args = ap.parse_args()
+    main(rebuild=args.rebuild)
\ No newline at end of file
@@ -3,6 +3,8 @@ import unicodedata
 from datetime import timedelta
 import duckdb
 
+import db_bulk
+
 DB_PATH = "db/features.duckdb"
 
 TIME_WINDOW_MINUTES = 90
@@ -26,8 +28,8 @@ def latest_snapshot(con) -> str | None:
     return r[0] if r else None
 
 
-def main():
-    con = duckdb.connect(DB_PATH)
+def main(con=None):
+    con = con.cursor() if con is not None else duckdb.connect(DB_PATH)
 
     snap = latest_snapshot(con)
     if not snap:
@@ -40,7 +42,7 @@ def main():
     # Pull market_probs for this snapshot
     probs = con.execute(
         """
-        select source_event_id, commence_time_utc, home_team, away_team, market, home_prob, away_prob
+        select source, source_event_id, commence_time_utc, home_team, away_team, market, home_prob, away_prob
         from market_probs
         where snapshot_id = ? and market='h2h'
         """,
@@ -78,11 +80,13 @@ def main():
     ambiguous = 0
     not_found = 0
 
-    # Clear prior matches for this snapshot (safe rerun)
-    con.execute("delete from odds_event_match where snapshot_id = ?", [snap])
-    con.execute("delete from market_probs_consensus where snapshot_id = ?", [snap])
+    match_rows = []
+    consensus_rows = []
+
+    for (source, source_event_id, commence_time_utc, odds_home, odds_away, market, hp, ap) in probs:
+        match = {"snapshot_id": snap, "source": source, "source_event_id": source_event_id,
+                 "commence_time_utc": commence_time_utc, "home_team": odds_home, "away_team": odds_away}
 
-    for (source_event_id, commence_time_utc, odds_home, odds_away, market, hp, ap) in probs:
         # candidate events within time window
         candidates = []
         for (event_id, start_time_utc) in events:
@@ -91,10 +95,8 @@ def main():
                 candidates.append((event_id, diff_min))
 
         if not candidates:
-            con.execute(
-                "insert or replace into odds_event_match (snapshot_id, source_event_id, event_id, status, reason) values (?, ?, null, 'NOT_FOUND', ?)",
-                [snap, source_event_id, f"no events within {TIME_WINDOW_MINUTES} min"],
-            )
+            match_rows.append({**match, "matched_event_id": None,
+                               "status": "NOT_FOUND", "reason": f"no events within {TIME_WINDOW_MINUTES} min"})
             not_found += 1
             continue
 
@@ -122,10 +124,8 @@ def main():
                 scored.append((event_id, diff_min, "FLIPPED"))
 
         if not scored:
-            con.execute(
-                "insert or replace into odds_event_match (snapshot_id, source_event_id, event_id, status, reason) values (?, ?, null, 'NOT_FOUND', ?)",
-                [snap, source_event_id, "no team-name match in time window"],
-            )
+            match_rows.append({**match, "matched_event_id": None,
+                               "status": "NOT_FOUND", "reason": "no team-name match in time window"})
             not_found += 1
             continue
 
@@ -136,35 +136,37 @@ def main():
         # Ambiguity check: if multiple within 10 minutes with same method, flag
         close = [s for s in scored if abs(s[1] - best_diff) <= 10 and s[2] == method]
         if len(close) > 1:
-            con.execute(
-                "insert or replace into odds_event_match (snapshot_id, source_event_id, event_id, status, reason) values (?, ?, null, 'AMBIGUOUS', ?)",
-                [snap, source_event_id, f"multiple close matches: {close[:5]}"],
-            )
+            match_rows.append({**match, "matched_event_id": None,
+                               "status": "AMBIGUOUS", "reason": f"multiple close matches: {close[:5]}"})
             ambiguous += 1
             continue
 
         # Write match
-        con.execute(
-            "insert or replace into odds_event_match (snapshot_id, source_event_id, event_id, status, reason) values (?, ?, ?, 'MATCHED', ?)",
-            [snap, source_event_id, best_event_id, f"{method} diff_min={best_diff:.1f}"],
-        )
+        match_rows.append({**match, "matched_event_id": best_event_id,
+                           "status": "MATCHED", "reason": f"{method} diff_min={best_diff:.1f}"})
         matched += 1
 
         # Consensus row (for now: 1 book-aggregated fair probs from Phase 3A)
         # If flipped, swap probs to align to NHL home/away.
         home_prob = hp
         away_prob = ap
+        home_team, away_team = odds_home, odds_away
         if method == "FLIPPED":
             home_prob, away_prob = away_prob, home_prob
-
-        con.execute(
-            """
-            INSERT OR REPLACE INTO market_probs_consensus
-            (snapshot_id, event_id, market, home_prob, away_prob, draw_prob, matched_method)
-            VALUES (?, ?, 'h2h', ?, ?, NULL, ?)
-            """,
-            [snap, best_event_id, home_prob, away_prob, method],
-        )
+            home_team, away_team = away_team, home_team
+
+        consensus_rows.append({"snapshot_id": snap, "event_id": best_event_id,
+                               "home_team": home_team, "away_team": away_team, "commence_time_utc": commence_time_utc,
+                               "home_prob_fair": home_prob, "away_prob_fair": away_prob, "method": method})
+
+    # Replace this snapshot's matches in one transaction (safe rerun)
+    with db_bulk.transaction(con):
+        con.execute("delete from odds_event_match where snapshot_id = ?", [snap])
+        con.execute("delete from market_probs_consensus where snapshot_id = ?", [snap])
+        # schema_phase3a's odds_event_match also keys on source and keeps the odds-side teams/time;
+        # schema_phase3b's doesn't, so only the columns the deployed table has are written
+        db_bulk.bulk_upsert(con, "odds_event_match", match_rows, strict=False)
+        db_bulk.bulk_upsert(con, "market_probs_consensus", consensus_rows)
 
     con.close()
     print(f"Matching complete. MATCHED={matched} AMBIGUOUS={ambiguous} NOT_FOUND={not_found}")
@@ -1,6 +1,10 @@
 import duckdb
 import math
 
+import numpy as np
+
+import db_bulk
+
 DB_PATH = "db/features.duckdb"
 
 # Conservative shrink discipline
@@ -9,16 +13,36 @@ BASE_SHRINK = 0.60           # default shrink toward market
 FEATURE_WEIGHT = 0.015       # converts feature score into prob delta
 
 
-def clamp(x, lo, hi):
-    return max(lo, min(hi, x))
-
-
 def sigmoid(x):
     return 1.0 / (1.0 + math.exp(-x))
 
 
-def main():
-    con = duckdb.connect(DB_PATH)
+def shrink_probs(home_fair, away_fair, h_rest, h_b2b, h_gd, h_sd, a_rest, a_b2b, a_gd, a_sd):
+    """Market fair probs + team features -> shrunk (home, away) model probs.
+
+    Works on scalars or NumPy arrays (backtest.py replays whole dates at once);
+    missing features must already be 0 / False.
+    """
+    # Simple feature score: goal diff + shot diff (scaled) + rest - b2b penalty
+    score = 0.35 * h_gd - 0.35 * a_gd
+    score = score + 0.05 * h_sd - 0.05 * a_sd
+    score = score + 0.40 * (h_rest - a_rest)
+    score = score - 0.75 * (h_b2b * 1) + 0.75 * (a_b2b * 1)
+
+    # Convert score to small delta around fair (conservative)
+    delta = np.clip(score * FEATURE_WEIGHT, -MAX_EDGE_ABS, MAX_EDGE_ABS)
+
+    home_model = np.clip(home_fair + delta, 0.01, 0.99)
+    away_model = np.clip(1.0 - home_model, 0.01, 0.99)
+
+    # Shrink model back toward market
+    home_shrunk = (1 - BASE_SHRINK) * home_model + BASE_SHRINK * home_fair
+    away_shrunk = (1 - BASE_SHRINK) * away_model + BASE_SHRINK * away_fair
+    return home_shrunk, away_shrunk
+
+
+def main(con=None):
+    con = con.cursor() if con is not None else duckdb.connect(DB_PATH)
 
     snap = con.execute(
         "select snapshot_id from odds_snapshots order by fetched_at_local desc limit 1"
@@ -31,9 +55,9 @@ def main():
 
     rows = con.execute(
         """
-        select snapshot_id, event_id, market, home_prob, away_prob
+        select snapshot_id, event_id, 'h2h' as market, home_prob_fair, away_prob_fair
         from market_probs_consensus
-        where snapshot_id = ? and market='h2h'
+        where snapshot_id = ?
         """,
         [snap],
     ).fetchall()
@@ -43,19 +67,21 @@ def main():
         con.close()
         return
 
-    # Clear existing edges for this snapshot (safe rerun)
-    con.execute("delete from market_edges where snapshot_id = ?", [snap])
+    # Pull features for home/away teams of every event in one query
+    feats_by_event = {}
+    for r in con.execute(
+        """
+        select f.event_id, f.team_abbrev, f.is_home, f.rest_days, f.is_b2b, f.l10_goal_diff, f.l10_shot_diff
+        from nhl_team_game_features f
+        where f.event_id in (select event_id from market_probs_consensus where snapshot_id = ?)
+        """,
+        [snap],
+    ).fetchall():
+        feats_by_event.setdefault(r[0], []).append(r[1:])
 
+    edges = []
     for (_, event_id, market, home_fair, away_fair) in rows:
-        # Pull features for home/away teams
-        feats = con.execute(
-            """
-            select team_abbrev, is_home, rest_days, is_b2b, l10_goal_diff, l10_shot_diff
-            from nhl_team_game_features
-            where event_id = ?
-            """,
-            [event_id],
-        ).fetchall()
+        feats = feats_by_event.get(event_id)
 
         # If no features, skip (Phase 2A not run)
         if not feats or len(feats) < 2:
@@ -69,45 +95,29 @@ def main():
         _, _, h_rest, h_b2b, h_gd, h_sd = home[0]
         _, _, a_rest, a_b2b, a_gd, a_sd = away[0]
 
-        # Simple feature score: goal diff + shot diff (scaled) + rest - b2b penalty
         def safe(v): return 0 if v is None else v
 
-        score = 0.0
-        score += 0.35 * safe(h_gd) - 0.35 * safe(a_gd)
-        score += 0.05 * safe(h_sd) - 0.05 * safe(a_sd)
-        score += 0.40 * (safe(h_rest) - safe(a_rest))
-        score += -0.75 * (1 if h_b2b else 0) + 0.75 * (1 if a_b2b else 0)
-
-        # Convert score to small delta around fair (conservative)
-        delta = clamp(score * FEATURE_WEIGHT, -MAX_EDGE_ABS, MAX_EDGE_ABS)
-
-        home_model = clamp(home_fair + delta, 0.01, 0.99)
-        away_model = clamp(1.0 - home_model, 0.01, 0.99)
-
-        # Shrink model back toward market
+        home_shrunk, away_shrunk = (float(p) for p in shrink_probs(
+            home_fair, away_fair,
+            safe(h_rest), bool(h_b2b), safe(h_gd), safe(h_sd),
+            safe(a_rest), bool(a_b2b), safe(a_gd), safe(a_sd),
+        ))
         shrink = BASE_SHRINK
-        home_shrunk = (1 - shrink) * home_model + shrink * home_fair
-        away_shrunk = (1 - shrink) * away_model + shrink * away_fair
 
         edge_home = home_shrunk - home_fair
         edge_away = away_shrunk - away_fair
 
-        con.execute(
-            """
-            INSERT OR REPLACE INTO market_edges
-            (snapshot_id, event_id, market,
-             home_prob_fair, away_prob_fair,
-             home_prob_model, away_prob_model,
-             edge_home, edge_away, shrink_factor)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            [
-                snap, event_id, market,
-                home_fair, away_fair,
-                home_shrunk, away_shrunk,
-                edge_home, edge_away, shrink
-            ],
-        )
+        edges.append({
+            "snapshot_id": snap, "event_id": event_id, "market": market,
+            "home_prob_fair": home_fair, "away_prob_fair": away_fair,
+            "home_prob_model": home_shrunk, "away_prob_model": away_shrunk,
+            "edge_home": edge_home, "edge_away": edge_away, "shrink_factor": shrink,
+        })
+
+    # Replace this snapshot's edges in one transaction (safe rerun)
+    with db_bulk.transaction(con):
+        con.execute("delete from market_edges where snapshot_id = ?", [snap])
+        db_bulk.bulk_upsert(con, "market_edges", edges)
 
     con.close()
     print("Phase 3C complete. market_edges written for latest snapshot.")
@@ -0,0 +1,54 @@
+"""features.duckdb readers get player_game_stats by ATTACHing the oracle_data replica.
+
+nhl_player_game_stats is kept as a temp view on the connection from connect().
+Both files are replicas, so this never takes the writer's lock.
+"""
+
+import argparse
+
+import replica
+
+ATTACHED = "oracle_data"
+
+# Compatibility views for the features side (old nhl_player_game_stats columns, skaters only)
+VIEWS = {
+    "nhl_player_game_stats": f"""
+        SELECT game_id, event_date_local, player_id, name, team_abbrev,
+               shots, goals, assists, points, toi
+        FROM {ATTACHED}.main.player_game_stats
+        WHERE position != 'G'
+    """,
+    "player_game_stats": f"SELECT * FROM {ATTACHED}.main.player_game_stats",
+}
+
+
+def attach(con, path=None, read_only: bool = True):
+    """ATTACH oracle_data onto con (once) and create the compatibility views."""
+    attached = {r[0] for r in con.execute("SELECT database_name FROM duckdb_databases()").fetchall()}
+    if ATTACHED not in attached:
+        path = path or replica.current_path(ATTACHED).resolve()
+        mode = " (READ_ONLY)" if read_only else ""
+        con.execute(f"ATTACH '{path}' AS {ATTACHED}{mode}")
+    for name, sql in VIEWS.items():
+        con.execute(f"CREATE OR REPLACE TEMP VIEW {name} AS {sql}")
+    return con
+
+
+def connect():
+    """Read-only features replica with the oracle_data replica attached."""
+    if not replica.current_path(ATTACHED).exists():
+        raise FileNotFoundError(f"No {ATTACHED} replica published yet. Run pipeline.py or replica.py publish.")
+    return attach(replica.connect("features"))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Query features + oracle_data replicas as one database")
+    ap.add_argument("sql", nargs="?", default="SELECT count(*) AS player_games FROM nhl_player_game_stats")
+    args = ap.parse_args()
+    con = connect()
+    print(con.execute(args.sql).df().to_string(index=False))
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+MODULE_DIR = Path(__file__).resolve().parent
+# One cache for the root scripts and the sports_intel ETL, whatever directory they run from
+CACHE_DIR = Path(os.getenv("SPORTS_INTEL_HTTP_CACHE", MODULE_DIR / "cache" / "http"))
+
+# SD-card safe: total bytes kept on disk before LRU eviction kicks in
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+EVICT_INTERVAL_SECONDS = 60
+
+FINAL_STATES = {"FINAL", "OFF"}
+
+# TTLs (seconds) for mutable NHL endpoints
+LIVE_TTL = 30
+SCORE_TTL = 180
+SCHEDULE_TTL = 15 * 60
+STANDINGS_TTL = 60 * 60
+DEFAULT_NHL_TTL = 60
+
+_last_evict = 0.0
+_evict_lock = threading.Lock()
+
+
+# ----------------------------
+# Policy
+# ----------------------------
+def cache_key(url: str, params: dict | None = None) -> str:
+    if params:
+        url = url + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+    return hashlib.sha1(url.encode()).hexdigest()
+
+
+def is_cacheable(url: str) -> bool:
+    return "api-web.nhle.com" in url
+
+
+def ttl_for(url: str, data) -> float | None:
+    """Seconds an entry stays fresh; None means immutable (cache forever)."""
+    if re.search(r"/gamecenter/\d+/boxscore", url):
+        state = (data or {}).get("gameState")
+        return None if state in FINAL_STATES else LIVE_TTL
+    if "/score/" in url:
+        games = (data or {}).get("games") or []
+        if games and all(g.get("gameState") in FINAL_STATES for g in games):
+            return None
+        return SCORE_TTL
+    if "/schedule/" in url:
+        return SCHEDULE_TTL
+    if "/standings/" in url:
+        return STANDINGS_TTL
+    return DEFAULT_NHL_TTL
+
+
+# ----------------------------
+# Storage (gzip JSON, one file per URL)
+# ----------------------------
+def _path(key: str) -> Path:
+    return CACHE_DIR / key[:2] / f"{key}.json.gz"
+
+
+def get(key: str) -> dict | None:
+    p = _path(key)
+    try:
+        with gzip.open(p, "rt") as f:
+            entry = json.load(f)
+    except (FileNotFoundError, OSError, ValueError):
+        return None
+    # mtime doubles as the LRU clock
+    try:
+        os.utime(p)
+    except OSError:
+        pass
+    return entry
+
+
+def is_fresh(entry: dict) -> bool:
+    expires = entry.get("expires_at")
+    return expires is None or time.time() < expires
+
+
+def conditional_headers(entry: dict | None) -> dict:
+    if not entry:
+        return {}
+    h = {}
+    if entry.get("etag"):
+        h["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        h["If-Modified-Since"] = entry["last_modified"]
+    return h
+
+
+def put(key: str, url: str, data, headers=None) -> dict:
+    headers = headers or {}
+    ttl = ttl_for(url, data)
+    now = time.time()
+    entry = {
+        "url": url,
+        "fetched_at": now,
+        "expires_at": None if ttl is None else now + ttl,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "body": data,
+    }
+    _write(key, entry)
+    return entry
+
+
+def revalidated(key: str, entry: dict) -> dict:
+    """304 Not Modified: extend the existing entry's freshness."""
+    ttl = ttl_for(entry["url"], entry["body"])
+    now = time.time()
+    entry["fetched_at"] = now
+    entry["expires_at"] = None if ttl is None else now + ttl
+    _write(key, entry)
+    return entry
+
+
+def _write(key: str, entry: dict):
+    p = _path(key)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with gzip.open(tmp, "wt", compresslevel=6) as f:
+        json.dump(entry, f, separators=(",", ":"))
+    os.replace(tmp, p)
+    maybe_evict()
+
+
+# ----------------------------
+# LRU eviction
+# ----------------------------
+def maybe_evict(max_bytes: int = MAX_CACHE_BYTES, force: bool = False) -> int:
+    global _last_evict
+    with _evict_lock:
+        if not force and time.time() - _last_evict < EVICT_INTERVAL_SECONDS:
+            return 0
+        _last_evict = time.time()
+
+    files = []
+    total = 0
+    for p in CACHE_DIR.glob("*/*.json.gz"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        files.append((st.st_mtime, st.st_size, p))
+        total += st.st_size
+
+    removed = 0
+    if total <= max_bytes:
+        return removed
+    files.sort()  # oldest access first
+    for _, size, p in files:
+        if total <= max_bytes:
+            break
+        try:
+            p.unlink()
+            total -= size
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def cache_stats() -> dict:
+    sizes = [p.stat().st_size for p in CACHE_DIR.glob("*/*.json.gz")]
+    return {"entries": len(sizes), "bytes": sum(sizes), "max_bytes": MAX_CACHE_BYTES}
+
+
+if __name__ == "__main__":
+    print(cache_stats())
+    print(f"Evicted {maybe_evict(force=True)} entries.")
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import http_cache
+import http_replay
+import payload_lake
+import rate_limit
+
+NHL_API = "https://api-web.nhle.com/v1"
+SCHEDULE_URL = NHL_API + "/schedule/{date_str}"
+BOXSCORE_URL = NHL_API + "/gamecenter/{game_id}/boxscore"
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "application/json",
+    "Referer": "https://www.nhl.com/",
+}
+
+HTTP_TIMEOUT = 12
+MAX_RETRIES = 6
+BASE_BACKOFF = 1.2
+
+# Max requests in flight at once (the Pi is happy with ~8 keep-alive sockets)
+MAX_IN_FLIGHT = 8
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# ----------------------------
+# Session (per-host connection reuse)
+# ----------------------------
+def get_session(pool_size: int = MAX_IN_FLIGHT) -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            s.headers.update(HEADERS)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, MAX_IN_FLIGHT))
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            # SPORTS_INTEL_HTTP=record|replay swaps in the cassette adapter
+            http_replay.install(s, max(pool_size, MAX_IN_FLIGHT))
+            _session = s
+        return _session
+
+
+# ----------------------------
+# Sync fetch
+# ----------------------------
+def fetch_json(url: str, params: dict | None = None, timeout: int = HTTP_TIMEOUT, use_cache: bool = True,
+               response_headers: dict | None = None) -> dict:
+    """GET url as JSON. Pass a dict as response_headers to receive the final response's headers
+    (e.g. Odds API x-requests-remaining)."""
+    # Record/replay always exercises the transport: no disk cache, no lake, no throttling
+    replaying = http_replay.active()
+    use_cache = use_cache and not replaying and http_cache.is_cacheable(url)
+    entry = None
+    if use_cache:
+        key = http_cache.cache_key(url, params)
+        entry = http_cache.get(key)
+        if entry and http_cache.is_fresh(entry):
+            return entry["body"]
+
+    session = get_session()
+    bucket = None if replaying else rate_limit.bucket_for(url)
+    last_err = None
+    for i in range(MAX_RETRIES):
+        try:
+            # Shared token bucket paces every thread/process hitting this API
+            rate_limit.acquire(bucket)
+            r = session.get(url, params=params, timeout=timeout,
+                            headers=http_cache.conditional_headers(entry))
+            if r.status_code == 429:
+                rate_limit.on_throttled(bucket, r.headers.get("Retry-After"))
+                last_err = RuntimeError("429 Too Many Requests")
+                continue
+            if r.status_code == 304 and entry:
+                rate_limit.on_success(bucket)
+                return http_cache.revalidated(key, entry)["body"]
+            r.raise_for_status()
+            data = r.json()
+            rate_limit.on_success(bucket)
+            if response_headers is not None:
+                response_headers.update(r.headers)
+            # Keep the raw payload so parsers can be re-run offline
+            if not replaying:
+                payload_lake.store_response(url, params, data)
+            if use_cache:
+                http_cache.put(key, url, data, r.headers)
+            return data
+        except requests.HTTPError as e:
+            # Other 4xx won't fix themselves on retry (and would burn Odds API quota)
+            if e.response is not None and 400 <= e.response.status_code < 500:
+                raise RuntimeError(f"Failed to fetch: {url} :: {e}") from e
+            last_err = e
+            time.sleep((BASE_BACKOFF ** i) + 0.25)
+        except Exception as e:
+            last_err = e
+            time.sleep((BASE_BACKOFF ** i) + 0.25)
+    raise RuntimeError(f"Failed to fetch after retries: {url} :: {last_err}")
+
+
+# ----------------------------
+# Async fan-out (bounded concurrency)
+# ----------------------------
+async def _fetch_all(urls: list[str], on_result, max_in_flight: int):
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(max_in_flight)
+    get_session(max_in_flight)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        async def one(url):
+            async with sem:
+                try:
+                    return url, await loop.run_in_executor(pool, fetch_json, url), None
+                except Exception as e:
+                    return url, None, e
+
+        # Results are handed back on the loop thread as each one lands, so
+        # callers can write to DuckDB without sharing a connection across threads.
+        for fut in asyncio.as_completed([one(u) for u in urls]):
+            url, data, err = await fut
+            on_result(url, data, err)
+
+
+def stream_json(urls: list[str], on_result, max_in_flight: int = MAX_IN_FLIGHT):
+    """Fetch every url concurrently and call on_result(url, data, err) as each completes."""
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return
+    asyncio.run(_fetch_all(urls, on_result, max(1, max_in_flight)))
+
+
+def stream_boxscores(game_ids, on_box, max_in_flight: int = MAX_IN_FLIGHT):
+    """Fetch boxscores concurrently and call on_box(game_id, box, err) in arrival order."""
+    by_url = {BOXSCORE_URL.format(game_id=gid): gid for gid in game_ids}
+    stream_json(list(by_url), lambda url, data, err: on_box(by_url[url], data, err), max_in_flight)
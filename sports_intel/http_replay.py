@@ -0,0 +1,178 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import urlsplit, urlencode, parse_qsl
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# SPORTS_INTEL_HTTP=live (default) | record | replay
+MODULE_DIR = Path(__file__).resolve().parent
+MODE = os.getenv("SPORTS_INTEL_HTTP", "live").lower()
+CASSETTE_DIR = Path(os.getenv("SPORTS_INTEL_CASSETTE", MODULE_DIR / "cassettes" / "default"))
+REPLAY_LATENCY_MS = float(os.getenv("SPORTS_INTEL_REPLAY_LATENCY_MS", "0"))
+
+SECRET_PARAMS = {"apiKey", "api_key"}
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Retry-After", "x-requests-remaining", "x-requests-used")
+
+# Entry points: name -> (script relative to home dir, runs from sports_intel/?)
+ENTRY_POINTS = {
+    "etl_phase1": ("sports_intel/etl_phase1.py", True),
+    "etl_phase2a": ("sports_intel/etl_phase2a.py", True),
+    "etl_phase3a_odds": ("sports_intel/etl_phase3a_odds.py", True),
+    "ingest_stats": ("ingest_stats.py", False),
+    "game_engine": ("game_engine.py", False),
+    "get_odds": ("get_odds.py", False),
+}
+
+
+def active() -> bool:
+    return MODE in ("record", "replay")
+
+
+# ----------------------------
+# Cassette files (one JSON per request, secrets stripped from the key)
+# ----------------------------
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url)
+    q = sorted((k, v) for k, v in parse_qsl(parts.query) if k not in SECRET_PARAMS)
+    return parts._replace(query=urlencode(q)).geturl()
+
+
+def cassette_path(method: str, url: str) -> Path:
+    key = hashlib.sha1(f"{method} {normalize_url(url)}".encode()).hexdigest()
+    return CASSETTE_DIR / f"{key}.json"
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Real network call; every response is written to the cassette dir."""
+
+    def send(self, request, **kwargs):
+        r = super().send(request, **kwargs)
+        p = cassette_path(request.method, request.url)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "method": request.method,
+            "url": normalize_url(request.url),
+            "status": r.status_code,
+            "headers": {h: r.headers[h] for h in KEPT_HEADERS if h in r.headers},
+            "body": r.content.decode("utf-8", errors="replace"),
+        }
+        tmp = p.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(entry))
+        os.replace(tmp, p)
+        return r
+
+
+class ReplayAdapter(BaseAdapter):
+    """Local stand-in: serves recorded responses after a fixed latency."""
+
+    def __init__(self, latency_ms: float = REPLAY_LATENCY_MS):
+        super().__init__()
+        self.latency = latency_ms / 1000.0
+
+    def send(self, request, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        p = cassette_path(request.method, request.url)
+        r = requests.Response()
+        r.url = request.url
+        r.request = request
+        try:
+            entry = json.loads(p.read_text())
+        except FileNotFoundError:
+            # 4xx so http_fetch fails fast instead of retrying a miss
+            r.status_code = 404
+            r.reason = "Not in cassette"
+            r._content = b""
+            return r
+        r.status_code = entry["status"]
+        try:
+            r.reason = HTTPStatus(entry["status"]).phrase
+        except ValueError:
+            r.reason = ""
+        r.headers = CaseInsensitiveDict(entry["headers"])
+        r._content = entry["body"].encode("utf-8")
+        r.encoding = "utf-8"
+        return r
+
+    def close(self):
+        pass
+
+
+def install(session: requests.Session, pool_size: int = 8):
+    """Mount the record/replay adapter on http_fetch's session (no-op when live)."""
+    if MODE == "record":
+        adapter = RecordingAdapter(pool_connections=4, pool_maxsize=pool_size)
+    elif MODE == "replay":
+        adapter = ReplayAdapter()
+    else:
+        return
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+# ----------------------------
+# Runner / benchmark
+# ----------------------------
+def run_entry(name: str, mode: str, cassette: Path, latency_ms: float, data_dir: Path) -> tuple[float, int]:
+    script, in_sports_intel = ENTRY_POINTS[name]
+    home = MODULE_DIR.parent
+    env = dict(os.environ)
+    env.update({
+        "SPORTS_INTEL_HTTP": mode,
+        "SPORTS_INTEL_CASSETTE": str(cassette),
+        "SPORTS_INTEL_REPLAY_LATENCY_MS": str(latency_ms),
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(MODULE_DIR), env.get("PYTHONPATH")])),
+    })
+    if mode == "replay":
+        env.setdefault("ODDS_API_KEY", "replay")  # key is never part of the cassette
+    cwd = data_dir / "sports_intel" if in_sports_intel else data_dir
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, str(home / script)], cwd=cwd, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - t0
+    if proc.returncode != 0:
+        print(f"   {name} exited {proc.returncode}: {proc.stderr.strip().splitlines()[-1:]}")
+    return elapsed, proc.returncode
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Record / replay NHL + Odds API traffic for offline, repeatable runs")
+    ap.add_argument("mode", choices=["record", "replay"])
+    ap.add_argument("entries", nargs="*", default=list(ENTRY_POINTS), help=f"subset of {list(ENTRY_POINTS)}")
+    ap.add_argument("--cassette", default=str(CASSETTE_DIR))
+    ap.add_argument("--latency-ms", type=float, default=REPLAY_LATENCY_MS)
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--data-dir", default=str(MODULE_DIR.parent),
+                    help="home dir whose DBs the run writes to (point at a copy for benchmarks)")
+    args = ap.parse_args()
+
+    unknown = set(args.entries) - set(ENTRY_POINTS)
+    if unknown:
+        ap.error(f"unknown entry points: {sorted(unknown)}")
+
+    cassette = Path(args.cassette).resolve()
+    data_dir = Path(args.data_dir).resolve()
+    print(f"{args.mode.upper()} :: cassette={cassette} latency={args.latency_ms}ms data={data_dir}")
+    total = 0.0
+    for name in args.entries:
+        times = []
+        for _ in range(args.repeat):
+            elapsed, _ = run_entry(name, args.mode, cassette, args.latency_ms, data_dir)
+            times.append(elapsed)
+        best = min(times)
+        total += best
+        print(f"{name:<18} best {best:7.2f}s  mean {sum(times) / len(times):7.2f}s  ({len(times)} runs)")
+    print(f"{'TOTAL (best)':<18} {total:7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""Nightly odds rollup, archive, retention and compaction; results in maintenance_log.
+
+Needs the DB files to itself: scheduler_daemon.py runs it, or `maintenance.py run`
+queues it while a write coordinator is up.
+
+  python maintenance.py run --keep market_probs=30 --keep odds_lines=21
+  python maintenance.py report
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import duckdb
+
+import archive
+import db_bulk
+import replica
+
+DBS = replica.SOURCES
+COMPACT_MIN_FREE = 0.20         # rewrite a file only when this share of its blocks is free (SD card wear)
+ROLLUP_AFTER = timedelta(hours=6)  # lines roll up once their game has surely finished
+HOT_REPEAT = 3
+
+# table -> (db, time column, days kept). odds_lines detail is moved to Parquet, not dropped.
+# *_utc columns are UTC, the refresh logs use the Pi's clock: a few hours either way don't matter here
+RETENTION = {
+    "odds_lines": ("features", "fetched_at_utc", archive.ODDS_HOT_DAYS),
+    "odds_event_match": ("features", "commence_time_utc", 60),
+    "market_probs": ("features", "fetched_at_utc", 60),
+    "market_probs_consensus": ("features", "created_at_utc", 60),
+    "phase3c_edges": ("features", "created_at_utc", 180),
+    "phase3c_run_log": ("features", "started_at_utc", 90),
+    "odds_api_usage": ("features", "polled_at_utc", 60),
+    "system_refresh_log": ("features", "started_at", 90),
+    "system_refresh_stages": ("features", "started_at", 90),
+    "maintenance_log": ("features", "started_at", 365),
+}
+
+# What the dashboards and stages read all day; timed before and after (best of HOT_REPEAT)
+HOT_QUERIES = {
+    "latest_odds": ("features", """
+        SELECT * FROM odds_lines WHERE snapshot_id = (SELECT max(snapshot_id) FROM odds_snapshots)"""),
+    "line_movement": ("features", """
+        SELECT source_event_id, bookmaker, outcome_name, count(*), min(price), max(price)
+        FROM odds_lines WHERE commence_time_utc >= now()::TIMESTAMP - INTERVAL 2 DAY GROUP BY ALL"""),
+    "latest_edges": ("features", """
+        SELECT * FROM phase3c_edges WHERE snapshot_id = (SELECT max(snapshot_id) FROM phase3c_edges)"""),
+    "consensus": ("features", """
+        SELECT * FROM market_probs_consensus
+        WHERE snapshot_id = (SELECT max(snapshot_id) FROM market_probs_consensus)"""),
+    "refresh_log": ("features", """
+        SELECT * FROM system_refresh_stages ORDER BY started_at DESC LIMIT 50"""),
+    "player_form": ("oracle_data", """
+        SELECT player_id, avg(shots), avg(points) FROM player_game_stats
+        WHERE event_date_local >= current_date - 30 GROUP BY player_id"""),
+}
+
+ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS odds_line_rollup (
+  source_event_id TEXT,
+  bookmaker TEXT,
+  market TEXT,
+  outcome_name TEXT,
+  point_key DOUBLE,
+  commence_time_utc TIMESTAMP,
+  home_team TEXT,
+  away_team TEXT,
+  first_seen_utc TIMESTAMP,
+  last_seen_utc TIMESTAMP,
+  open_price INTEGER,
+  close_price INTEGER,
+  min_price INTEGER,
+  max_price INTEGER,
+  open_point DOUBLE,
+  close_point DOUBLE,
+  snapshots INTEGER,
+  PRIMARY KEY (source_event_id, bookmaker, market, outcome_name, point_key)
+);
+"""
+
+LOG_DDL = """
+CREATE TABLE IF NOT EXISTS maintenance_log (
+  run_id TEXT,
+  db TEXT,
+  started_at TIMESTAMP,
+  finished_at TIMESTAMP,
+  bytes_before BIGINT,
+  bytes_after BIGINT,
+  compacted BOOLEAN,
+  rows_deleted BIGINT,
+  rows_archived BIGINT,
+  lines_rolled_up BIGINT,
+  hot_ms_before DOUBLE,
+  hot_ms_after DOUBLE,
+  PRIMARY KEY (run_id, db)
+);
+"""
+
+# American odds don't sort by payout (-110 < +105); min/max go by decimal odds
+DECIMAL_PRICE = "CASE WHEN price > 0 THEN 1 + price / 100.0 ELSE 1 - 100.0 / price END"
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def file_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in (path, Path(f"{path}.wal")) if p.exists())
+
+
+def tables(con) -> set[str]:
+    return {r[0] for r in con.execute(
+        "SELECT table_name FROM duckdb_tables() WHERE database_name = current_database()"
+    ).fetchall()}
+
+
+def views(con) -> set[str]:
+    return {r[0] for r in con.execute(
+        "SELECT view_name FROM duckdb_views() WHERE database_name = current_database() AND NOT internal"
+    ).fetchall()}
+
+
+# ----------------------------
+# Hot-query timing
+# ----------------------------
+def time_hot_queries(db: str) -> dict[str, float]:
+    """{query: best ms} for the HOT_QUERIES of one DB (missing tables are skipped)."""
+    path = DBS[db]
+    if not path.exists():
+        return {}
+    out = {}
+    con = duckdb.connect(str(path), read_only=True)
+    try:
+        for name, (qdb, sql) in HOT_QUERIES.items():
+            if qdb != db:
+                continue
+            best = None
+            try:
+                for _ in range(HOT_REPEAT):
+                    t0 = time.perf_counter()
+                    con.execute(sql).fetchall()
+                    ms = (time.perf_counter() - t0) * 1000
+                    best = ms if best is None else min(best, ms)
+            except duckdb.CatalogException:
+                continue
+            out[name] = best
+    finally:
+        con.close()
+    return out
+
+
+# ----------------------------
+# Rollup + retention
+# ----------------------------
+def rollup_odds(con) -> int:
+    """Summarise pre-game quotes of finished games into odds_line_rollup. Returns lines added."""
+    con.execute(ROLLUP_DDL)
+    known = tables(con) | views(con)
+    if "odds_lines" not in known:
+        return 0
+    # First run: pick up what archive.py already moved to Parquet too
+    empty = con.execute("SELECT count(*) = 0 FROM odds_line_rollup").fetchone()[0]
+    source = "odds_lines_history" if empty and "odds_lines_history" in known else "odds_lines"
+    cutoff = utcnow() - ROLLUP_AFTER
+    before = con.execute("SELECT count(*) FROM odds_line_rollup").fetchone()[0]
+    con.execute(f"""
+        INSERT OR IGNORE INTO odds_line_rollup
+        SELECT
+            source_event_id, bookmaker, market, outcome_name, point_key,
+            arg_max(commence_time_utc, fetched_at_utc), any_value(home_team), any_value(away_team),
+            min(fetched_at_utc), max(fetched_at_utc),
+            arg_min(price, fetched_at_utc), arg_max(price, fetched_at_utc),
+            arg_min(price, {DECIMAL_PRICE}), arg_max(price, {DECIMAL_PRICE}),
+            arg_min(point, fetched_at_utc), arg_max(point, fetched_at_utc),
+            count(*)
+        FROM {source}
+        WHERE commence_time_utc < ? AND fetched_at_utc <= commence_time_utc
+          AND source_event_id NOT IN (SELECT DISTINCT source_event_id FROM odds_line_rollup)
+        GROUP BY source_event_id, bookmaker, market, outcome_name, point_key
+    """, [cutoff])
+    return con.execute("SELECT count(*) FROM odds_line_rollup").fetchone()[0] - before
+
+
+def apply_retention(con, db: str, retention: dict) -> dict[str, int]:
+    """DELETE rows past each table's window (one transaction). Returns {table: rows deleted}."""
+    present = tables(con)
+    deleted = {}
+    with db_bulk.transaction(con):
+        for table, (tdb, col, days) in retention.items():
+            if tdb != db or table == "odds_lines" or table not in present:
+                continue
+            cutoff = utcnow() - timedelta(days=days)
+            deleted[table] = con.execute(f"DELETE FROM {table} WHERE {col} < ?", [cutoff]).fetchone()[0]
+    return deleted
+
+
+# ----------------------------
+# Compaction
+# ----------------------------
+def free_ratio(con) -> float:
+    total, free = con.execute("SELECT total_blocks, free_blocks FROM pragma_database_size()").fetchone()
+    return free / total if total else 0.0
+
+
+def compact(path: Path, force: bool = False) -> bool:
+    """Rewrite path without its free blocks. Needs exclusive access. Returns whether it was rewritten."""
+    tmp = path.with_name(f"{path.name}.compact")
+    for p in (tmp, Path(f"{tmp}.wal")):
+        p.unlink(missing_ok=True)
+
+    con = duckdb.connect(str(path))
+    try:
+        con.execute("CHECKPOINT")
+        ratio = free_ratio(con)
+        if ratio < COMPACT_MIN_FREE and not force:
+            print(f"{path.name}: {ratio:.0%} free, not compacting")
+            return False
+        src = con.execute("SELECT current_database()").fetchone()[0]
+        con.execute(f"ATTACH '{tmp}' AS compact_target")
+        try:
+            con.execute(f"COPY FROM DATABASE {src} TO compact_target")
+            for table in tables(con):
+                a = con.execute(f"SELECT count(*) FROM {src}.main.{table}").fetchone()[0]
+                b = con.execute(f"SELECT count(*) FROM compact_target.main.{table}").fetchone()[0]
+                if a != b:
+                    raise RuntimeError(f"compaction of {path.name}: {table} has {b} rows in the copy, expected {a}")
+        finally:
+            con.execute("DETACH compact_target")
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        raise
+    finally:
+        con.close()
+
+    if Path(f"{path}.wal").exists():
+        # Something wrote after the checkpoint; the copy would lose it
+        tmp.unlink(missing_ok=True)
+        raise RuntimeError(f"{path.name} has a WAL after closing; is another process writing to it?")
+    os.replace(tmp, path)
+    return True
+
+
+# ----------------------------
+# Runner
+# ----------------------------
+def run(keep: dict[str, int] | None = None, do_compact: bool = True, force_compact: bool = False) -> dict[str, dict]:
+    """Run every step on the DB files. The caller must not hold connections to them."""
+    retention = {t: (db, col, (keep or {}).get(t, days)) for t, (db, col, days) in RETENTION.items()}
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    started = datetime.now()
+    dbs = [db for db, path in DBS.items() if path.exists()]
+    report = {db: {"bytes_before": file_bytes(DBS[db]), "hot_before": time_hot_queries(db),
+                   "rows_deleted": 0, "rows_archived": 0, "lines_rolled_up": 0, "compacted": False}
+              for db in dbs}
+
+    cons = {DBS[db]: duckdb.connect(str(DBS[db])) for db in dbs}
+    try:
+        if "features" in report:
+            report["features"]["lines_rolled_up"] = rollup_odds(cons[DBS["features"]])
+            print(f"odds_line_rollup: {report['features']['lines_rolled_up']} lines added")
+        for name, (db, _, _, _) in archive.DATASETS.items():
+            if db in report:
+                hot_days = retention["odds_lines"][2] if name == "odds_lines" else None
+                report[db]["rows_archived"] += archive.archive_dataset(cons[DBS[db]], name, hot_days=hot_days)
+        for db in dbs:
+            deleted = apply_retention(cons[DBS[db]], db, retention)
+            for table, n in deleted.items():
+                if n:
+                    print(f"{table}: deleted {n} rows")
+            report[db]["rows_deleted"] = sum(deleted.values())
+            cons[DBS[db]].execute("CHECKPOINT")
+    finally:
+        for con in cons.values():
+            con.close()
+
+    for db in dbs:
+        if do_compact:
+            report[db]["compacted"] = compact(DBS[db], force_compact)
+        report[db]["bytes_after"] = file_bytes(DBS[db])
+        report[db]["hot_after"] = time_hot_queries(db)
+
+    con = duckdb.connect(str(DBS["features"]))
+    try:
+        con.execute(LOG_DDL)
+        db_bulk.bulk_upsert(con, "maintenance_log", [{
+            "run_id": run_id, "db": db, "started_at": started, "finished_at": datetime.now(),
+            "bytes_before": r["bytes_before"], "bytes_after": r["bytes_after"], "compacted": r["compacted"],
+            "rows_deleted": r["rows_deleted"], "rows_archived": r["rows_archived"],
+            "lines_rolled_up": r["lines_rolled_up"],
+            "hot_ms_before": sum(r["hot_before"].values()), "hot_ms_after": sum(r["hot_after"].values()),
+        } for db, r in report.items()])
+    finally:
+        con.close()
+
+    # Readers get the smaller files and the new rollup right away
+    for db in dbs:
+        con = duckdb.connect(str(DBS[db]))
+        try:
+            replica.publish(con, db, run_id)
+        finally:
+            con.close()
+
+    print_report(report)
+    return report
+
+
+def print_report(report: dict):
+    for db, r in report.items():
+        saved = r["bytes_before"] - r["bytes_after"]
+        print(f"\n{db}: {r['bytes_before'] / 1e6:.1f} MB -> {r['bytes_after'] / 1e6:.1f} MB "
+              f"({saved / 1e6:+.1f} MB reclaimed{', compacted' if r['compacted'] else ''}); "
+              f"{r['rows_deleted']} rows deleted, {r['rows_archived']} archived")
+        for name, before in r["hot_before"].items():
+            after = r["hot_after"].get(name)
+            if after is not None:
+                print(f"  {name:<16} {before:8.1f} ms -> {after:8.1f} ms")
+
+
+def ran_since(con, since: datetime) -> bool:
+    """Did a maintenance run start at/after since (the Pi's local clock)?"""
+    try:
+        row = con.execute("SELECT count(*) FROM maintenance_log WHERE started_at >= ?", [since]).fetchone()
+    except duckdb.CatalogException:
+        return False
+    return row[0] > 0
+
+
+def show_log(limit: int = 10):
+    con = duckdb.connect(str(DBS["features"]), read_only=True)
+    try:
+        print(con.execute("""
+            SELECT run_id, db, round(bytes_before / 1e6, 1) AS mb_before, round(bytes_after / 1e6, 1) AS mb_after,
+                   compacted, rows_deleted, rows_archived, lines_rolled_up,
+                   round(hot_ms_before, 1) AS hot_ms_before, round(hot_ms_after, 1) AS hot_ms_after
+            FROM maintenance_log ORDER BY started_at DESC, db LIMIT ?
+        """, [limit]).df().to_string(index=False))
+    except duckdb.CatalogException:
+        print("No maintenance runs yet.")
+    finally:
+        con.close()
+
+
+def parse_keep(values: list[str]) -> dict[str, int]:
+    keep = {}
+    for v in values:
+        table, _, days = v.partition("=")
+        if table not in RETENTION or not days.isdigit():
+            raise ValueError(f"--keep expects table=days with table in {list(RETENTION)}, got {v!r}")
+        keep[table] = int(days)
+    return keep
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Retention, odds rollup and compaction for the DuckDB files")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("run", help="run maintenance now (or queue it with the write coordinator)")
+    rp.add_argument("--keep", action="append", default=[], metavar="TABLE=DAYS", help="override a retention window")
+    rp.add_argument("--no-compact", action="store_true", help="skip rewriting the DB files")
+    rp.add_argument("--force-compact", action="store_true", help=f"compact even below {COMPACT_MIN_FREE:.0%} free")
+    lp = sub.add_parser("report", help="show recent maintenance runs")
+    lp.add_argument("--limit", type=int, default=10)
+    args = ap.parse_args()
+
+    if args.cmd == "report":
+        show_log(args.limit)
+        return
+    try:
+        keep = parse_keep(args.keep)
+    except ValueError as e:
+        ap.error(str(e))
+
+    import write_queue
+    if write_queue.coordinator_running():
+        # The coordinator closes its connections for the run and reopens them after
+        write_queue.Batch("features", label="maintenance").maintenance(
+            keep, not args.no_compact, args.force_compact).commit()
+        print("Write coordinator is running: queued maintenance with it (see its log)")
+        return
+    run(keep, not args.no_compact, args.force_compact)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Replay stored odds_lines snapshots into the odds_line_changes log and make odds_lines a view.
+
+The old table stays as odds_lines_legacy until --drop-legacy.
+"""
+
+import argparse
+from datetime import datetime
+
+import duckdb
+from dateutil import tz
+
+import db_bulk
+import odds_store
+
+DB_PATH = "db/features.duckdb"
+DETROIT_TZ = tz.gettz("America/Detroit")
+UTC_TZ = tz.UTC
+
+
+def snapshot_times(con) -> list[tuple[str, datetime, datetime | None]]:
+    """(snapshot_id, fetched_at_utc, fetched_at_local) oldest first."""
+    header_cols = {r[1] for r in con.execute("PRAGMA table_info('odds_snapshots')").fetchall()}
+    local_by_id = {}
+    if "fetched_at_local" in header_cols:
+        local_by_id = dict(con.execute("SELECT snapshot_id, fetched_at_local FROM odds_snapshots").fetchall())
+
+    out = []
+    for (snap,) in con.execute("SELECT DISTINCT snapshot_id FROM odds_lines").fetchall():
+        local = local_by_id.get(snap)
+        if local is None:
+            # get_odds.py snapshots have no header: the id is the local minute
+            for n, fmt in ((15, "%Y%m%d_%H%M%S"), (12, "%Y%m%d%H%M")):
+                try:
+                    local = datetime.strptime(snap[:n], fmt)
+                    break
+                except ValueError:
+                    continue
+        if local is None:
+            print(f"   skipping snapshot with unknown time: {snap}")
+            continue
+        utc = local.replace(tzinfo=DETROIT_TZ).astimezone(UTC_TZ).replace(tzinfo=None)
+        out.append((snap, utc, local))
+    return sorted(out, key=lambda r: r[1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert full-copy odds_lines into the delta change log")
+    ap.add_argument("--drop-legacy", action="store_true", help="drop odds_lines_legacy after a migration")
+    args = ap.parse_args()
+
+    con = duckdb.connect(DB_PATH)
+    if odds_store.is_delta(con):
+        with db_bulk.transaction(con):
+            upgraded = odds_store.upgrade_delta_schema(con)
+        print("Re-keyed the change log by source." if upgraded
+              else "odds_lines is already a change-log view. Nothing to migrate.")
+        if args.drop_legacy:
+            con.execute("DROP TABLE IF EXISTS odds_lines_legacy")
+            con.execute("CHECKPOINT")
+            print("Dropped odds_lines_legacy.")
+        con.close()
+        return
+
+    snaps = snapshot_times(con)
+    before = con.execute("SELECT count(*) FROM odds_lines").fetchone()[0]
+    print(f"BEFORE: {before} rows in odds_lines across {len(snaps)} snapshots")
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        odds_store.ensure_delta_schema(con)
+        for snap, utc, local in snaps:
+            lines = con.execute("SELECT * FROM odds_lines WHERE snapshot_id = ?", [snap]).df()
+            # get_odds.py wrote its lines without a source
+            sources = lines["source"].dropna()
+            source = sources.iloc[0] if len(sources) else odds_store.GET_ODDS_SOURCE
+            odds_store.write_delta(con, lines, snap, utc, local, source=source)
+        con.execute("ALTER TABLE odds_lines RENAME TO odds_lines_legacy")
+        odds_store.create_lines_view(con)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+    changes = con.execute("SELECT count(*) FROM odds_line_changes").fetchone()[0]
+    rebuilt = con.execute("SELECT count(*) FROM odds_lines").fetchone()[0]
+    print(f"AFTER:  {changes} change rows ({before / max(changes, 1):.1f}x smaller); "
+          f"view rebuilds {rebuilt} of {before} snapshot rows")
+    mismatch = con.execute("""
+        SELECT count(*) FROM (
+            SELECT snapshot_id, source_event_id, bookmaker, market, outcome_name, point_key, price FROM odds_lines_legacy
+            WHERE snapshot_id IN (SELECT snapshot_id FROM odds_line_snapshots)
+            EXCEPT
+            SELECT snapshot_id, source_event_id, bookmaker, market, outcome_name, point_key, price FROM odds_lines
+        )
+    """).fetchone()[0]
+    print(f"Legacy rows not reproduced by the view: {mismatch}")
+
+    if args.drop_legacy and mismatch == 0:
+        con.execute("DROP TABLE odds_lines_legacy")
+        print("Dropped odds_lines_legacy.")
+    con.execute("CHECKPOINT")
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
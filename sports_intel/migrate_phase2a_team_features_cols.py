@@ -23,6 +23,8 @@ def main():
     # Columns used by etl_phase2a.py
     add_col(con, "nhl_team_game_features", "updated_at_utc", "TIMESTAMP")
     add_col(con, "nhl_team_game_features", "created_at_utc", "TIMESTAMP")
+    add_col(con, "nhl_team_game_features", "event_id", "TEXT")
+    add_col(con, "nhl_team_game_features", "is_home", "BOOLEAN")
 
     con.commit()
     con.close()
@@ -0,0 +1,280 @@
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import duckdb
+
+import etl_phase3a_odds
+
+DB_PATH = "db/features.duckdb"
+
+# Poll cadence by time to the next puck drop (first match wins)
+TIERS = [
+    (timedelta(minutes=30), timedelta(minutes=5)),
+    (timedelta(hours=2), timedelta(minutes=15)),
+    (timedelta(hours=6), timedelta(hours=1)),
+    (timedelta(hours=24), timedelta(hours=3)),
+]
+FAR_INTERVAL = timedelta(hours=8)       # nothing on the board within a day
+FINAL_LEAD = timedelta(minutes=5)       # always land one poll just before puck drop
+MIN_INTERVAL = timedelta(minutes=1)
+
+# Quota guard (the Odds API quota resets monthly; cost = markets x regions per call)
+MIN_RESERVE = 25
+FAR_POLLS_PER_DAY = 24 / (FAR_INTERVAL.total_seconds() / 3600)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def request_cost() -> int:
+    return len(etl_phase3a_odds.MARKETS.split(",")) * len(etl_phase3a_odds.REGIONS.split(","))
+
+
+def quota_reset_at(now: datetime) -> datetime:
+    first = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return (first + timedelta(days=32)).replace(day=1)
+
+
+# ----------------------------
+# Planning
+# ----------------------------
+def base_interval(now: datetime, commence_times: list[datetime]) -> timedelta:
+    upcoming = [t for t in commence_times if t > now]
+    if not upcoming:
+        return FAR_INTERVAL
+    to_puck = upcoming[0] - now
+    interval = FAR_INTERVAL
+    for limit, every in TIERS:
+        if to_puck <= limit:
+            interval = every
+            break
+    # Don't sleep through the last pre-game look
+    if to_puck > FINAL_LEAD:
+        interval = min(interval, to_puck - FINAL_LEAD)
+    return max(interval, MIN_INTERVAL)
+
+
+def planned_polls(now: datetime, until: datetime, commence_times: list[datetime]) -> int:
+    n, t = 0, now
+    while t < until:
+        t += base_interval(t, commence_times)
+        n += 1
+    return n
+
+
+def next_interval(now: datetime, commence_times: list[datetime], remaining: int | None,
+                  cost: int) -> tuple[timedelta, str]:
+    """Tiered interval, stretched so the quota lasts until it resets."""
+    base = base_interval(now, commence_times)
+    if remaining is None:
+        return base, "quota unknown"
+
+    reset = quota_reset_at(now)
+    budget = remaining - MIN_RESERVE
+    if budget < cost:
+        return max(reset - now, MIN_INTERVAL), f"quota guard: {remaining} left, waiting for reset"
+
+    # Demand: the known slate at full cadence, then far-mode polling to the reset
+    last_game = max([t for t in commence_times if t > now], default=now)
+    horizon = min(last_game, reset)
+    demand = planned_polls(now, horizon, commence_times) * cost
+    demand += max(0.0, (reset - horizon).total_seconds() / 86400) * FAR_POLLS_PER_DAY * cost
+    stretch = max(1.0, demand / budget)
+    interval = base * stretch
+    reason = f"{remaining} left, need ~{demand:.0f}"
+    if stretch > 1.0:
+        reason += f", stretched x{stretch:.1f}"
+    return interval, reason
+
+
+# ----------------------------
+# Usage log (restart-safe state)
+# ----------------------------
+def ensure_schema(con):
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS odds_api_usage (
+        polled_at_utc TIMESTAMP PRIMARY KEY,
+        snapshot_id TEXT,
+        lines INTEGER,
+        requests_remaining INTEGER,
+        requests_used INTEGER,
+        requests_last INTEGER,
+        next_poll_utc TIMESTAMP,
+        reason TEXT,
+        slate_json TEXT
+    );
+    """)
+
+
+def last_usage(con):
+    row = con.execute("""
+        SELECT requests_remaining, requests_last, next_poll_utc, slate_json
+        FROM odds_api_usage ORDER BY polled_at_utc DESC LIMIT 1
+    """).fetchone()
+    if not row:
+        return None, None, None, []
+    remaining, last, next_poll, slate = row
+    return remaining, last, next_poll, [datetime.fromisoformat(t) for t in json.loads(slate or "[]")]
+
+
+def _int(v):
+    try:
+        return int(float(v))
+    except (TypeError, ValueError):
+        return None
+
+
+def poll_once(con=None) -> tuple[dict | None, datetime, str]:
+    """One snapshot, then plan the next poll and log both. Returns (summary, next_poll_utc, reason)."""
+    con = con.cursor() if con is not None else duckdb.connect(DB_PATH)
+    ensure_schema(con)
+    remaining, cost, _, slate = last_usage(con)
+    cost = cost or request_cost()
+
+    summary = etl_phase3a_odds.main(con)
+    now = utcnow()
+    if summary:
+        remaining = _int(summary["requests_remaining"]) if summary["requests_remaining"] is not None else remaining
+        cost = _int(summary["requests_last"]) or cost
+        slate = summary["commence_times_utc"]
+
+    interval, reason = next_interval(now, slate, remaining, cost)
+    next_poll = now + interval
+    con.execute(
+        "INSERT OR REPLACE INTO odds_api_usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [now, (summary or {}).get("snapshot_id"), (summary or {}).get("lines"), remaining,
+         _int((summary or {}).get("requests_used")), cost, next_poll, reason,
+         json.dumps([t.isoformat() for t in slate])],
+    )
+    con.close()
+    print(f"Next odds poll in {interval} ({next_poll:%H:%M} UTC) :: {reason}")
+    return summary, next_poll, reason
+
+
+def run(max_polls: int | None = None, speedup: float = 1.0):
+    con = duckdb.connect(DB_PATH)
+    ensure_schema(con)
+    _, _, next_poll, _ = last_usage(con)
+    con.close()
+
+    polls = 0
+    if next_poll and next_poll > utcnow():
+        wait = (next_poll - utcnow()).total_seconds()
+        print(f"Resuming: next poll at {next_poll:%Y-%m-%d %H:%M} UTC")
+        time.sleep(wait / speedup)
+
+    while max_polls is None or polls < max_polls:
+        _, next_poll, _ = poll_once()
+        polls += 1
+        if max_polls is not None and polls >= max_polls:
+            break
+        time.sleep(max(0.0, (next_poll - utcnow()).total_seconds()) / speedup)
+
+
+def plan(hours: float = 24.0):
+    """Dry run: print the cadence the current slate and quota would produce."""
+    con = duckdb.connect(DB_PATH)
+    ensure_schema(con)
+    remaining, cost, _, slate = last_usage(con)
+    con.close()
+    cost = cost or request_cost()
+    t = utcnow()
+    end = t + timedelta(hours=hours)
+    while t < end:
+        interval, reason = next_interval(t, slate, remaining, cost)
+        print(f"{t:%m-%d %H:%M} UTC  +{interval}  {reason}")
+        if remaining is not None:
+            remaining -= cost
+        t += interval
+
+
+# ----------------------------
+# Local stub of the Odds API (for testing the scheduler end to end)
+# ----------------------------
+def make_stub_handler(quota: int, game_offsets_h: list[float], cost: int):
+    start = utcnow()
+    state = {"remaining": quota, "used": 0}
+    rnd = random.Random(7)
+    books = ["draftkings", "fanduel", "betmgm", "caesars"]
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            qs = parse_qs(parts.query)
+            if not parts.path.rstrip("/").endswith("/odds") or "apiKey" not in qs:
+                self.send_response(401)
+                self.end_headers()
+                return
+            if state["remaining"] < cost:
+                self.send_response(429)
+                self.send_header("Retry-After", "60")
+                self.end_headers()
+                return
+            state["remaining"] -= cost
+            state["used"] += cost
+            events = []
+            for i, h in enumerate(game_offsets_h):
+                commence = start + timedelta(hours=h)
+                if commence < utcnow():
+                    continue  # games drop off the board at puck drop
+                events.append({
+                    "id": f"stub{i}", "home_team": f"Home {i}", "away_team": f"Away {i}",
+                    "commence_time": commence.isoformat() + "Z",
+                    "bookmakers": [{"key": b, "title": b.title(), "markets": [{"key": "h2h", "outcomes": [
+                        {"name": f"Home {i}", "price": -120 + rnd.choice([0, 0, 0, 5, -5])},
+                        {"name": f"Away {i}", "price": 100 + rnd.choice([0, 0, 0, 5, -5])},
+                    ]}]} for b in books],
+                })
+            body = json.dumps(events).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("x-requests-remaining", str(state["remaining"]))
+            self.send_header("x-requests-used", str(state["used"]))
+            self.send_header("x-requests-last", str(cost))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            print(f"stub: {self.command} {self.path.split('?')[0]} remaining={state['remaining']}")
+
+    return StubHandler
+
+
+def serve_stub(port: int, quota: int, game_offsets_h: list[float]):
+    handler = make_stub_handler(quota, game_offsets_h, request_cost())
+    srv = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    print(f"Odds API stub on http://127.0.0.1:{port}/v4/sports (quota={quota}, games at +{game_offsets_h}h)")
+    print(f"  ODDS_API_BASE=http://127.0.0.1:{port}/v4/sports ODDS_API_KEY=stub python odds_scheduler.py run")
+    srv.serve_forever()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Quota-aware odds polling scheduler")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("run", help="poll forever on the adaptive schedule")
+    rp.add_argument("--max-polls", type=int, default=None)
+    rp.add_argument("--speedup", type=float, default=1.0, help="divide sleeps (testing against the stub)")
+    pp = sub.add_parser("plan", help="dry run of the next N hours")
+    pp.add_argument("--hours", type=float, default=24.0)
+    sp = sub.add_parser("stub", help="serve a fake Odds API locally")
+    sp.add_argument("--port", type=int, default=8765)
+    sp.add_argument("--quota", type=int, default=500)
+    sp.add_argument("--games", default="0.5,2,5,26", help="comma separated puck drops, hours from now")
+    args = ap.parse_args()
+
+    if args.cmd == "run":
+        run(args.max_polls, args.speedup)
+    elif args.cmd == "plan":
+        plan(args.hours)
+    else:
+        serve_stub(args.port, args.quota, [float(h) for h in args.games.split(",")])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import db_bulk
+
+SOURCE = "theoddsapi"
+GET_ODDS_SOURCE = "get_odds"  # get_odds.py's one-book-per-market lines: diffed apart from SOURCE's
+MAJOR_BOOKS = ["draftkings", "fanduel", "betmgm", "caesars"]
+POINT_SENTINEL = -999999.0
+
+LINE_COLUMNS = ["snapshot_id", "fetched_at_utc", "fetched_at_local", "source", "bookmaker", "bookmaker_title", "market",
+                "source_event_id", "commence_time_utc", "home_team", "away_team",
+                "outcome_name", "price", "point", "point_key"]
+
+
+# ----------------------------
+# Flatten (one vectorized pass per /odds response)
+# ----------------------------
+def flatten_odds(snapshot_id: str, events: list, fetched_at_local=None, fetched_at_utc=None) -> pd.DataFrame:
+    """events x bookmakers x markets x outcomes -> one odds_lines row per outcome."""
+    if not events:
+        return pd.DataFrame(columns=LINE_COLUMNS)
+    df = pd.json_normalize(
+        events,
+        record_path=["bookmakers", "markets", "outcomes"],
+        meta=["id", "commence_time", "home_team", "away_team",
+              ["bookmakers", "key"], ["bookmakers", "title"], ["bookmakers", "markets", "key"]],
+        errors="ignore",
+    )
+    if df.empty:
+        return pd.DataFrame(columns=LINE_COLUMNS)
+    if "point" not in df:
+        df["point"] = None
+
+    out = pd.DataFrame({
+        "snapshot_id": snapshot_id,
+        "fetched_at_utc": fetched_at_utc,
+        "fetched_at_local": fetched_at_local,
+        "source": SOURCE,
+        "bookmaker": df["bookmakers.key"],
+        "bookmaker_title": df.get("bookmakers.title"),
+        "market": df["bookmakers.markets.key"],
+        "source_event_id": df["id"],
+        "commence_time_utc": pd.to_datetime(df["commence_time"], utc=True).dt.tz_localize(None),
+        "home_team": df["home_team"],
+        "away_team": df["away_team"],
+        "outcome_name": df["name"],
+        "price": df["price"].astype("Int64"),
+        "point": pd.to_numeric(df["point"], errors="coerce"),
+    })
+    # DuckDB PKs can't hold expressions: NULL point -> sentinel key
+    out["point_key"] = out["point"].fillna(POINT_SENTINEL)
+    # Same outcome listed twice by a book: last one wins (matches INSERT OR REPLACE)
+    return out.drop_duplicates(
+        subset=["bookmaker", "market", "source_event_id", "outcome_name", "point_key"], keep="last"
+    )
+
+
+def first_major_book(lines: pd.DataFrame) -> pd.DataFrame:
+    """get_odds.py's selection: major books only, first one quoting each market of a game."""
+    lines = lines[lines["bookmaker"].isin(MAJOR_BOOKS)]
+    first_book = lines.groupby(["source_event_id", "market"])["bookmaker"].transform("first")
+    return lines[lines["bookmaker"] == first_book]
+
+
+# ----------------------------
+# Delta storage: one row per price change (odds_lines becomes a view)
+# Each source is its own log: a snapshot only diffs / tombstones its own source's lines
+# ----------------------------
+KEY_COLS = ["source", "source_event_id", "bookmaker", "market", "outcome_name", "point_key"]
+CHANGE_COLS = ["snapshot_id", "changed_at_utc", "source", "bookmaker", "bookmaker_title", "market",
+               "source_event_id", "commence_time_utc", "home_team", "away_team",
+               "outcome_name", "price", "point", "point_key", "is_removed"]
+
+CHANGE_TABLE_COLS = """
+        snapshot_id TEXT,
+        changed_at_utc TIMESTAMP,
+        source TEXT,
+        bookmaker TEXT,
+        bookmaker_title TEXT,
+        market TEXT,
+        source_event_id TEXT,
+        commence_time_utc TIMESTAMP,
+        home_team TEXT,
+        away_team TEXT,
+        outcome_name TEXT,
+        price INTEGER,
+        point DOUBLE,
+        point_key DOUBLE,
+        is_removed BOOLEAN"""
+
+
+def ensure_delta_schema(con):
+    # Append-only change log (tombstones have is_removed = TRUE)
+    keys = ", ".join(KEY_COLS)
+    con.execute(f"""
+    CREATE TABLE IF NOT EXISTS odds_line_changes ({CHANGE_TABLE_COLS},
+        PRIMARY KEY ({keys}, snapshot_id)
+    );
+    """)
+    # Latest row per line key: what the next snapshot is diffed against
+    con.execute(f"""
+    CREATE TABLE IF NOT EXISTS odds_line_state ({CHANGE_TABLE_COLS},
+        PRIMARY KEY ({keys})
+    );
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS odds_line_snapshots (
+        snapshot_id TEXT PRIMARY KEY,
+        fetched_at_utc TIMESTAMP,
+        fetched_at_local TIMESTAMP,
+        lines INTEGER,
+        changes INTEGER,
+        source TEXT
+    );
+    """)
+    con.execute(f"""
+    CREATE OR REPLACE VIEW odds_line_intervals AS
+    SELECT *,
+           lead(changed_at_utc) OVER (
+               PARTITION BY {keys}
+               ORDER BY changed_at_utc
+           ) AS valid_to
+    FROM odds_line_changes;
+    """)
+    # Any point in time: SELECT * FROM odds_lines_asof(TIMESTAMP '2026-01-20 23:00')
+    con.execute("""
+    CREATE OR REPLACE MACRO odds_lines_asof(ts) AS TABLE
+    SELECT source, bookmaker, bookmaker_title, market, source_event_id, commence_time_utc,
+           home_team, away_team, outcome_name, price, point, point_key, changed_at_utc
+    FROM odds_line_intervals
+    WHERE changed_at_utc <= ts AND (valid_to IS NULL OR ts < valid_to) AND NOT is_removed;
+    """)
+
+
+def create_lines_view(con):
+    """odds_lines as a view: every recorded snapshot rebuilt from the change log."""
+    con.execute("""
+    CREATE OR REPLACE VIEW odds_lines AS
+    SELECT s.snapshot_id, s.fetched_at_utc, s.fetched_at_local,
+           c.source, c.bookmaker, c.bookmaker_title, c.market, c.source_event_id, c.commence_time_utc,
+           c.home_team, c.away_team, c.outcome_name, c.price, c.point, c.point_key
+    FROM odds_line_snapshots s
+    JOIN odds_line_intervals c
+      ON c.source = s.source
+     AND c.changed_at_utc <= s.fetched_at_utc
+     AND (c.valid_to IS NULL OR s.fetched_at_utc < c.valid_to)
+    WHERE NOT c.is_removed;
+    """)
+
+
+def upgrade_delta_schema(con) -> bool:
+    """Re-key a change log created before sources were kept apart. Returns True if it did."""
+    keyed = con.execute("""
+        SELECT count(*) FROM duckdb_constraints()
+        WHERE table_name = 'odds_line_state' AND constraint_type = 'PRIMARY KEY'
+          AND list_contains(constraint_column_names, 'source')
+    """).fetchone()[0]
+    if keyed:
+        return False
+    con.execute("ALTER TABLE odds_line_snapshots ADD COLUMN IF NOT EXISTS source TEXT")
+    con.execute("UPDATE odds_line_snapshots SET source = ? WHERE source IS NULL", [SOURCE])
+    for table in ("odds_line_changes", "odds_line_state"):
+        con.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    ensure_delta_schema(con)
+    for table in ("odds_line_changes", "odds_line_state"):
+        con.execute(f"INSERT INTO {table} SELECT * REPLACE (coalesce(source, '{SOURCE}') AS source) FROM {table}_old")
+        con.execute(f"DROP TABLE {table}_old")
+    create_lines_view(con)
+    return True
+
+
+def is_delta(con) -> bool:
+    return con.execute(
+        "SELECT count(*) FROM duckdb_views() WHERE view_name = 'odds_lines'"
+    ).fetchone()[0] > 0
+
+
+def lines_asof(con, ts) -> pd.DataFrame:
+    return con.execute("SELECT * FROM odds_lines_asof(?::TIMESTAMP)", [ts]).df()
+
+
+def write_delta(con, lines: pd.DataFrame, snapshot_id: str, fetched_at_utc,
+                fetched_at_local=None, markets=None, source=SOURCE) -> int:
+    """Append only what moved since source's previous snapshot. Caller owns the transaction.
+
+    Any live line of the same source in one of this snapshot's markets that the
+    snapshot no longer quotes gets a tombstone, so each snapshot rebuilds exactly
+    as it was fetched.
+    """
+    seen = con.execute("SELECT count(*) FROM odds_line_snapshots WHERE snapshot_id = ?", [snapshot_id]).fetchone()[0]
+    if seen:
+        return 0  # already in the log (same-minute get_odds re-run)
+    df = lines.copy()
+    for c in CHANGE_COLS:
+        if c not in df:
+            df[c] = None
+    df["snapshot_id"] = snapshot_id
+    df["source"] = source
+    df["changed_at_utc"] = fetched_at_utc
+    df["is_removed"] = False
+    df = df[CHANGE_COLS]
+    if markets is None:
+        markets = df["market"].dropna().unique()
+    mk = pd.DataFrame({"market": list(markets)}, dtype="object")
+
+    on = " AND ".join(f"s.{c} = n.{c}" for c in KEY_COLS)
+    con.execute(f"""
+        INSERT INTO odds_line_changes
+        SELECT n.* FROM df n
+        LEFT JOIN odds_line_state s ON {on}
+        WHERE s.source_event_id IS NULL OR s.is_removed
+           OR s.price IS DISTINCT FROM n.price
+           OR s.commence_time_utc IS DISTINCT FROM n.commence_time_utc
+    """)
+
+    cols = ", ".join(f"s.{c}" for c in CHANGE_COLS[2:-1])
+    con.execute(f"""
+        INSERT INTO odds_line_changes
+        SELECT ?, ?, {cols}, TRUE
+        FROM odds_line_state s
+        WHERE NOT s.is_removed
+          AND s.source = ?
+          AND s.market IN (SELECT market FROM mk)
+          AND NOT EXISTS (SELECT 1 FROM df n WHERE {on})
+    """, [snapshot_id, fetched_at_utc, source])
+
+    con.execute("INSERT OR REPLACE INTO odds_line_state SELECT * FROM odds_line_changes WHERE snapshot_id = ?",
+                [snapshot_id])
+    changes = con.execute("SELECT count(*) FROM odds_line_changes WHERE snapshot_id = ?",
+                          [snapshot_id]).fetchone()[0]
+    con.execute("""
+        INSERT OR REPLACE INTO odds_line_snapshots (snapshot_id, fetched_at_utc, fetched_at_local, lines, changes, source)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [snapshot_id, fetched_at_utc, fetched_at_local, len(df), changes, source])
+    return changes
+
+
+# ----------------------------
+# Write (single bulk statement, one transaction)
+# ----------------------------
+def write_snapshot(con, lines: pd.DataFrame, header: dict | None = None, markets: list[str] | None = None) -> int:
+    """Upsert the snapshot header (optional) and all of its lines atomically.
+
+    Headers land in odds_snapshots, where Phase 3B/3C take the latest snapshot
+    from, so only Phase 3A passes one. get_odds.py's lines carry their own fetch
+    times and it names the markets it asked for instead.
+
+    Only columns the deployed odds_lines / odds_snapshots actually have are written,
+    so older and newer schema variants both work. Once migrate_odds_line_changes.py
+    has run, lines go to the change log instead. Returns rows written.
+    """
+    delta = is_delta(con)
+    with db_bulk.transaction(con):
+        if header:
+            db_bulk.bulk_upsert(con, "odds_snapshots", [header], strict=False)
+        if delta and (header or len(lines)):
+            header = header or {}
+            snapshot_id = header.get("snapshot_id") or lines["snapshot_id"].iloc[0]
+            fetched_at_utc = header.get("fetched_at_utc") or _first(lines, "fetched_at_utc") \
+                or datetime.now(timezone.utc).replace(tzinfo=None)
+            fetched_at_local = header.get("fetched_at_local") or _first(lines, "fetched_at_local")
+            markets = header["markets"].split(",") if header.get("markets") else markets
+            source = header.get("source") or _first(lines, "source") or SOURCE
+            written = write_delta(con, lines, snapshot_id, fetched_at_utc, fetched_at_local, markets, source)
+        elif len(lines):
+            written = db_bulk.bulk_upsert(con, "odds_lines", lines, strict=False)
+        else:
+            written = 0
+    return written
+
+
+def _first(df: pd.DataFrame, col: str):
+    if col not in df or not len(df):
+        return None
+    v = df[col].iloc[0]
+    return None if pd.isna(v) else v
@@ -0,0 +1,325 @@
+import argparse
+import fcntl
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from multiprocessing import Pool
+from pathlib import Path
+from urllib.parse import urlsplit, urlencode, parse_qsl
+
+import duckdb
+import pandas as pd
+
+try:
+    import zstandard
+except ImportError:  # lake is optional for fetching; reparse needs it
+    zstandard = None
+
+# Raw API payloads, kept forever: lake/<kind>/dt=YYYY-MM-DD/<key>.json.zst
+MODULE_DIR = Path(__file__).resolve().parent
+LAKE_DIR = Path(os.getenv("SPORTS_INTEL_LAKE", MODULE_DIR / "lake"))
+MANIFEST = LAKE_DIR / "manifest.jsonl"
+ZSTD_LEVEL = 10
+
+FEATURES_DB = MODULE_DIR / "db" / "features.duckdb"
+ORACLE_DB = MODULE_DIR.parent / "oracle_data.duckdb"
+
+FINAL_STATES = {"FINAL", "OFF"}
+SECRET_PARAMS = {"apiKey", "api_key"}
+
+_warned = False
+_local = threading.local()
+
+
+# ----------------------------
+# Classification
+# ----------------------------
+NHL_KINDS = [
+    ("boxscore", re.compile(r"/gamecenter/(\d+)/boxscore")),
+    ("score", re.compile(r"/score/([\d-]+)")),
+    ("schedule", re.compile(r"/schedule/([\d-]+)")),
+    ("standings", re.compile(r"/standings/([\w-]+)")),
+]
+
+
+def kind_for(url: str):
+    """(kind, key) for NHL endpoints we keep; None for anything else."""
+    if "api-web.nhle.com" not in url:
+        return None
+    for kind, rx in NHL_KINDS:
+        m = rx.search(url)
+        if m:
+            return kind, m.group(1)
+    return None
+
+
+def strip_secrets(url: str, params: dict | None = None) -> str:
+    parts = urlsplit(url)
+    q = [(k, v) for k, v in parse_qsl(parts.query) if k not in SECRET_PARAMS]
+    q += [(k, v) for k, v in (params or {}).items() if k not in SECRET_PARAMS]
+    return parts._replace(query=urlencode(q)).geturl()
+
+
+def partition_date(kind: str, key: str, data) -> str:
+    if kind == "boxscore" and isinstance(data, dict) and data.get("gameDate"):
+        return data["gameDate"]
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", key):
+        return key
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+# ----------------------------
+# Write side
+# ----------------------------
+def _compressor():
+    c = getattr(_local, "cctx", None)
+    if c is None:
+        c = _local.cctx = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return c
+
+
+def _append_manifest(record: dict):
+    LAKE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(MANIFEST, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def store(kind: str, key: str, data, url: str = "", dt: str | None = None, meta: dict | None = None) -> Path | None:
+    """Write one payload to the lake (same kind/key overwrites: latest wins)."""
+    global _warned
+    if zstandard is None:
+        if not _warned:
+            print("payload_lake: zstandard not installed, raw payloads are not being kept.")
+            _warned = True
+        return None
+
+    dt = dt or partition_date(kind, key, data)
+    path = LAKE_DIR / kind / f"dt={dt}" / f"{key}.json.zst"
+    envelope = {"kind": kind, "key": key, "url": url, "fetched_at": time.time(), "meta": meta or {}, "body": data}
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        blob = _compressor().compress(json.dumps(envelope, separators=(",", ":")).encode())
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(blob)
+        os.replace(tmp, path)
+        _append_manifest({
+            "kind": kind, "key": key, "dt": dt, "path": str(path.relative_to(LAKE_DIR)),
+            "bytes": len(blob), "fetched_at": envelope["fetched_at"], "url": url, "meta": meta or {},
+        })
+    except OSError as e:
+        # A full SD card must not take ingestion down with it
+        print(f"payload_lake: write failed for {kind}/{key} :: {e}")
+        return None
+    return path
+
+
+def store_response(url: str, params: dict | None, data):
+    """Hook for http_fetch: keep NHL payloads we know how to re-parse."""
+    hit = kind_for(url)
+    if not hit:
+        return None
+    kind, key = hit
+    return store(kind, key, data, url=strip_secrets(url, params))
+
+
+# ----------------------------
+# Read side
+# ----------------------------
+def load(path: Path) -> dict:
+    d = getattr(_local, "dctx", None)
+    if d is None:
+        d = _local.dctx = zstandard.ZstdDecompressor()
+    return json.loads(d.decompress(path.read_bytes()))
+
+
+def iter_paths(kind: str, since: str | None = None, until: str | None = None) -> list[Path]:
+    out = []
+    for part in sorted((LAKE_DIR / kind).glob("dt=*")):
+        dt = part.name[3:]
+        if (since and dt < since) or (until and dt > until):
+            continue
+        out.extend(sorted(part.glob("*.json.zst")))
+    return out
+
+
+# ----------------------------
+# Re-parse jobs (run in worker processes)
+# ----------------------------
+def _ingest_stats():
+    # ingest_stats lives one level up (home dir scripts)
+    if str(MODULE_DIR.parent) not in sys.path:
+        sys.path.append(str(MODULE_DIR.parent))
+    import ingest_stats
+    return ingest_stats
+
+
+def _parse_player_games(path: Path) -> list[tuple]:
+    ingest_stats = _ingest_stats()
+    box = load(path)["body"]
+    if box.get("gameState") not in FINAL_STATES:
+        return []
+    # gameDate is the local game day (startTimeUTC rolls late games into tomorrow)
+    return ingest_stats.parse_player_games(
+        box, box["id"], box.get("gameDate") or box["startTimeUTC"].split("T")[0],
+        box["homeTeam"]["abbrev"], box["awayTeam"]["abbrev"],
+    )
+
+
+def _parse_team_game_stats(path: Path) -> list[dict]:
+    import etl_phase2a
+
+    box = load(path)["body"]
+    if box.get("gameState") not in FINAL_STATES:
+        return []
+    return [r for r in etl_phase2a.parse_team_game_rows(box) if r["team_abbrev"]]
+
+
+def _parse_odds_lines(path: Path) -> list[dict]:
+    import odds_store
+
+    env = load(path)
+    meta = env["meta"]
+    fetched_at_local = datetime.fromisoformat(meta["fetched_at_local"]) if meta.get("fetched_at_local") else None
+    fetched_at_utc = datetime.fromtimestamp(env["fetched_at"], timezone.utc).replace(tzinfo=None)
+    lines = odds_store.flatten_odds(meta.get("snapshot_id") or env["key"], env["body"],
+                                    fetched_at_local, fetched_at_utc)
+    if meta.get("source") == odds_store.GET_ODDS_SOURCE:
+        lines = odds_store.first_major_book(lines).assign(source=odds_store.GET_ODDS_SOURCE)
+    lines["markets"] = meta.get("markets")
+    return lines.to_dict("records")
+
+
+TARGETS = {
+    # target: (lake kind, parser, default db)
+    "player_game_stats": ("boxscore", _parse_player_games, ORACLE_DB),
+    "nhl_team_game_stats": ("boxscore", _parse_team_game_stats, FEATURES_DB),
+    "odds_lines": ("odds", _parse_odds_lines, FEATURES_DB),
+}
+
+
+def _parse_all(target: str, paths: list[Path], workers: int) -> list:
+    _, parser, _ = TARGETS[target]
+    rows = []
+    if workers <= 1 or len(paths) < 2:
+        for p in paths:
+            rows.extend(parser(p))
+        return rows
+    with Pool(workers) as pool:
+        for chunk in pool.imap_unordered(parser, paths, chunksize=32):
+            rows.extend(chunk)
+    return rows
+
+
+def _write_target(con, target: str, rows: list, truncate: bool):
+    import db_bulk
+
+    with db_bulk.transaction(con):
+        if target == "player_game_stats":
+            ingest_stats = _ingest_stats()
+            con.execute(ingest_stats.PLAYER_GAME_STATS_DDL)
+            if truncate:
+                con.execute("DELETE FROM player_game_stats")
+            if rows:
+                ingest_stats.upsert_player_games(con, rows)
+            return
+
+        if target == "odds_lines":
+            import odds_store
+            _write_odds(con, odds_store, rows, truncate)
+            return
+        if truncate:
+            con.execute(f"DELETE FROM {target}")
+        db_bulk.bulk_upsert(con, target, rows)
+
+
+def _write_odds(con, odds_store, rows: list, truncate: bool):
+    delta = odds_store.is_delta(con)
+    if truncate:
+        tables = ["odds_line_changes", "odds_line_state", "odds_line_snapshots"] if delta else ["odds_lines"]
+        for t in tables:
+            con.execute(f"DELETE FROM {t}")
+    lines = pd.DataFrame(rows)
+    if lines.empty:
+        return
+    # Only Phase 3A snapshots get an odds_snapshots header (see odds_store.write_snapshot)
+    if not delta:
+        headers = lines[lines["source"] == odds_store.SOURCE].drop_duplicates("snapshot_id")[
+            ["snapshot_id", "fetched_at_local", "fetched_at_utc", "source", "markets"]]
+        import db_bulk
+        db_bulk.bulk_upsert(con, "odds_snapshots", headers, strict=False)
+        odds_store.write_snapshot(con, lines.drop(columns=["markets"]))
+        return
+    # Change log must be replayed in fetch order, one snapshot at a time
+    for _, snap in sorted(lines.groupby("snapshot_id"), key=lambda g: g[1]["fetched_at_utc"].iloc[0]):
+        first = snap.iloc[0]
+        markets = first["markets"].split(",") if isinstance(first["markets"], str) else None
+        header = None
+        if first["source"] == odds_store.SOURCE:
+            header = {"snapshot_id": first["snapshot_id"], "fetched_at_utc": first["fetched_at_utc"],
+                      "fetched_at_local": first["fetched_at_local"], "source": first["source"],
+                      "markets": first["markets"]}
+        odds_store.write_snapshot(con, snap.drop(columns=["markets"]), header, markets)
+
+
+def reparse(target: str, db_path=None, since=None, until=None, workers=None, truncate=False) -> int:
+    if zstandard is None:
+        raise RuntimeError("reparse needs the zstandard package (pip install zstandard)")
+    kind, _, default_db = TARGETS[target]
+    paths = iter_paths(kind, since, until)
+    workers = workers or os.cpu_count() or 1
+
+    t0 = time.time()
+    rows = _parse_all(target, paths, workers)
+    t1 = time.time()
+    print(f"Parsed {len(paths)} {kind} payloads -> {len(rows)} rows in {t1 - t0:.1f}s ({workers} workers)")
+
+    con = duckdb.connect(str(db_path or default_db))
+    try:
+        _write_target(con, target, rows, truncate)
+    finally:
+        con.close()
+    print(f"{target} rebuilt from lake in {time.time() - t1:.1f}s")
+    return len(rows)
+
+
+def stats() -> pd.DataFrame:
+    rows = []
+    for kind_dir in sorted(p for p in LAKE_DIR.glob("*") if p.is_dir()):
+        files = list(kind_dir.glob("dt=*/*.json.zst"))
+        dts = sorted({f.parent.name[3:] for f in files})
+        rows.append({
+            "kind": kind_dir.name, "files": len(files), "bytes": sum(f.stat().st_size for f in files),
+            "first_dt": dts[0] if dts else None, "last_dt": dts[-1] if dts else None,
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Raw NHL / Odds API payload lake")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="files and bytes per kind")
+    rp = sub.add_parser("reparse", help="rebuild a table from stored payloads (no API calls)")
+    rp.add_argument("target", choices=sorted(TARGETS))
+    rp.add_argument("--db", help="override target database path")
+    rp.add_argument("--since", help="first partition date (YYYY-MM-DD)")
+    rp.add_argument("--until", help="last partition date (YYYY-MM-DD)")
+    rp.add_argument("--workers", type=int, default=None)
+    rp.add_argument("--truncate", action="store_true", help="empty the table before rebuilding")
+    args = ap.parse_args()
+
+    if args.cmd == "stats":
+        print(stats().to_string(index=False))
+    else:
+        reparse(args.target, args.db, args.since, args.until, args.workers, args.truncate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""Daily run in one process: stages declare their DB and dependencies and
+independent ones run concurrently, each DB opened once.
+
+DBs whose stages all succeeded are published as replicas. When
+scheduler_daemon.py owns the DBs, the CLI queues the run with it instead.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from pathlib import Path
+
+import duckdb
+from dotenv import load_dotenv
+
+import db_bulk
+import replica
+
+MODULE_DIR = Path(__file__).resolve().parent
+HOME_DIR = MODULE_DIR.parent
+FEATURES_DB = MODULE_DIR / "db" / "features.duckdb"
+ORACLE_DB = HOME_DIR / "oracle_data.duckdb"
+
+MAX_WORKERS = 4
+REPLICAS = {FEATURES_DB: "features", ORACLE_DB: "oracle_data"}
+
+if str(HOME_DIR) not in sys.path:
+    sys.path.insert(0, str(HOME_DIR))  # ingest_stats, prop_engine, ... live in ~
+
+
+# ----------------------------
+# Stages (modules are imported on first use and stay warm for the run)
+# ----------------------------
+def _phase1(con):
+    import etl_phase1
+    etl_phase1.main(con)
+
+
+def _phase2a(con):
+    import etl_phase2a
+    etl_phase2a.main(con)
+
+
+def _ingest(con):
+    import ingest_stats
+    ingest_stats.init_db(con)
+    ingest_stats.ingest_recent_games(con=con)
+
+
+def _props(con):
+    import prop_engine
+    prop_engine.run_prop_lab(con)
+
+
+def _games(con):
+    import game_engine
+    game_engine.analyze_games(con)
+
+
+def _odds(con):
+    import odds_scheduler
+    summary, next_poll, reason = odds_scheduler.poll_once(con)
+    snap = f"{summary['lines']} lines" if summary else "no snapshot"
+    return f"{snap}; next poll {next_poll:%H:%M} UTC ({reason})"
+
+
+def _match(con):
+    import etl_phase3b_match_consensus
+    etl_phase3b_match_consensus.main(con)
+
+
+def _edges(con):
+    import etl_phase3c_edge_shrink
+    etl_phase3c_edge_shrink.main(con)
+
+
+def _analyst(con):
+    import ai_analyst
+    ai_analyst.brief_the_kingpin(con)
+
+
+def _validator(con):
+    import line_shopper
+    line_shopper.main(con)
+
+
+# name -> (db, depends on, callable)
+STAGES = {
+    "phase1": (FEATURES_DB, [], _phase1),
+    "phase2a": (FEATURES_DB, ["phase1"], _phase2a),
+    "ingest": (ORACLE_DB, [], _ingest),
+    "odds": (FEATURES_DB, [], _odds),
+    "props": (ORACLE_DB, ["ingest"], _props),
+    "games": (ORACLE_DB, ["ingest"], _games),
+    "match": (FEATURES_DB, ["odds", "phase1"], _match),
+    "edges": (FEATURES_DB, ["match", "phase2a"], _edges),
+    "analyst": (ORACLE_DB, ["props", "games"], _analyst),
+    "validator": (ORACLE_DB, ["props", "games"], _validator),
+}
+
+TARGETS = {
+    "daily": list(STAGES),
+    "refresh": ["phase1", "phase2a"],
+    "odds": ["odds", "match", "edges"],
+}
+
+
+def resolve(names: list[str], with_deps: bool = True) -> list[str]:
+    """Expand targets (and, by default, upstream stages) into declared stage order."""
+    wanted = set()
+    todo = []
+    for n in names:
+        todo.extend(TARGETS.get(n, [n]))
+    while todo:
+        n = todo.pop()
+        if n not in STAGES:
+            raise ValueError(f"unknown stage: {n}")
+        if n in wanted:
+            continue
+        wanted.add(n)
+        if with_deps:
+            todo.extend(STAGES[n][1])
+    return [n for n in STAGES if n in wanted]
+
+
+# ----------------------------
+# Refresh log
+# ----------------------------
+def ensure_log_schema(con):
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS system_refresh_log (
+      run_id TEXT PRIMARY KEY,
+      started_at TIMESTAMP,
+      finished_at TIMESTAMP,
+      status TEXT,
+      message TEXT
+    );
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS system_refresh_stages (
+      run_id TEXT,
+      stage TEXT,
+      started_at TIMESTAMP,
+      finished_at TIMESTAMP,
+      seconds DOUBLE,
+      status TEXT,
+      message TEXT,
+      PRIMARY KEY (run_id, stage)
+    );
+    """)
+
+
+def _log_stage(con, run_id: str, stage: str, result: dict):
+    db_bulk.bulk_upsert(con, "system_refresh_stages", [{"run_id": run_id, "stage": stage, **result}])
+
+
+# ----------------------------
+# Runner
+# ----------------------------
+def _run_stage(name: str, con) -> dict:
+    _, _, fn = STAGES[name]
+    started = datetime.now()
+    t0 = time.perf_counter()
+    print(f"[{name}] start")
+    try:
+        message = fn(con)
+        status = "OK"
+    except (Exception, SystemExit) as e:
+        message = f"{type(e).__name__}: {e}"
+        status = "FAIL"
+    seconds = time.perf_counter() - t0
+    print(f"[{name}] {status} in {seconds:.1f}s" + (f" :: {message}" if message else ""))
+    return {"started_at": started, "finished_at": datetime.now(), "seconds": seconds,
+            "status": status, "message": message}
+
+
+def connect_all(dbs, cons: dict | None = None) -> dict:
+    """{db path: connection}, opening only the ones not already in cons."""
+    cons = {} if cons is None else cons
+    for db in dbs:
+        if db not in cons:
+            db.parent.mkdir(parents=True, exist_ok=True)
+            cons[db] = duckdb.connect(str(db))
+    return cons
+
+
+def run(names: list[str], workers: int = MAX_WORKERS, with_deps: bool = True,
+        cons: dict | None = None) -> dict[str, dict]:
+    """Run the stages; pass cons (see connect_all) to keep connections open across runs."""
+    order = resolve(names, with_deps)
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    started = datetime.now()
+
+    # One connection per DB file for the whole run (the refresh log lives in features.duckdb)
+    owned = cons is None
+    cons = connect_all([FEATURES_DB] + [STAGES[n][0] for n in order], cons)
+    log_con = cons[FEATURES_DB]
+    ensure_log_schema(log_con)
+
+    print(f"Pipeline {run_id}: {' -> '.join(order)} ({workers} workers)")
+    results = {}
+    pending = list(order)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while pending or running:
+            for name in list(pending):
+                deps = [d for d in STAGES[name][1] if d in order]
+                if any(results.get(d, {}).get("status") in ("FAIL", "SKIP") for d in deps):
+                    now = datetime.now()
+                    results[name] = {"started_at": now, "finished_at": now, "seconds": 0.0,
+                                     "status": "SKIP", "message": "upstream stage failed"}
+                    _log_stage(log_con, run_id, name, results[name])
+                    pending.remove(name)
+                elif all(d in results for d in deps):
+                    running[pool.submit(_run_stage, name, cons[STAGES[name][0]])] = name
+                    pending.remove(name)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                results[name] = fut.result()
+                _log_stage(log_con, run_id, name, results[name])
+
+    failed = [n for n in order if results[n]["status"] != "OK"]
+    status = "FAIL" if failed else "OK"
+    message = f"{len(order) - len(failed)}/{len(order)} stages ok"
+    if failed:
+        message += f"; not ok: {', '.join(failed)}"
+    db_bulk.bulk_upsert(log_con, "system_refresh_log", [{
+        "run_id": run_id, "started_at": started, "finished_at": datetime.now(), "status": status, "message": message,
+    }])
+
+    # Dashboards read replicas: publish each DB whose stages all succeeded
+    for db, name in REPLICAS.items():
+        stages = [n for n in order if STAGES[n][0] == db]
+        if stages and all(results[n]["status"] == "OK" for n in stages):
+            try:
+                replica.publish(cons[db], name, run_id)
+            except Exception as e:
+                print(f"Replica publish failed for {name}: {type(e).__name__}: {e}")
+
+    print(f"\n{'stage':<10} {'status':<6} {'seconds':>8}")
+    for n in order:
+        print(f"{n:<10} {results[n]['status']:<6} {results[n]['seconds']:8.1f}")
+    print(f"Pipeline {run_id} {status}: {message} in {(datetime.now() - started).total_seconds():.1f}s")
+
+    if owned:
+        for con in cons.values():
+            con.close()
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the daily stages as one dependency graph")
+    ap.add_argument("names", nargs="*", default=["daily"],
+                    help=f"targets {list(TARGETS)} or stages {list(STAGES)}")
+    ap.add_argument("--only", action="store_true", help="run just the named stages, not their upstream stages")
+    ap.add_argument("--workers", type=int, default=MAX_WORKERS)
+    ap.add_argument("--list", action="store_true", help="print the stage graph and exit")
+    args = ap.parse_args()
+
+    if args.list:
+        for name, (db, deps, _) in STAGES.items():
+            print(f"{name:<10} {db.name:<22} <- {', '.join(deps) or '-'}")
+        return
+
+    # Stage scripts resolve .env and their relative paths from the home dir
+    os.chdir(HOME_DIR)
+    load_dotenv(HOME_DIR / ".env")
+    import write_queue
+    if write_queue.coordinator_running():
+        try:
+            resolve(args.names, not args.only)
+        except ValueError as e:
+            ap.error(str(e))
+        write_queue.Batch("features", label="pipeline").pipeline(args.names, not args.only, args.workers).commit()
+        print(f"Write coordinator is running: queued {' '.join(args.names)} with it (see its log)")
+        return
+    try:
+        results = run(args.names, args.workers, not args.only)
+    except ValueError as e:
+        ap.error(str(e))
+    if any(r["status"] != "OK" for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
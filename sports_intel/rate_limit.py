@@ -0,0 +1,146 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+# Shared state lives in RAM when possible (no SD-card wear); every process on
+# the box that talks to the same API reads/writes the same bucket file.
+STATE_DIR = Path(os.getenv(
+    "SPORTS_INTEL_RATE_DIR",
+    "/dev/shm/sports_intel_rate" if os.path.isdir("/dev/shm") else "cache/ratelimit",
+))
+
+# Per-API token buckets (rate = tokens/sec, burst = bucket size).
+# The rate adapts between min_rate and max_rate: +step per success, x0.5 per 429.
+BUCKETS = {
+    "nhl": {"rate": 8.0, "burst": 8, "min_rate": 0.5, "max_rate": 20.0, "step": 0.05},
+    "odds": {"rate": 1.0, "burst": 2, "min_rate": 0.2, "max_rate": 2.0, "step": 0.02},
+}
+DEFAULT_RETRY_AFTER = 5.0
+MAX_WAIT = 120.0
+
+_thread_lock = threading.Lock()
+
+
+def bucket_for(url: str) -> str | None:
+    if "api-web.nhle.com" in url:
+        return "nhl"
+    if "the-odds-api.com" in url:
+        return "odds"
+    return None
+
+
+# ----------------------------
+# Shared state (flock-guarded JSON file per bucket)
+# ----------------------------
+@contextmanager
+def _locked_state(name: str):
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    path = STATE_DIR / f"{name}.json"
+    with _thread_lock:
+        with open(path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                cfg = BUCKETS[name]
+                state.setdefault("rate", cfg["rate"])
+                state.setdefault("tokens", float(cfg["burst"]))
+                state.setdefault("updated", time.time())
+                state.setdefault("blocked_until", 0.0)
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _refill(state: dict, cfg: dict, now: float):
+    # No tokens accrue while a Retry-After block is in force
+    elapsed = max(0.0, now - max(state["updated"], state["blocked_until"]))
+    state["tokens"] = min(float(cfg["burst"]), state["tokens"] + elapsed * state["rate"])
+    state["updated"] = now
+
+
+def _retry_after_seconds(value) -> float:
+    if value is None:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:  # HTTP-date form
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+# ----------------------------
+# Public API
+# ----------------------------
+def acquire(name: str | None):
+    """Block until the named bucket grants one request. No-op for unknown hosts."""
+    if name not in BUCKETS:
+        return
+    cfg = BUCKETS[name]
+    while True:
+        with _locked_state(name) as state:
+            now = time.time()
+            _refill(state, cfg, now)
+            if state["blocked_until"] > now:
+                wait = state["blocked_until"] - now
+            elif state["tokens"] >= 1.0:
+                state["tokens"] -= 1.0
+                return
+            else:
+                wait = (1.0 - state["tokens"]) / state["rate"]
+        # Sleep outside the lock so other threads/processes can see the bucket
+        time.sleep(min(wait, MAX_WAIT))
+
+
+def on_success(name: str | None):
+    """Additive increase: creep the rate back up while the API is happy."""
+    if name not in BUCKETS:
+        return
+    cfg = BUCKETS[name]
+    with _locked_state(name) as state:
+        state["rate"] = min(cfg["max_rate"], state["rate"] + cfg["step"])
+
+
+def on_throttled(name: str | None, retry_after: str | float | None = None):
+    """429: halve the rate, empty the bucket and honour Retry-After for everyone."""
+    if name not in BUCKETS:
+        return
+    cfg = BUCKETS[name]
+    delay = _retry_after_seconds(retry_after)
+    delay = min(max(delay, 0.0), MAX_WAIT)
+    with _locked_state(name) as state:
+        now = time.time()
+        _refill(state, cfg, now)
+        state["rate"] = max(cfg["min_rate"], state["rate"] * 0.5)
+        state["tokens"] = 0.0
+        state["blocked_until"] = max(state["blocked_until"], now + delay)
+
+
+def status() -> dict:
+    out = {}
+    for name in BUCKETS:
+        with _locked_state(name) as state:
+            _refill(state, BUCKETS[name], time.time())
+            out[name] = dict(state)
+    return out
+
+
+if __name__ == "__main__":
+    for name, s in status().items():
+        blocked = max(0.0, s["blocked_until"] - time.time())
+        print(f"{name}: rate={s['rate']:.2f}/s tokens={s['tokens']:.1f} blocked={blocked:.1f}s")
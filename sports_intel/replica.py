@@ -0,0 +1,122 @@
+"""Read replicas: a COPY FROM DATABASE snapshot under db/replica/, made current by a symlink swap.
+
+Readers open the published file read-only, so they never wait on the writer.
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import duckdb
+
+MODULE_DIR = Path(__file__).resolve().parent
+REPLICA_DIR = MODULE_DIR / "db" / "replica"
+SOURCES = {
+    "features": MODULE_DIR / "db" / "features.duckdb",
+    "oracle_data": MODULE_DIR.parent / "oracle_data.duckdb",
+}
+KEEP = 3  # published copies kept per DB (readers may still hold an older one open)
+
+
+def current_path(name: str) -> Path:
+    return REPLICA_DIR / f"{name}.duckdb"
+
+
+# ----------------------------
+# Publish (writer side)
+# ----------------------------
+def publish(con, name: str, run_id: str | None = None) -> Path:
+    """Snapshot the DB behind con into a new replica file and swap it in."""
+    run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+    REPLICA_DIR.mkdir(parents=True, exist_ok=True)
+    target = REPLICA_DIR / f"{name}.{run_id}.duckdb"
+    tmp = target.with_suffix(".tmp")
+    for p in (tmp, Path(f"{tmp}.wal")):
+        p.unlink(missing_ok=True)
+
+    alias = f"replica_{name}_{os.getpid()}"
+    con = con.cursor()
+    src = con.execute("SELECT current_database()").fetchone()[0]
+    t0 = time.perf_counter()
+    con.execute(f"ATTACH '{tmp}' AS {alias}")
+    try:
+        con.execute(f"COPY FROM DATABASE {src} TO {alias}")
+        con.execute(f"""
+            CREATE TABLE {alias}.replica_info AS
+            SELECT ? AS source, ? AS run_id, now()::TIMESTAMP AS published_at
+        """, [name, run_id])
+    finally:
+        con.execute(f"DETACH {alias}")
+        con.close()
+    os.replace(tmp, target)
+
+    # Atomic swap: readers see either the old or the new file, never a partial one
+    link = current_path(name)
+    tmp_link = link.with_suffix(f".{os.getpid()}.link")
+    tmp_link.unlink(missing_ok=True)
+    tmp_link.symlink_to(target.name)
+    os.replace(tmp_link, link)
+
+    prune(name)
+    print(f"Published {name} replica {target.name} ({target.stat().st_size / 1e6:.1f} MB) "
+          f"in {time.perf_counter() - t0:.1f}s")
+    return target
+
+
+def prune(name: str, keep: int = KEEP):
+    current = current_path(name).resolve()
+    published = sorted(REPLICA_DIR.glob(f"{name}.*.duckdb"))
+    for p in published[:-keep]:
+        if p != current:
+            p.unlink(missing_ok=True)
+
+
+# ----------------------------
+# Read (dashboard side)
+# ----------------------------
+def connect(name: str = "features"):
+    """Read-only connection to the current replica. Never blocks (or is blocked by) the writer."""
+    path = current_path(name)
+    if not path.exists():
+        raise FileNotFoundError(f"No {name} replica published yet ({path}). Run pipeline.py or replica.py publish.")
+    # Resolve first: later swaps must not change the file under an open connection
+    return duckdb.connect(str(path.resolve()), read_only=True)
+
+
+def published_at(con) -> datetime | None:
+    try:
+        return con.execute("SELECT published_at FROM replica_info").fetchone()[0]
+    except duckdb.CatalogException:
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Publish / inspect read replicas of the DuckDB files")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    pp = sub.add_parser("publish", help="publish a replica now (takes the writer lock briefly)")
+    pp.add_argument("names", nargs="*", default=list(SOURCES), help=f"subset of {list(SOURCES)}")
+    sub.add_parser("status", help="show the current replicas")
+    args = ap.parse_args()
+
+    if args.cmd == "publish":
+        for name in args.names:
+            con = duckdb.connect(str(SOURCES[name]))
+            try:
+                publish(con, name)
+            finally:
+                con.close()
+        return
+    for name in SOURCES:
+        path = current_path(name)
+        if not path.exists():
+            print(f"{name:<12} (none)")
+            continue
+        con = connect(name)
+        print(f"{name:<12} {path.resolve().name}  published {published_at(con)}")
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
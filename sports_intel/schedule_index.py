@@ -0,0 +1,155 @@
+import argparse
+from datetime import datetime, timedelta, date, timezone
+
+import duckdb
+from dateutil import tz
+
+import db_bulk
+import http_fetch
+
+DB_PATH = "db/features.duckdb"
+DETROIT_TZ = tz.gettz("America/Detroit")
+UTC_TZ = tz.UTC
+
+FINAL_STATES = ("FINAL", "OFF")
+
+# Incremental refresh window around "today"
+REFRESH_DAYS_BACK = 7
+REFRESH_DAYS_AHEAD = 7
+MAX_LOOKBACK_DAYS = 30
+
+SCHEDULE_COLUMNS = ["game_id", "season", "game_type", "game_date_local", "start_time_utc",
+                    "home_abbrev", "away_abbrev", "game_state", "updated_at_utc"]
+
+
+# ----------------------------
+# Schema
+# ----------------------------
+def ensure_schema(con):
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS nhl_schedule (
+        game_id BIGINT PRIMARY KEY,
+        season INTEGER,
+        game_type INTEGER,
+        game_date_local DATE,
+        start_time_utc TIMESTAMP,
+        home_abbrev TEXT,
+        away_abbrev TEXT,
+        game_state TEXT,
+        updated_at_utc TIMESTAMP
+    );
+    """)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_nhl_schedule_home ON nhl_schedule (home_abbrev, game_date_local);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_nhl_schedule_away ON nhl_schedule (away_abbrev, game_date_local);")
+
+
+# ----------------------------
+# Ingest
+# ----------------------------
+def season_for(d: date) -> int:
+    y = d.year if d.month >= 7 else d.year - 1
+    return int(f"{y}{y + 1}")
+
+
+def season_bounds(season: int) -> tuple[date, date]:
+    y = int(str(season)[:4])
+    return date(y, 9, 15), date(y + 1, 6, 30)
+
+
+def parse_week(data: dict) -> list[tuple]:
+    now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+    rows = []
+    for day in data.get("gameWeek", []) or []:
+        for g in day.get("games", []) or []:
+            start_utc = datetime.fromisoformat(g["startTimeUTC"].replace("Z", "+00:00")).astimezone(UTC_TZ).replace(tzinfo=None)
+            rows.append((
+                int(g["id"]), g.get("season"), g.get("gameType"), day["date"], start_utc,
+                (g.get("homeTeam") or {}).get("abbrev"), (g.get("awayTeam") or {}).get("abbrev"),
+                g.get("gameState"), now_utc,
+            ))
+    return rows
+
+
+def ingest_range(con, start: date, end: date) -> int:
+    """Fetch every /schedule week covering [start, end] concurrently and upsert."""
+    ensure_schema(con)
+    urls = []
+    cursor = start
+    while cursor <= end:
+        urls.append(http_fetch.SCHEDULE_URL.format(date_str=cursor.isoformat()))
+        cursor += timedelta(days=7)
+
+    rows = []
+
+    def on_week(url, data, err):
+        if err is not None:
+            print(f"Schedule week failed: {url} :: {err}")
+            return
+        rows.extend(parse_week(data))
+
+    http_fetch.stream_json(urls, on_week)
+    db_bulk.bulk_upsert(con, "nhl_schedule", rows, columns=SCHEDULE_COLUMNS)
+    return len(rows)
+
+
+def ingest_season(con, season: int) -> int:
+    start, end = season_bounds(season)
+    return ingest_range(con, start, end)
+
+
+def refresh(con, d: date) -> int:
+    """Incremental refresh: re-read weeks from the oldest unfinished game up to d + a week.
+
+    Bootstraps the whole season the first time it sees an empty season.
+    """
+    ensure_schema(con)
+    season = season_for(d)
+    have = con.execute("select count(*) from nhl_schedule where season = ?", [season]).fetchone()[0]
+    if not have:
+        return ingest_season(con, season)
+
+    oldest_open = con.execute(
+        f"""
+        select min(game_date_local) from nhl_schedule
+        where game_date_local < ? and game_date_local >= ?
+          and game_state not in {FINAL_STATES}
+        """, [d, d - timedelta(days=MAX_LOOKBACK_DAYS)]
+    ).fetchone()[0]
+    start = min(oldest_open or d, d - timedelta(days=REFRESH_DAYS_BACK))
+    return ingest_range(con, start, d + timedelta(days=REFRESH_DAYS_AHEAD))
+
+
+# ----------------------------
+# Queries
+# ----------------------------
+def last_n_game_ids(con, team_abbrev: str, d: date, n: int) -> list[int]:
+    """Last n completed games for a team strictly before d (no network)."""
+    rows = con.execute(
+        f"""
+        select game_id from nhl_schedule
+        where (home_abbrev = ? or away_abbrev = ?)
+          and game_date_local < ?
+          and game_state in {FINAL_STATES}
+        order by start_time_utc desc
+        limit ?
+        """, [team_abbrev, team_abbrev, d, n]
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Bulk / incremental NHL season schedule ingest")
+    ap.add_argument("--season", type=int, help="e.g. 20252026 (default: incremental refresh around today)")
+    args = ap.parse_args()
+
+    con = duckdb.connect(DB_PATH)
+    if args.season:
+        n = ingest_season(con, args.season)
+    else:
+        n = refresh(con, datetime.now(DETROIT_TZ).date())
+    con.close()
+    print(f"Schedule index updated: {n} games upserted.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Resident scheduler: plans morning / odds / results / maintenance jobs around
+today's start times and is the single writer that drains write_queue's spool.
+
+  python scheduler_daemon.py run|plan
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, date, timedelta, timezone
+
+import duckdb
+from dateutil import tz
+
+import maintenance
+import pipeline
+import write_queue
+
+DB_PATH = pipeline.FEATURES_DB
+DETROIT_TZ = tz.gettz("America/Detroit")
+
+MORNING_LOCAL = (8, 30)                 # Detroit wall clock
+MAINTENANCE_LOCAL = (4, 30)             # after the late west-coast games, before the morning refresh
+GAME_LENGTH = timedelta(hours=2, minutes=45)
+FINAL_RECHECK = timedelta(minutes=15)
+FINAL_GIVE_UP = timedelta(hours=6)      # after the last puck drop: ingest whatever is final
+MAX_SLEEP = timedelta(minutes=15)       # wake up at least this often to re-plan
+RETRY_FAILED = timedelta(minutes=30)
+
+JOBS = {
+    "morning": (["refresh", "props", "games", "analyst", "validator"], False),
+    "odds": (["odds"], False),
+    "results": (["ingest", "props", "games"], False),
+    "maintenance": (["maintenance"], False),  # not a pipeline stage: see Daemon.run_job
+}
+JOB_DONE_STAGE = {"morning": "phase1", "results": "ingest"}
+
+FINAL_STATES = ("FINAL", "OFF")
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def detroit_date(utc: datetime) -> date:
+    return utc.replace(tzinfo=timezone.utc).astimezone(DETROIT_TZ).date()
+
+
+def local_to_utc(d: date, hm: tuple[int, int]) -> datetime:
+    local = datetime(d.year, d.month, d.day, *hm, tzinfo=DETROIT_TZ)
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def utc_to_system_local(utc: datetime) -> datetime:
+    # system_refresh_stages is stamped with datetime.now() (the Pi's clock)
+    return utc.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+# ----------------------------
+# Slate + job state (all read from features.duckdb, so restarts resume cleanly)
+# ----------------------------
+def slate_starts(con, d: date) -> list[datetime]:
+    rows = con.execute(
+        "SELECT start_time_utc FROM events WHERE event_date_local = ? AND start_time_utc IS NOT NULL "
+        "ORDER BY start_time_utc", [d]
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def stage_ok_since(con, stage: str, since_utc: datetime) -> bool:
+    try:
+        row = con.execute(
+            "SELECT count(*) FROM system_refresh_stages WHERE stage = ? AND status = 'OK' AND started_at >= ?",
+            [stage, utc_to_system_local(since_utc)],
+        ).fetchone()
+    except duckdb.CatalogException:
+        return False
+    return row[0] > 0
+
+
+def next_odds_poll(con) -> datetime | None:
+    if not os.getenv("ODDS_API_KEY"):
+        return None
+    try:
+        row = con.execute("SELECT next_poll_utc FROM odds_api_usage ORDER BY polled_at_utc DESC LIMIT 1").fetchone()
+    except duckdb.CatalogException:
+        row = None
+    return row[0] if row and row[0] else utcnow()
+
+
+def plan(con, now: datetime, hold: dict) -> list[tuple[datetime, str, date]]:
+    """(due_utc, job, slate day), soonest first. Past-due jobs are due now.
+
+    hold[(job, day)] pushes a job back (results not final yet, or the last try failed).
+    """
+    today = detroit_date(now)
+    jobs = []
+
+    morning = local_to_utc(today, MORNING_LOCAL)
+    if stage_ok_since(con, JOB_DONE_STAGE["morning"], morning):
+        morning = local_to_utc(today + timedelta(days=1), MORNING_LOCAL)
+    jobs.append((morning, "morning", detroit_date(morning)))
+
+    maint = local_to_utc(today, MAINTENANCE_LOCAL)
+    if maintenance.ran_since(con, utc_to_system_local(maint)):
+        maint = local_to_utc(today + timedelta(days=1), MAINTENANCE_LOCAL)
+    jobs.append((maint, "maintenance", detroit_date(maint)))
+
+    # Yesterday too: late games finish after midnight
+    for day in (today - timedelta(days=1), today):
+        starts = slate_starts(con, day)
+        if not starts:
+            continue
+        if not stage_ok_since(con, JOB_DONE_STAGE["results"], starts[-1] + GAME_LENGTH):
+            jobs.append((starts[-1] + GAME_LENGTH, "results", day))
+
+    odds = next_odds_poll(con)
+    if odds is not None:
+        jobs.append((odds, "odds", today))
+    return sorted((max(when, hold.get((job, day), when), now), job, day) for when, job, day in jobs)
+
+
+def slate_final(day: date) -> bool:
+    import etl_phase1
+    import http_fetch
+    data = http_fetch.fetch_json(etl_phase1.SCORE_URL.format(date_str=day.isoformat()), use_cache=False)
+    games = data.get("games") or []
+    return all(g.get("gameState") in FINAL_STATES for g in games)
+
+
+# ----------------------------
+# Loop
+# ----------------------------
+class Daemon:
+    def __init__(self, workers: int = pipeline.MAX_WORKERS):
+        self.workers = workers
+        self.cons = None
+        self.queue = None
+        self.hold = {}
+
+    def connect(self):
+        if self.cons is None:
+            cons = pipeline.connect_all([pipeline.FEATURES_DB, pipeline.ORACLE_DB])
+            try:
+                self.queue = write_queue.Coordinator(cons)
+            except RuntimeError:
+                for con in cons.values():
+                    con.close()
+                raise
+            self.cons = cons
+        # Reopens what maintenance closed (same dict as the queue's)
+        pipeline.connect_all([pipeline.FEATURES_DB, pipeline.ORACLE_DB], self.cons)
+        return self.cons[pipeline.FEATURES_DB]
+
+    def release(self):
+        if self.cons is not None:
+            self.queue.close()
+            for con in self.cons.values():
+                con.close()
+            self.cons = None
+            self.queue = None
+
+    def run_job(self, job: str, day: date):
+        if job == "results":
+            starts = slate_starts(self.connect(), day)
+            try:
+                final = slate_final(day)
+            except Exception as e:
+                print(f"Finality check failed for {day}: {e}")
+                final = False
+            if not final and utcnow() < starts[-1] + FINAL_GIVE_UP:
+                self.hold[(job, day)] = utcnow() + FINAL_RECHECK
+                print(f"{day}: not all games final yet, rechecking at {self.hold[(job, day)]:%H:%M} UTC")
+                return
+        names, with_deps = JOBS[job]
+        print(f"\n=== {job} ({day}) at {utcnow():%Y-%m-%d %H:%M} UTC ===")
+        self.connect()
+        self.queue.drain()  # queued writes land before the run reads them
+        if job == "maintenance":
+            self.queue.run_maintenance()
+            self.hold[(job, day)] = utcnow()
+            return
+        results = pipeline.run(names, self.workers, with_deps, cons=self.cons)
+        # A failed run is retried later, not in a tight loop
+        ok = all(r["status"] == "OK" for r in results.values())
+        self.hold[(job, day)] = utcnow() + (timedelta(0) if ok else RETRY_FAILED)
+
+    def loop(self):
+        print(f"Scheduler daemon up (pid {os.getpid()})")
+        while True:
+            try:
+                now = utcnow()
+                jobs = plan(self.connect(), now, self.hold)
+            except (duckdb.IOException, RuntimeError) as e:
+                # Another writer holds the file (or the queue): try again shortly
+                print(f"DB busy ({e}); retrying in 60s")
+                self.release()
+                time.sleep(60)
+                continue
+
+            when, job, day = jobs[0]
+            wait = when - now
+            if wait > timedelta(0):
+                self.queue.idle(min(wait, MAX_SLEEP).total_seconds())
+                continue
+            try:
+                self.run_job(job, day)
+            except Exception as e:
+                print(f"{job} failed: {type(e).__name__}: {e}")
+                self.hold[(job, day)] = utcnow() + RETRY_FAILED
+
+
+def print_plan():
+    con = duckdb.connect(str(DB_PATH))
+    now = utcnow()
+    print(f"Now {now:%Y-%m-%d %H:%M} UTC; slate {detroit_date(now)}: "
+          f"{[f'{t:%H:%M}' for t in slate_starts(con, detroit_date(now))]} UTC")
+    for when, job, day in plan(con, now, {}):
+        print(f"{when:%m-%d %H:%M} UTC  {job:<8} {day}  -> {' + '.join(JOBS[job][0])}")
+    con.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Slate-aware resident scheduler for the pipeline")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("run", help="run forever")
+    rp.add_argument("--workers", type=int, default=pipeline.MAX_WORKERS)
+    sub.add_parser("plan", help="print the upcoming jobs and exit")
+    args = ap.parse_args()
+
+    # Stage scripts resolve .env and their relative paths from the home dir
+    os.chdir(pipeline.HOME_DIR)
+    pipeline.load_dotenv(pipeline.HOME_DIR / ".env")
+    if args.cmd == "plan":
+        print_plan()
+        return
+    Daemon(args.workers).loop()
+
+
+if __name__ == "__main__":
+    main()
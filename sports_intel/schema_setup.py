@@ -1,6 +1,8 @@
 import duckdb
 from pathlib import Path
 
+import schedule_index
+
 DB_PATH = Path("db/features.duckdb")
 
 
@@ -101,10 +103,19 @@ def main():
         l10_goal_diff DOUBLE,
         l10_shot_diff DOUBLE,
         updated_at_utc TIMESTAMP,
+        created_at_utc TIMESTAMP,
+        event_id TEXT,
+        is_home BOOLEAN,
         PRIMARY KEY (event_date_local, team_abbrev)
     );
     """)
 
+    # -------------------------
+    # NHL SEASON SCHEDULE (1 ROW PER GAME, INDEXED BY TEAM + DATE)
+    # -------------------------
+
+    schedule_index.ensure_schema(con)
+
     con.close()
     print("Schema initialized / migrated successfully (Phase 1 + Phase 2A).")
 
@@ -0,0 +1,350 @@
+"""Single-writer queue: while a coordinator runs, producers spool batches
+to db/spool/<db>/ and the coordinator applies them in order.
+
+  with write_queue.Batch("features") as b:
+      b.insert("edge_stats", df)
+
+With no coordinator running, Batch applies directly.
+"""
+
+import argparse
+import fcntl
+import itertools
+import os
+import pickle
+import time
+from importlib import import_module
+from pathlib import Path
+
+import duckdb
+
+import db_bulk
+import replica
+
+MODULE_DIR = Path(__file__).resolve().parent
+SPOOL_DIR = Path(os.getenv("SPORTS_INTEL_SPOOL", MODULE_DIR / "db" / "spool"))
+LOCK_FILE = SPOOL_DIR / "writer.lock"
+DBS = replica.SOURCES
+
+GROUP_MAX_BATCHES = 64
+GROUP_MAX_ROWS = 200_000
+POLL_INTERVAL = 1.0
+LOCK_WAIT = 2.0  # a starting coordinator waits out producers' momentary probes of the lock
+REPLICA_EVERY = 300.0  # republish a DB at most this often after queued writes
+
+# Writer-side functions a batch may call with the coordinator's connection
+# (for writes that must read current state, e.g. the odds change log)
+HANDLERS = {
+    "odds_store.write_snapshot",
+    "archive.archive_dataset",
+}
+
+# Ops that run outside a transaction, as a batch of their own, after everything queued before them
+EXCLUSIVE_OPS = ("pipeline", "maintenance")
+
+_seq = itertools.count()
+
+
+# ----------------------------
+# Producer side
+# ----------------------------
+def coordinator_running() -> bool:
+    # Shared probe: producers probing at the same time don't see each other as a coordinator
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    with open(LOCK_FILE, "a+") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(f, fcntl.LOCK_UN)
+        return False
+
+
+class Batch:
+    """Ops applied atomically, in order. Use as a context manager or call commit()."""
+
+    def __init__(self, db: str = "features", label: str = ""):
+        if db not in DBS:
+            raise ValueError(f"unknown db {db!r}; expected one of {list(DBS)}")
+        self.db = db
+        self.label = label
+        self.ops = []
+
+    def execute(self, sql: str, params=None):
+        self.ops.append(("sql", sql, list(params or [])))
+        return self
+
+    def upsert(self, table: str, rows, conflict_cols=None, update_cols=None, columns=None):
+        self.ops.append(("upsert", table, db_bulk.to_frame(rows, columns), conflict_cols, update_cols))
+        return self
+
+    def insert(self, table: str, rows, columns=None):
+        self.ops.append(("insert", table, db_bulk.to_frame(rows, columns)))
+        return self
+
+    def pipeline(self, names: list[str], with_deps: bool = True, workers: int | None = None):
+        if self.ops:
+            raise ValueError("a pipeline run must be a batch of its own")
+        self.ops.append(("pipeline", list(names), with_deps, workers))
+        return self
+
+    def maintenance(self, keep: dict | None = None, compact: bool = True, force_compact: bool = False):
+        if self.ops:
+            raise ValueError("a maintenance run must be a batch of its own")
+        self.ops.append(("maintenance", dict(keep or {}), compact, force_compact))
+        return self
+
+    def call(self, handler: str, *args):
+        if handler not in HANDLERS:
+            raise ValueError(f"{handler} is not a registered write handler")
+        self.ops.append(("call", handler, args))
+        return self
+
+    def rows(self) -> int:
+        return sum(len(op[2]) for op in self.ops if op[0] in ("upsert", "insert"))
+
+    def commit(self) -> str:
+        """Spool for the coordinator if one is running, else apply now. Returns 'spooled' or 'applied'."""
+        if not self.ops:
+            return "applied"
+        if coordinator_running():
+            spool(self)
+            return "spooled"
+        if self.ops[0][0] == "pipeline":
+            import pipeline
+            _, names, with_deps, workers = self.ops[0]
+            pipeline.run(names, workers or pipeline.MAX_WORKERS, with_deps)
+            return "applied"
+        if self.ops[0][0] == "maintenance":
+            import maintenance
+            maintenance.run(*self.ops[0][1:])
+            return "applied"
+        con = duckdb.connect(str(DBS[self.db]))
+        try:
+            with db_bulk.transaction(con):
+                apply(con, self)
+        finally:
+            con.close()
+        return "applied"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+
+
+def spool(batch: Batch) -> Path:
+    d = SPOOL_DIR / batch.db
+    (d / "tmp").mkdir(parents=True, exist_ok=True)
+    # Name sorts in arrival order: ns clock, then pid + per-process sequence
+    name = f"{time.time_ns():020d}_{os.getpid()}_{next(_seq):06d}.batch"
+    tmp = d / "tmp" / name
+    with open(tmp, "wb") as f:
+        pickle.dump({"label": batch.label, "ops": batch.ops}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, d / name)
+    return d / name
+
+
+# ----------------------------
+# Writer side
+# ----------------------------
+def _handler(name: str):
+    module, fn = name.rsplit(".", 1)
+    return getattr(import_module(module), fn)
+
+
+def apply(con, batch):
+    """Run a batch's ops on con. Caller owns the transaction."""
+    for op in batch.ops:
+        kind = op[0]
+        if kind == "sql":
+            con.execute(op[1], op[2])
+        elif kind == "upsert":
+            _, table, df, conflict_cols, update_cols = op
+            db_bulk.bulk_upsert(con, table, df, conflict_cols, update_cols)
+        elif kind == "insert":
+            _, table, df = op
+            if len(df):
+                con.execute(f"INSERT INTO {table} BY NAME SELECT * FROM df")
+        elif kind == "call":
+            if op[1] not in HANDLERS:
+                raise ValueError(f"{op[1]} is not a registered write handler")
+            _handler(op[1])(con, *op[2])
+        elif kind in EXCLUSIVE_OPS:
+            raise ValueError(f"{kind} batches are run by the coordinator, not inside a transaction")
+        else:
+            raise ValueError(f"unknown op {kind!r}")
+
+
+class Coordinator:
+    """Owns the write connections; drains the spool in order."""
+
+    def __init__(self, cons: dict | None = None):
+        SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+        self._lock = open(LOCK_FILE, "a+")
+        deadline = time.monotonic() + LOCK_WAIT
+        while True:
+            try:
+                fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                # A producer's probe holds the lock for microseconds; a coordinator holds it for good
+                if time.monotonic() >= deadline:
+                    self._lock.close()
+                    raise RuntimeError("another write coordinator is already running")
+                time.sleep(0.01)
+        # {db path: connection}, as from pipeline.connect_all; scheduler_daemon shares its own
+        self._owned = cons is None
+        self.cons = cons if cons is not None else {}
+        self.dirty = {}
+
+    def connection(self, db: str):
+        path = DBS[db]
+        if path not in self.cons:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.cons[path] = duckdb.connect(str(path))
+        return self.cons[path]
+
+    def pending(self, db: str) -> list[Path]:
+        return sorted((SPOOL_DIR / db).glob("*.batch"))
+
+    def drain(self) -> int:
+        """Apply everything queued right now. Returns batches applied."""
+        applied = 0
+        for db in DBS:
+            paths = self.pending(db)
+            while paths:
+                group, rows = [], 0
+                while paths and len(group) < GROUP_MAX_BATCHES and rows < GROUP_MAX_ROWS:
+                    with open(paths[0], "rb") as f:
+                        batch = pickle.load(f)
+                    if batch["ops"][0][0] in EXCLUSIVE_OPS:
+                        if not group:
+                            applied += self._run_exclusive(paths.pop(0), batch)
+                        break  # writes queued before it land first
+                    group.append((paths.pop(0), batch))
+                    rows += sum(len(op[2]) for op in batch["ops"] if op[0] in ("upsert", "insert"))
+                if group:
+                    applied += self._apply_group(db, group)
+        return applied
+
+    def _run_exclusive(self, path: Path, batch: dict) -> int:
+        kind, *args = batch["ops"][0]
+        path.unlink()
+        try:
+            if kind == "pipeline":
+                import pipeline
+                names, with_deps, workers = args
+                pipeline.run(names, workers or pipeline.MAX_WORKERS, with_deps, cons=self.cons)
+            else:
+                self.run_maintenance(*args)
+        except Exception as e:
+            print(f"write_queue: queued {kind} {args[0] or ''} failed: {type(e).__name__}: {e}")
+        return 1
+
+    def run_maintenance(self, keep: dict | None = None, compact: bool = True, force_compact: bool = False):
+        """maintenance.run needs the files to itself: close the connections (in place, so
+        owners sharing the dict see it), keep the lock, and let them reopen afterwards."""
+        import maintenance
+        for con in self.cons.values():
+            con.close()
+        self.cons.clear()
+        maintenance.run(keep, compact, force_compact)
+        self.dirty.clear()  # maintenance publishes fresh replicas
+
+    def _apply_group(self, db: str, group: list) -> int:
+        con = self.connection(db)
+        try:
+            with db_bulk.transaction(con):
+                for _, batch in group:
+                    apply(con, _Loaded(batch))
+        except Exception:
+            # Isolate the bad batch: replay one transaction per batch
+            ok = 0
+            for p, batch in group:
+                try:
+                    with db_bulk.transaction(con):
+                        apply(con, _Loaded(batch))
+                    p.unlink()
+                    ok += 1
+                except Exception as e:
+                    self._quarantine(db, p, e)
+            self.dirty.setdefault(db, time.time())
+            print(f"write_queue: {db} <- {ok}/{len(group)} batches one at a time")
+            return ok
+        for p, _ in group:
+            p.unlink()
+        self.dirty.setdefault(db, time.time())
+        labels = sorted({b["label"] for _, b in group if b["label"]})
+        print(f"write_queue: {db} <- {len(group)} batches in one transaction {labels or ''}")
+        return len(group)
+
+    def _quarantine(self, db: str, path: Path, err: Exception):
+        failed = SPOOL_DIR / db / "failed"
+        failed.mkdir(parents=True, exist_ok=True)
+        os.replace(path, failed / path.name)
+        (failed / f"{path.name}.err").write_text(f"{type(err).__name__}: {err}\n")
+        print(f"write_queue: {db} batch {path.name} failed ({err}); moved to {failed}")
+
+    def publish_due(self, force: bool = False):
+        """Republish replicas for DBs written through the queue (throttled)."""
+        for db, since in list(self.dirty.items()):
+            if force or time.time() - since >= REPLICA_EVERY:
+                replica.publish(self.connection(db), db)
+                del self.dirty[db]
+
+    def idle(self, seconds: float):
+        """Keep draining the spool for the given time (what the owner does instead of sleeping)."""
+        until = time.monotonic() + seconds
+        while True:
+            if not self.drain():
+                self.publish_due()
+                left = until - time.monotonic()
+                if left <= 0:
+                    return
+                time.sleep(min(POLL_INTERVAL, left))
+
+    def serve(self):
+        print(f"write_queue: serving {SPOOL_DIR} (pid {os.getpid()})")
+        try:
+            while True:
+                self.idle(REPLICA_EVERY)
+        finally:
+            self.close()
+
+    def close(self):
+        if self._owned:
+            for con in self.cons.values():
+                con.close()
+            self.cons.clear()
+        fcntl.flock(self._lock, fcntl.LOCK_UN)
+        self._lock.close()
+
+
+class _Loaded:
+    def __init__(self, data: dict):
+        self.ops = data["ops"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Single-writer queue for the DuckDB files")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("serve", help="own the DBs and apply spooled batches (not alongside scheduler_daemon)")
+    sub.add_parser("status", help="queued / failed batches per DB")
+    args = ap.parse_args()
+
+    if args.cmd == "serve":
+        os.chdir(MODULE_DIR.parent)  # queued pipeline runs resolve paths from the home dir
+        Coordinator().serve()
+        return
+    print(f"coordinator running: {coordinator_running()}")
+    for db in DBS:
+        queued = len(list((SPOOL_DIR / db).glob("*.batch")))
+        failed = len(list((SPOOL_DIR / db / "failed").glob("*.batch")))
+        print(f"{db:<12} queued {queued:<5} failed {failed}")
+
+
+if __name__ == "__main__":
+    main()